@@ -0,0 +1,188 @@
+"""Streaming, order-preserving batch execution for the CLI.
+
+Input is consumed lazily and at most ``jobs * CHUNKS_PER_JOB`` chunks of
+``chunksize`` items are in flight at once, so memory stays constant no matter
+how large the input is. With ``jobs > 1`` work runs in a process pool;
+per-process state (config, parsed keys, policy) is built once by
+``initializer`` in every worker, and items travel in chunks so inter-process
+overhead is paid per chunk rather than per token.
+
+The signing state and per-item record builders at the bottom are shared by
+the CLI workers and the minting daemon. Like the CLI, they import
+``keypebble.core`` only when called.
+"""
+
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TextIO
+
+CHUNKS_PER_JOB = 4
+
+
+def open_input(path: str) -> TextIO:
+    """Open ``path`` for reading, treating ``-`` as stdin."""
+    if path == "-":
+        return sys.stdin
+    return open(path, "r")
+
+
+def iter_lines(stream: TextIO) -> Iterator[str]:
+    """Yield non-blank lines from ``stream`` without their line endings."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _run_chunk(fn: Callable, chunk: list) -> list:
+    return [fn(item) for item in chunk]
+
+
+def ordered_map(
+    fn: Callable,
+    items: Iterable,
+    jobs: int = 1,
+    initializer: Callable | None = None,
+    initargs: tuple = (),
+    chunksize: int = 64,
+) -> Iterator:
+    """Yield ``fn(item)`` for each item, in input order.
+
+    ``fn`` and ``initializer`` must be module-level functions so they can be
+    sent to worker processes.
+    """
+    if jobs <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(fn, items)
+        return
+
+    items = iter(items)
+    window: deque = deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs
+    ) as pool:
+        while chunk := list(islice(items, chunksize)):
+            window.append(pool.submit(_run_chunk, fn, chunk))
+            if len(window) >= jobs * CHUNKS_PER_JOB:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+# --- Signing state and records ----------------------------------------------
+
+
+def apply_policy(claims: dict, policy, generate: bool) -> dict:
+    """Fill in scope/access claims from ``policy``, in generation or validation mode."""
+    from keypebble.core.policy import parse_scopes
+
+    user = claims.get("sub") or claims.get("user") or "unknown"
+
+    # --- Policy generation phase ---
+    if generate:
+        # Explicit generation request
+        generated = policy.generate_for(user)
+        claims.update(generated)
+
+        # Also build structured access list from generated scopes
+        scopes = claims.get("scope", "").split()
+        claims["access"] = parse_scopes(scopes)
+
+    else:
+        # Normal validation mode
+        if "scope" not in claims and "access" not in claims:
+            inferred = policy.generate_for(user)
+            claims.update(inferred)
+
+        scopes = claims["scope"].split() if isinstance(claims["scope"], str) else []
+        claims["access"] = policy.allowed_access(user, scopes)
+
+    return claims
+
+
+def issue_state(config: dict, policy, generate: bool) -> dict:
+    from keypebble.core import load_signing_key
+
+    return {
+        "config": config,
+        "signing_key": load_signing_key(config),
+        "policy": policy,
+        "generate": generate,
+    }
+
+
+def issue_record(claims, state: dict) -> dict:
+    """Sign one object of claims; returns ``{"token"}`` or ``{"error"}``."""
+    from keypebble.core import issue_token
+
+    try:
+        if not isinstance(claims, dict):
+            raise ValueError("expected a JSON object of claims")
+        if state["policy"] is not None:
+            claims = apply_policy(claims, state["policy"], state["generate"])
+        token = issue_token(state["config"], claims, signing_key=state["signing_key"])
+    except (ValueError, KeyError) as e:
+        return {"error": str(e)}
+    return {"token": token}
+
+
+def command_state(config: dict, user: str | None) -> dict:
+    from keypebble.core import load_signing_key
+
+    # Structured claim builders produce trusted claims — skip allowlist filter
+    issue_config = dict(config)
+    issue_config.pop("allowed_custom_claims", None)
+    return {
+        "config": config,
+        "issue_config": issue_config,
+        "signing_key": load_signing_key(config),
+        "user": user or config.get("issuer", "keypebble"),
+        "ttl": int(config.get("default_ttl_seconds", 3600)),
+    }
+
+
+def command_item(item) -> tuple:
+    """Unpack a ``{"user", "target", "command"}`` object or ``[user, target,
+    command]`` array; raises ``ValueError`` if it is malformed."""
+    if isinstance(item, list):
+        user, target, command = item
+    elif isinstance(item, dict):
+        user, target, command = (
+            item.get("user"),
+            item.get("target"),
+            item.get("command"),
+        )
+    else:
+        raise ValueError("expected a JSON object or [user, target, command]")
+    if not target:
+        raise ValueError("target is required")
+    if not command:
+        raise ValueError("command is required")
+    return user, target, command
+
+
+def command_record(item, state: dict) -> dict:
+    """Sign one ``{"user", "target", "command"}`` object or ``[user, target,
+    command]`` array; returns ``{"token", "jti"}`` or ``{"error"}``."""
+    from keypebble.core import build_command_claims, issue_token
+
+    try:
+        user, target, command = command_item(item)
+        claims = build_command_claims(
+            user=user or state["user"],
+            command=command,
+            target=target,
+            config=state["config"],
+            now=datetime.now(timezone.utc),
+            ttl=state["ttl"],
+        )
+        token = issue_token(
+            state["issue_config"], claims, signing_key=state["signing_key"]
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"token": token, "jti": claims["jti"]}
@@ -0,0 +1,326 @@
+"""Load generator behind ``keypebble bench``.
+
+Drives one workload at a fixed concurrency for a fixed duration, either
+in-process through the Flask test client or over HTTP against a running
+``keypebble serve``, and reports throughput and latency percentiles.
+
+In-process runs build a self-contained config (HS256 secret or a throwaway
+RS256 key) and a policy for the bench user in a temporary directory, so the
+numbers depend only on the code, the algorithm and the machine.
+"""
+
+import http.client
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import yaml
+
+BENCH_REPOS = 20
+
+# name -> (method, path, headers, JSON body); "{user}" is filled in per run.
+WORKLOADS = {
+    "v2-policy": (
+        "GET",
+        "/v2/token?service=bench-registry"
+        "&scope=repository:bench/app-0:pull,push&scope=repository:bench/app-1:pull",
+        {"X-Authenticated-User": "{user}"},
+        None,
+    ),
+    "v2-generate": (
+        "GET",
+        "/v2/token?service=bench-registry",
+        {"X-Authenticated-User": "{user}", "X-Policy-Generate": "true"},
+        None,
+    ),
+    "auth": ("POST", "/auth", {}, {"sub": "{user}", "role": "bench"}),
+    "ksa": (
+        "POST",
+        "/apis/authentication.k8s.io/v1/namespaces/bench/serviceaccounts/{user}/token",
+        {},
+        {"spec": {"audiences": ["https://kubernetes.default.svc"]}},
+    ),
+    "command": (
+        "POST",
+        "/command/token",
+        {},
+        {"user": "{user}", "target": "edge-01", "command": "uptime"},
+    ),
+}
+
+
+def request_spec(workload: str, user: str) -> tuple[str, str, dict, bytes | None]:
+    """Resolve a workload into ``(method, path, headers, body)`` for ``user``."""
+    method, path, headers, body = WORKLOADS[workload]
+    headers = {k: v.replace("{user}", user) for k, v in headers.items()}
+    data = None
+    if body is not None:
+        data = json.dumps(body).replace("{user}", user).encode()
+        headers["Content-Type"] = "application/json"
+    return method, path.replace("{user}", user), headers, data
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(
+        0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1)
+    )
+    return sorted_values[rank]
+
+
+# --- Targets -----------------------------------------------------------------
+
+
+def write_bench_files(directory: str, algorithm: str, user: str) -> tuple[str, str]:
+    """Write a bench config and policy into ``directory``; returns their paths."""
+    root = Path(directory)
+    config = {
+        "issuer": "keypebble-bench",
+        "audience": "bench-registry",
+        "algorithm": algorithm,
+    }
+    if algorithm == "RS256":
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        key_path = root / "bench-private.pem"
+        key_path.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+        config["rs256_private_key"] = str(key_path)
+    else:
+        config["hs256_secret"] = "keypebble-bench-secret-0123456789abcdef"
+
+    policy = {
+        "users": {
+            user: {
+                "repos": [f"bench/app-{i}" for i in range(BENCH_REPOS)],
+                "actions": ["pull", "push"],
+            }
+        }
+    }
+    config_path = root / "config.yaml"
+    policy_path = root / "policy.yaml"
+    config_path.write_text(yaml.safe_dump(config))
+    policy_path.write_text(yaml.safe_dump(policy))
+    return str(config_path), str(policy_path)
+
+
+def in_process_sender(app):
+    """Return a factory of per-thread senders backed by the Flask test client."""
+
+    def factory():
+        client = app.test_client()
+
+        def send(method, path, headers, body):
+            return client.open(
+                path, method=method, headers=headers, data=body
+            ).status_code
+
+        return send
+
+    return factory
+
+
+def http_sender(url: str):
+    """Return a factory of per-thread senders using one keep-alive connection each."""
+    parts = urlsplit(url)
+
+    def factory():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+        def send(method, path, headers, body):
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            return resp.status
+
+        return send
+
+    return factory
+
+
+# --- Runner ------------------------------------------------------------------
+
+
+def run(sender_factory, spec: tuple, concurrency: int, duration: float) -> dict:
+    """Drive ``spec`` from ``concurrency`` threads for ``duration`` seconds."""
+    start_line = threading.Barrier(concurrency)
+
+    def worker():
+        send = sender_factory()
+        latencies: list[float] = []
+        errors = 0
+        start_line.wait()
+        deadline = time.perf_counter() + duration
+        while (started := time.perf_counter()) < deadline:
+            status = send(*spec)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+        return latencies, errors
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: worker(), range(concurrency)))
+    elapsed = time.perf_counter() - began
+
+    latencies = [lat for lats, _ in results for lat in lats]
+    errors = sum(e for _, e in results)
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Throughput and latency percentiles (in ms) for a finished run."""
+    latencies = sorted(latencies)
+    ms = 1000.0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": (
+                round(sum(latencies) / len(latencies) * ms, 3) if latencies else 0.0
+            ),
+            "p50": round(percentile(latencies, 50) * ms, 3),
+            "p95": round(percentile(latencies, 95) * ms, 3),
+            "p99": round(percentile(latencies, 99) * ms, 3),
+            "p999": round(percentile(latencies, 99.9) * ms, 3),
+            "max": round(latencies[-1] * ms, 3) if latencies else 0.0,
+        },
+    }
+
+
+def bench(
+    workload: str,
+    concurrency: int = 4,
+    duration: float = 10.0,
+    algorithm: str = "HS256",
+    url: str | None = None,
+    user: str = "bench",
+    fast_path: bool = False,
+) -> dict:
+    """Run one benchmark and return its report as a dict."""
+    spec = request_spec(workload, user)
+    report = {
+        "workload": workload,
+        "target": url or "in-process",
+        "algorithm": algorithm if url is None else None,
+        "fast_path": fast_path if url is None else None,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+    }
+
+    if url is not None:
+        report.update(run(http_sender(url), spec, concurrency, duration))
+        return report
+
+    from keypebble.config import load_config
+    from keypebble.service.app import create_app
+    from keypebble.service.fast import install_fast_path
+
+    with tempfile.TemporaryDirectory(prefix="keypebble-bench-") as tmp:
+        config_path, policy_path = write_bench_files(tmp, algorithm.upper(), user)
+        app = create_app(load_config(config_path), policy_path=policy_path)
+        if fast_path:
+            install_fast_path(app)
+        report.update(run(in_process_sender(app), spec, concurrency, duration))
+    return report
+
+
+def bench_audit(
+    concurrency: int = 4,
+    duration: float = 10.0,
+    overflow: str = "drop",
+    fsync: str = "interval",
+    directory: str | None = None,
+) -> dict:
+    """Benchmark the audit sink alone: push records, then drain them to disk.
+
+    Latencies are the cost of ``AuditLog.record`` on the request path;
+    records the overflow policy discarded count as errors.
+    """
+    from keypebble.config import load_config
+    from keypebble.core import issue_token
+    from keypebble.service.audit import AuditLog
+
+    report = {
+        "workload": "audit",
+        "target": "audit-sink",
+        "algorithm": None,
+        "fast_path": None,
+        "concurrency": concurrency,
+        "duration_seconds": duration,
+    }
+    with tempfile.TemporaryDirectory(prefix="keypebble-bench-") as tmp:
+        config_path, _ = write_bench_files(tmp, "HS256", "bench")
+        config = load_config(config_path)
+        token = issue_token(config, {"sub": "bench", "jti": "bench-jti"})
+        audit = AuditLog(
+            {"dir": directory or f"{tmp}/audit", "overflow": overflow, "fsync": fsync}
+        )
+
+        def factory():
+            record = audit.record
+
+            def send(*_):
+                return 200 if record("bench", token) else 503
+
+            return send
+
+        report.update(run(factory, (), concurrency, duration))
+        began = time.perf_counter()
+        audit.close()
+        report["audit"] = {
+            "overflow": overflow,
+            "fsync": fsync,
+            "written": audit.written,
+            "dropped": audit.dropped,
+            "drain_seconds": round(time.perf_counter() - began, 3),
+            "written_per_second": round(
+                audit.written
+                / (report["elapsed_seconds"] + time.perf_counter() - began),
+                1,
+            ),
+        }
+    return report
+
+
+def format_table(report: dict) -> str:
+    """Render a report as a small fixed-width table."""
+    lat = report["latency_ms"]
+    rows = [
+        ("workload", report["workload"]),
+        ("target", report["target"]),
+        ("algorithm", report["algorithm"] or "-"),
+        ("fast path", "-" if report["fast_path"] is None else report["fast_path"]),
+        ("concurrency", report["concurrency"]),
+        ("requests", report["requests"]),
+        ("errors", report["errors"]),
+        ("throughput", f"{report['throughput_rps']:.1f} req/s"),
+        *((f"latency {k}", f"{v:.3f} ms") for k, v in lat.items()),
+    ]
+    audit = report.get("audit")
+    if audit:
+        rows += [
+            ("audit overflow", audit["overflow"]),
+            ("audit fsync", audit["fsync"]),
+            ("audit written", audit["written"]),
+            ("audit dropped", audit["dropped"]),
+            ("audit drain", f"{audit['drain_seconds']:.3f} s"),
+            ("audit write rate", f"{audit['written_per_second']:.1f} records/s"),
+        ]
+    width = max(len(name) for name, _ in rows)
+    return "\n".join(f"{name:<{width}}  {value}" for name, value in rows)
@@ -1,40 +1,272 @@
+"""Keypebble command-line interface.
+
+Subcommands import their dependencies inside the ``cmd_*`` functions rather
+than at module level: ``issue`` and ``command`` are run thousands of times by
+deploy scripts and must never pay for Flask/Werkzeug, and nothing pays for
+PyYAML or PyJWT just to print ``--help``. ``tests/test_cli_startup.py`` guards
+this.
+"""
+
 import argparse
 import json
+import os
+import sys
 from datetime import datetime, timezone
+from typing import Iterator
+
+
+class _Parser(argparse.ArgumentParser):
+    """ArgumentParser whose subcommands can require flags only outside ``--batch``."""
+
+    batch_required: tuple[tuple[str, str], ...] = ()
+
+    def parse_known_args(self, args=None, namespace=None):
+        namespace, extras = super().parse_known_args(args, namespace)
+        if getattr(namespace, "batch", None) is None:
+            missing = [
+                flag
+                for flag, dest in self.batch_required
+                if getattr(namespace, dest, None) is None
+            ]
+            if missing:
+                self.error(
+                    "the following arguments are required: " + ", ".join(missing)
+                )
+        return namespace, extras
+
+
+# --- Batch workers ---------------------------------------------------------
+# Module-level so they can run in worker processes; each worker loads config,
+# keys and policy once in its initializer and keeps them in ``_worker``.
+
+_worker: dict = {}
+
+# Commands signed under one root by ``command --merkle``.
+MERKLE_BATCH = 4096
+
+
+def _init_issue_worker(config_path: str, policy_path: str | None, generate: bool):
+    from keypebble.batch import issue_state
+    from keypebble.config import load_config
+    from keypebble.core.policy import Policy
+
+    policy = Policy.from_file(policy_path) if policy_path else None
+    _worker.update(issue_state(load_config(config_path), policy, generate))
+
+
+def _issue_line(line: str) -> str:
+    """Turn one JSON object of claims into one JSONL result line."""
+    from keypebble.batch import issue_record
+
+    try:
+        claims = json.loads(line)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    return json.dumps(issue_record(claims, _worker))
+
+
+def _init_command_worker(config_path: str, user: str | None):
+    from keypebble.batch import command_state
+    from keypebble.config import load_config
+
+    _worker.update(command_state(load_config(config_path), user))
+
+
+def _command_line(line: str) -> str:
+    """Turn one JSON command object or array into one JSONL result line."""
+    from keypebble.batch import command_record
+
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    return json.dumps(command_record(item, _worker))
+
+
+def _init_verify_worker(
+    config_path: str, audience: str | None, seen_db: str | None = None
+):
+    from keypebble.config import load_config
+    from keypebble.core import RevocationList, SQLiteJtiStore, load_verification_key
+
+    config = load_config(config_path)
+    if audience is not None:
+        config["audience"] = audience
+    _worker.update(
+        config=config,
+        verification_key=load_verification_key(config),
+        revocations=RevocationList.from_config(config, readonly=True),
+        seen=SQLiteJtiStore(seen_db) if seen_db else None,
+    )
+
+
+def _verify_line(token: str) -> tuple[str, str | None]:
+    """Verify one token. Returns the JSONL result line and the failure reason, if any."""
+    from keypebble.core import (
+        decode_token,
+        verify_batched_command,
+        verify_command_token,
+    )
+    from keypebble.core.command_batch import is_batched_credential
+
+    try:
+        if is_batched_credential(token):
+            claims = verify_batched_command(
+                _worker["config"],
+                token,
+                _worker["seen"],
+                key=_worker["verification_key"],
+                revocations=_worker["revocations"],
+            )
+        elif _worker["seen"] is not None:
+            claims = verify_command_token(
+                _worker["config"],
+                token,
+                _worker["seen"],
+                key=_worker["verification_key"],
+                revocations=_worker["revocations"],
+            )
+        else:
+            claims = decode_token(
+                _worker["config"],
+                token,
+                key=_worker["verification_key"],
+                revocations=_worker["revocations"],
+            )
+    except ValueError as e:
+        reason = type(e.__cause__ or e).__name__
+        return json.dumps({"valid": False, "reason": reason, "error": str(e)}), reason
+    return json.dumps({"valid": True, "claims": claims}), None
+
+
+def _batch_results(path: str, jobs: int, fn, initializer, initargs):
+    """Stream lines of ``path`` (or stdin) through ``fn``, yielding results in input order."""
+    from keypebble.batch import iter_lines, open_input, ordered_map
+
+    stream = open_input(path)
+    try:
+        yield from ordered_map(fn, iter_lines(stream), jobs, initializer, initargs)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def _print_batch(args, fn, initializer, initargs):
+    for record in _batch_results(args.batch, args.jobs, fn, initializer, initargs):
+        print(record)
+
 
-from keypebble.config import load_config
-from keypebble.core import build_command_claims, issue_token
-from keypebble.core.policy import Policy, parse_scopes
-from keypebble.service.app import create_app
+def _merkle_records(items, state: dict) -> Iterator[dict]:
+    """Sign command items under one Merkle root per ``MERKLE_BATCH`` items.
+
+    Yields ``{"target", "credential", "jti", "batch_jti"}`` or ``{"error"}``
+    per item, in input order. ``items`` are parsed objects/arrays, or JSON
+    strings (lines of a ``--batch`` file).
+    """
+    from itertools import islice
+
+    from keypebble.batch import command_item
+    from keypebble.core import issue_command_batch
+
+    items = iter(items)
+    while chunk := list(islice(items, MERKLE_BATCH)):
+        records: list = [None] * len(chunk)
+        valid = []
+        for i, item in enumerate(chunk):
+            try:
+                item = json.loads(item) if isinstance(item, str) else item
+                user, target, command = command_item(item)
+            except ValueError as e:
+                records[i] = {"error": str(e)}
+                continue
+            valid.append((i, (user or state["user"], target, command)))
+        if valid:
+            batch = issue_command_batch(
+                state["config"],
+                [command for _, command in valid],
+                datetime.now(timezone.utc),
+                state["ttl"],
+                signing_key=state["signing_key"],
+            )
+            for (i, _), record in zip(valid, batch["commands"]):
+                records[i] = {**record, "batch_jti": batch["jti"]}
+        yield from records
+
+
+def _print_merkle(args, items):
+    from keypebble.batch import command_state
+    from keypebble.config import load_config
+
+    state = command_state(load_config(args.config), args.user)
+    for record in _merkle_records(items, state):
+        print(json.dumps(record), flush=True)
+
+
+def _fanout_line(item: list) -> str:
+    """Sign one ``[user, target, command]`` item of a fan-out as a JSONL line."""
+    from keypebble.batch import command_record
+
+    return json.dumps({"target": item[1], **command_record(item, _worker)})
+
+
+def _print_fanout(args, items, initargs):
+    """Print one ``{"target", "token", "jti"}`` line per ``--target``, in order."""
+    from keypebble.batch import ordered_map
+
+    for line in ordered_map(
+        _fanout_line, items, args.jobs, _init_command_worker, initargs
+    ):
+        print(line, flush=True)
+
+
+def _delegate(args, config: dict, payload: dict) -> str | None:
+    """Mint through a running daemon; ``None`` means sign in-process instead.
+
+    Daemon errors also return ``None`` so they surface exactly as they would
+    without a daemon.
+    """
+    if args.no_daemon:
+        return None
+    from keypebble.daemon import request, socket_path
+
+    path = socket_path(config)
+    if not path:
+        return None
+    response = request(path, dict(payload, config=os.path.abspath(args.config)))
+    return response.get("token") if response else None
 
 
 def cmd_issue(args):
     """Issue a JWT token directly from the CLI."""
-    config = load_config(args.config)
-    claims = json.loads(args.claims) if args.claims else {}
+    if args.batch is not None:
+        initargs = (args.config, args.policy, args.generate)
+        return _print_batch(args, _issue_line, _init_issue_worker, initargs)
 
-    if args.policy:
-        policy = Policy.from_file(args.policy)
-        user = claims.get("sub") or claims.get("user") or "unknown"
+    from keypebble.config import load_config
 
-        # --- Policy generation phase ---
-        if args.generate:
-            # Explicit generation request
-            generated = policy.generate_for(user)
-            claims.update(generated)
+    config = load_config(args.config)
+    claims = json.loads(args.claims) if args.claims else {}
 
-            # Also build structured access list from generated scopes
-            scopes = claims.get("scope", "").split()
-            claims["access"] = parse_scopes(scopes)
+    token = _delegate(
+        args,
+        config,
+        {
+            "op": "issue",
+            "policy": os.path.abspath(args.policy) if args.policy else None,
+            "generate": args.generate,
+            "item": claims,
+        },
+    )
+    if token is not None:
+        print(token)
+        return
 
-        else:
-            # Normal validation mode
-            if "scope" not in claims and "access" not in claims:
-                inferred = policy.generate_for(user)
-                claims.update(inferred)
+    from keypebble.batch import apply_policy
+    from keypebble.core import issue_token
+    from keypebble.core.policy import Policy
 
-            scopes = claims["scope"].split() if isinstance(claims["scope"], str) else []
-            claims["access"] = policy.allowed_access(user, scopes)
+    if args.policy:
+        claims = apply_policy(claims, Policy.from_file(args.policy), args.generate)
 
     token = issue_token(config, claims)
     print(token)
@@ -42,16 +274,54 @@ def cmd_issue(args):
 
 def cmd_command(args):
     """Mint a signed command token."""
+    if args.batch is not None and args.merkle:
+        from keypebble.batch import iter_lines, open_input
+
+        stream = open_input(args.batch)
+        try:
+            return _print_merkle(args, iter_lines(stream))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    if args.batch is not None:
+        initargs = (args.config, args.user)
+        return _print_batch(args, _command_line, _init_command_worker, initargs)
+
+    if len(args.target) > 1 or args.merkle:
+        items = ([args.user, target, args.cmd] for target in args.target)
+        if args.merkle:
+            return _print_merkle(args, items)
+        return _print_fanout(args, items, (args.config, args.user))
+
+    from keypebble.config import load_config
+
     config = load_config(args.config)
     # NOTE: defaults to issuer identity; HTTP endpoint defaults to "anonymous"
     user = args.user or config.get("issuer", "keypebble")
+    (target,) = args.target
+
+    token = _delegate(
+        args,
+        config,
+        {
+            "op": "command",
+            "item": {"user": user, "target": target, "command": args.cmd},
+        },
+    )
+    if token is not None:
+        print(token)
+        return
+
+    from keypebble.core import build_command_claims, issue_token
+
     ttl = int(config.get("default_ttl_seconds", 3600))
     now = datetime.now(timezone.utc)
 
     claims = build_command_claims(
         user=user,
         command=args.cmd,
-        target=args.target,
+        target=target,
         config=config,
         now=now,
         ttl=ttl,
@@ -64,20 +334,209 @@ def cmd_command(args):
     print(token)
 
 
+def cmd_verify(args):
+    """Verify tokens line by line, printing JSONL results and a summary to stderr."""
+    from collections import Counter
+
+    reasons: Counter = Counter()
+    total = 0
+    initargs = (args.config, args.audience, args.seen_db)
+    for record, reason in _batch_results(
+        args.input, args.jobs, _verify_line, _init_verify_worker, initargs
+    ):
+        print(record)
+        total += 1
+        if reason:
+            reasons[reason] += 1
+
+    invalid = sum(reasons.values())
+    print(
+        f"verified {total} tokens: {total - invalid} valid, {invalid} invalid",
+        file=sys.stderr,
+    )
+    for reason, count in reasons.most_common():
+        print(f"  {reason}: {count}", file=sys.stderr)
+
+
+def cmd_bench(args):
+    """Benchmark a workload in-process or against a running server."""
+    from keypebble.bench import WORKLOADS, bench, bench_audit, format_table
+
+    if args.workload == "audit":
+        report = bench_audit(
+            concurrency=args.concurrency,
+            duration=args.duration,
+            overflow=args.audit_overflow,
+            fsync=args.audit_fsync,
+            directory=args.audit_dir,
+        )
+    elif args.workload not in WORKLOADS:
+        raise SystemExit(
+            f"unknown workload {args.workload!r}; "
+            f"choose from {', '.join(WORKLOADS)} or audit"
+        )
+    else:
+        report = bench(
+            args.workload,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            algorithm=args.algorithm,
+            url=args.url,
+            user=args.user,
+            fast_path=args.fast_path,
+        )
+    print(format_table(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+def cmd_replay(args):
+    """Replay nginx-logged or synthetic pull-storm traffic against a server."""
+    from keypebble.replay import (
+        format_table,
+        parse_nginx_log,
+        replay,
+        synthetic_pull_storm,
+    )
+
+    if args.log:
+        stream = open(args.log)
+        events = parse_nginx_log(stream)
+    else:
+        stream = None
+        events = synthetic_pull_storm(
+            clients=args.clients,
+            layers=args.layers,
+            repo=args.repo,
+            user=args.user,
+            service=args.service,
+            layer_interval=args.layer_interval,
+            ramp=args.ramp,
+        )
+
+    try:
+        report = replay(
+            events,
+            args.url,
+            speed=args.speed,
+            max_in_flight=args.max_in_flight,
+            server_pid=args.server_pid,
+        )
+    finally:
+        if stream is not None:
+            stream.close()
+
+    print(format_table(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+def _start_sidecars(app, config: dict, config_path: str, policy_path, reloader):
+    """Start the daemon socket and cluster gossip ``config`` asks for."""
+    svc = config.get("service", {})
+    if svc.get("daemon_socket"):
+        from keypebble.daemon import MintDaemon, serve_daemon
+
+        daemon = MintDaemon(
+            config, config_path, app.policy_handler, policy_path, audit=app.audit
+        )
+        reloader.listeners.append(daemon.reload)
+        serve_daemon(svc["daemon_socket"], daemon)
+    if config.get("cluster"):
+        from keypebble.service.gossip import start_gossip
+
+        node = start_gossip(app, config["cluster"], policy_path)
+        reloader.listeners.append(node.on_reload)
+
+
+def _serve_wsgi(app, svc: dict, run=None):
+    """Serve ``app`` on ``service.socket_path``, or on ``service.host:port``."""
+    if svc.get("socket_path"):
+        from keypebble.service.unix import make_unix_server, parse_mode
+
+        path = svc["socket_path"]
+        server = make_unix_server(path, app, parse_mode(svc.get("socket_mode")))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(path):
+                os.unlink(path)
+        return
+
+    host = svc.get("host", "0.0.0.0")
+    port = svc.get("port", 8080)
+    if run is not None:
+        return run(host=host, port=port)
+    from werkzeug.serving import run_simple
+
+    run_simple(host, port, app, threaded=True)
+
+
 def cmd_serve(args):
     """Run Keypebble in service mode (Flask API)."""
+    import logging
+
+    log = logging.getLogger("keypebble")
+    if not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+
+    if args.tenants:
+        from keypebble.service.tenants import load_tenants
+
+        tenants = load_tenants(args.tenants)
+        for tenant in tenants.tenants.values():
+            _start_sidecars(
+                tenant.app,
+                tenant.config,
+                tenant.config_path,
+                tenant.policy_path,
+                tenant.reloader,
+            )
+        tenants.install()
+        return _serve_wsgi(tenants.router, tenants.service)
+
+    from keypebble.config import load_config
+    from keypebble.service.app import create_app
+    from keypebble.service.fast import install_fast_path
+    from keypebble.service.reload import Reloader
+
     config = load_config(args.config)
     policy_path = args.policy or "/etc/keypebble/policy.yaml"
     app = create_app(config, policy_path=policy_path)
+    if config.get("fast_path"):
+        install_fast_path(app)
+    reloader = Reloader(app, args.config, policy_path)
+    _start_sidecars(app, config, args.config, policy_path, reloader)
+    reloader.install()
 
-    svc = config.get("service", {})
-    host = svc.get("host", "0.0.0.0")
-    port = svc.get("port", 8080)
-    app.run(host=host, port=port)
+    _serve_wsgi(app, config.get("service", {}), run=app.run)
+
+
+def _add_batch_arguments(parser, batch_help: str):
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Always sign in-process, even if a keypebble daemon is listening",
+    )
+    parser.add_argument("--batch", metavar="FILE", help=batch_help)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for --batch (or multi-target) signing (default: 1)",
+    )
 
 
 def build_parser():
-    parser = argparse.ArgumentParser(description="Keypebble command-line interface")
+    parser = _Parser(description="Keypebble command-line interface")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # keypebble issue
@@ -90,6 +549,7 @@ def build_parser():
         action="store_true",
         help="Generate claims automatically from policy for the given user (ignores provided scope)",
     )
+    _add_batch_arguments(p_issue, "JSON Lines file of claim objects ('-' for stdin)")
 
     p_issue.set_defaults(func=cmd_issue)
 
@@ -97,19 +557,188 @@ def build_parser():
     p_cmd = subparsers.add_parser("command", help="Mint a signed command token")
     p_cmd.add_argument("--config", required=True, help="Path to YAML configuration")
     p_cmd.add_argument(
-        "--target", required=True, help="Target remote environment (maps to aud)"
+        "--target",
+        action="append",
+        help="Target remote environment (maps to aud); repeat to mint one token "
+        "per target, printed as JSON lines",
     )
+    p_cmd.add_argument("--command", dest="cmd", help="Command string to embed")
     p_cmd.add_argument(
-        "--command", dest="cmd", required=True, help="Command string to embed"
+        "--user", help="Issuing user (maps to sub; defaults to config issuer)"
+    )
+    _add_batch_arguments(
+        p_cmd,
+        "JSON Lines file of {user, target, command} objects or "
+        "[user, target, command] arrays ('-' for stdin)",
     )
     p_cmd.add_argument(
-        "--user", help="Issuing user (maps to sub; defaults to config issuer)"
+        "--merkle",
+        action="store_true",
+        help="Sign one Merkle root per batch of up to "
+        f"{MERKLE_BATCH} commands instead of one token each; prints batched "
+        "credentials as JSON lines",
     )
+    # --target/--command are required unless minting from --batch
+    p_cmd.batch_required = (("--target", "target"), ("--command", "cmd"))
     p_cmd.set_defaults(func=cmd_command)
 
+    # keypebble verify
+    p_verify = subparsers.add_parser(
+        "verify", help="Verify a stream of tokens (one per line)"
+    )
+    p_verify.add_argument("--config", required=True, help="Path to YAML configuration")
+    p_verify.add_argument(
+        "--input",
+        default="-",
+        metavar="FILE",
+        help="File with one token per line (default: '-' for stdin)",
+    )
+    p_verify.add_argument(
+        "--audience", help="Expected aud claim (defaults to config audience)"
+    )
+    p_verify.add_argument(
+        "--seen-db",
+        metavar="PATH",
+        help="Treat tokens as one-shot command tokens: reject a jti already "
+        "recorded in this SQLite database (shared across --jobs and processes)",
+    )
+    p_verify.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for verification (default: 1)",
+    )
+    p_verify.set_defaults(func=cmd_verify)
+
+    # keypebble bench
+    p_bench = subparsers.add_parser(
+        "bench", help="Measure throughput and latency of a token workload"
+    )
+    p_bench.add_argument(
+        "--workload",
+        default="v2-policy",
+        help="v2-policy, v2-generate, auth, ksa, command, or audit for the audit "
+        "log sink alone (default: v2-policy)",
+    )
+    p_bench.add_argument(
+        "--url",
+        help="Base URL of a running 'keypebble serve' (default: in-process test client)",
+    )
+    p_bench.add_argument(
+        "--concurrency", type=int, default=4, help="Concurrent clients (default: 4)"
+    )
+    p_bench.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds to run (default: 10)"
+    )
+    p_bench.add_argument(
+        "--algorithm",
+        choices=["HS256", "RS256"],
+        default="HS256",
+        help="Signing algorithm for in-process runs (default: HS256)",
+    )
+    p_bench.add_argument(
+        "--fast-path",
+        action="store_true",
+        help="Serve in-process runs through the raw WSGI fast path",
+    )
+    p_bench.add_argument(
+        "--user",
+        default="bench",
+        help="Identity sent with requests; must exist in the server policy for --url runs",
+    )
+    p_bench.add_argument(
+        "--audit-overflow",
+        choices=["block", "drop", "sample"],
+        default="drop",
+        help="Overflow policy for --workload audit (default: drop)",
+    )
+    p_bench.add_argument(
+        "--audit-fsync",
+        choices=["always", "interval", "never"],
+        default="interval",
+        help="fsync policy for --workload audit (default: interval)",
+    )
+    p_bench.add_argument(
+        "--audit-dir",
+        metavar="DIR",
+        help="Segment directory for --workload audit (default: a temporary directory)",
+    )
+    p_bench.add_argument("--json", metavar="FILE", help="Also write the report as JSON")
+    p_bench.set_defaults(func=cmd_bench)
+
+    # keypebble replay
+    p_replay = subparsers.add_parser(
+        "replay", help="Replay Docker pull-storm traffic against a running server"
+    )
+    p_replay.add_argument(
+        "--url", required=True, help="Base URL of a running 'keypebble serve'"
+    )
+    p_replay.add_argument(
+        "--log",
+        metavar="FILE",
+        help="nginx access log to replay (default: synthetic pull storm)",
+    )
+    p_replay.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Compress inter-arrival times by this factor (default: 1.0)",
+    )
+    p_replay.add_argument(
+        "--clients",
+        type=int,
+        default=10,
+        help="Synthetic: concurrent docker pulls (default: 10)",
+    )
+    p_replay.add_argument(
+        "--layers", type=int, default=8, help="Synthetic: layers per image (default: 8)"
+    )
+    p_replay.add_argument(
+        "--layer-interval",
+        type=float,
+        default=0.01,
+        help="Synthetic: seconds between a client's layer requests (default: 0.01)",
+    )
+    p_replay.add_argument(
+        "--ramp",
+        type=float,
+        default=0.0,
+        help="Synthetic: spread client start times over this many seconds (default: 0)",
+    )
+    p_replay.add_argument(
+        "--repo", default="bench/app-0", help="Synthetic: repository to pull"
+    )
+    p_replay.add_argument(
+        "--user", default="bench", help="Synthetic: X-Authenticated-User to send"
+    )
+    p_replay.add_argument(
+        "--service", default="bench-registry", help="Synthetic: service parameter"
+    )
+    p_replay.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=64,
+        help="Maximum concurrent outstanding requests (default: 64)",
+    )
+    p_replay.add_argument(
+        "--server-pid",
+        type=int,
+        help="PID of the server process, to report its CPU time per request (Linux)",
+    )
+    p_replay.add_argument(
+        "--json", metavar="FILE", help="Also write the report as JSON"
+    )
+    p_replay.set_defaults(func=cmd_replay)
+
     # keypebble serve
     p_serve = subparsers.add_parser("serve", help="Run Keypebble service mode")
-    p_serve.add_argument("--config", required=True, help="Path to YAML configuration")
+    p_source = p_serve.add_mutually_exclusive_group(required=True)
+    p_source.add_argument("--config", help="Path to YAML configuration")
+    p_source.add_argument(
+        "--tenants",
+        help="Path to a tenants file: several configs in one process, "
+        "routed by Host header or path prefix",
+    )
     p_serve.add_argument(
         "--policy",
         help="Optional path to policy configuration file (default: /etc/keypebble/policy.yaml)",
@@ -1,2 +1,16 @@
+from .command import TokenReplayedError as TokenReplayedError
 from .command import build_command_claims as build_command_claims
+from .command import verify_command_token as verify_command_token
+from .command_batch import issue_command_batch as issue_command_batch
+from .command_batch import verify_batched_command as verify_batched_command
+from .jti_store import MemoryJtiStore as MemoryJtiStore
+from .jti_store import SQLiteJtiStore as SQLiteJtiStore
+from .jti_store import open_jti_store as open_jti_store
+from .revocation import RevocationList as RevocationList
+from .revocation import TokenRevokedError as TokenRevokedError
+from .token import SigningKey as SigningKey
+from .token import TokenTooLargeError as TokenTooLargeError
+from .token import decode_token as decode_token
 from .token import issue_token as issue_token
+from .token import load_signing_key as load_signing_key
+from .token import load_verification_key as load_verification_key
@@ -1,41 +1,187 @@
+import re
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+
+# A resolver computes one claim from the request and its (pre-parsed) JSON body.
+Resolver = Callable[[Any, Any], Any]
+
+# One step of a body path: ``.key``, ``[0]`` / ``[-1]``, or ``["key.with.dots"]``.
+_STEP = re.compile(r"""\.([^.\[\]]+)|\[(-?\d+)\]|\[(["'])(.*?)\3\]""")
+
+
+def parse_path(path: str) -> Tuple[str | int, ...]:
+    """Split a body selector path into keys (``str``) and list indexes (``int``).
+
+    ``spec.audiences[0]`` → ``("spec", "audiences", 0)``. Raises ``ValueError``
+    for an empty or malformed path.
+    """
+    steps: List[str | int] = []
+    pos, text = 0, "." + path if path and path[0] != "[" else path
+    while pos < len(text):
+        match = _STEP.match(text, pos)
+        if not match:
+            raise ValueError(f"Malformed selector path {path!r} at offset {pos}")
+        key, index, _, quoted = match.groups()
+        if index is not None:
+            steps.append(int(index))
+        else:
+            steps.append(key if key is not None else quoted)
+        pos = match.end()
+    if not steps:
+        raise ValueError("Empty selector path")
+    return tuple(steps)
+
+
+def _walk(value: Any, steps: Tuple[str | int, ...]) -> Any:
+    for step in steps:
+        if type(step) is int:
+            if not isinstance(value, list) or not -len(value) <= step < len(value):
+                return None
+            value = value[step]
+        elif isinstance(value, dict):
+            value = value.get(step)
+        else:
+            return None
+    return value
+
+
+class ClaimPlan:
+    """A mapping compiled by ``ClaimBuilder.compile``; reusable across requests.
+
+    Literal entries are merged into one pre-built dict at compile time, so
+    a literal-only mapping costs a single dict copy per build. The request
+    body is parsed at most once per build, and only if a ``$.body.``
+    selector needs it.
+    """
+
+    __slots__ = ("literals", "resolvers", "needs_body")
+
+    def __init__(
+        self,
+        literals: Dict[str, Any],
+        resolvers: List[Tuple[str, Resolver]],
+        needs_body: bool,
+    ):
+        self.literals = literals
+        self.resolvers = resolvers
+        self.needs_body = needs_body
+
+    def build(self, request) -> Dict[str, Any]:
+        if not self.resolvers:
+            return dict(self.literals)
+        body = request.get_json(silent=True) if self.needs_body else None
+        return self.build_with(request, body)
+
+    def build_with(self, request, body: Any) -> Dict[str, Any]:
+        """Build from an already-parsed ``body`` (used for nested dicts)."""
+        claims = dict(self.literals)
+        for key, resolve in self.resolvers:
+            claims[key] = resolve(request, body)
+        return claims
+
+
+def _call(fn: Callable) -> Resolver:
+    return lambda request, body: fn(request)
+
+
+def _query(name: str) -> Resolver:
+    return lambda request, body: request.args.get(name)
+
+
+def _header(name: str) -> Resolver:
+    return lambda request, body: request.headers.get(name)
+
+
+def _path(name: str) -> Resolver:
+    return lambda request, body: (request.view_args or {}).get(name)
+
+
+def _body(path: str) -> Resolver:
+    steps = parse_path(path)
+    if len(steps) == 1 and type(steps[0]) is str:
+        # Flat ``$.body.key``: skip the walk loop.
+        (key,) = steps
+        return lambda request, body: body.get(key) if isinstance(body, dict) else None
+    return lambda request, body: _walk(body, steps)
+
+
+def _nested(plan: ClaimPlan) -> Resolver:
+    return lambda request, body: plan.build_with(request, body)
+
+
+# Selector prefix → resolver factory for the rest of the string.
+SELECTORS: Dict[str, Callable[[str], Resolver]] = {
+    "$.query.": _query,
+    "$.header.": _header,
+    "$.path.": _path,
+    "$.body.": _body,
+}
+
+
 class ClaimBuilder:
     """Builds a JWT claim dictionary from a mapping definition.
 
     Each mapping value may be:
       - callable(request) → computed dynamically
-      - string with prefix "$.query." or "$.body." → resolved from request
+      - string selector → resolved from the request:
+          ``$.query.<name>`` query parameter, ``$.header.<Name>`` header,
+          ``$.path.<name>`` URL path variable, ``$.body.<path>`` JSON body
+          field, where ``<path>`` may nest: ``spec.audiences[0]``
+      - dict containing any of the above → built recursively
       - any other literal → used as-is
 
+    A selector that finds nothing resolves to ``None``: a missing key, an
+    index out of range, or a step that doesn't fit the value's type
+    (indexing a dict, keying into a list or string). Malformed selector
+    paths raise ``ValueError`` at compile time.
+
     This follows a simple "triage builder pattern"—classify inputs by kind
-    (callable, selector, literal) and handle each deterministically.
-    The use of `continue` ensures no accidental overwriting or fall-through
-    side effects.
+    (callable, selector, literal) and handle each deterministically. The
+    triage runs once, in ``compile``; the resulting ``ClaimPlan`` only runs
+    the resolvers. Resolved claims are applied after the literals, so they
+    follow them in the built dict.
 
     Duck-type protocol for the ``request`` argument:
       - ``request.args`` — mapping supporting ``.get(key)`` (query parameters)
+      - ``request.headers`` — mapping supporting ``.get(name)``
+      - ``request.view_args`` — dict of URL path variables, or ``None``
       - ``request.method`` — string (HTTP verb, e.g. ``"GET"``)
       - ``request.get_json(silent=True)`` — returns parsed JSON body dict or ``None``
+
+    Only the attributes a mapping's selectors use are accessed.
     """
 
-    def build(self, request, mapping):
-        claims = {}
+    def compile(self, mapping: Mapping[str, Any]) -> ClaimPlan:
+        literals: Dict[str, Any] = {}
+        resolvers: List[Tuple[str, Resolver]] = []
+        needs_body = False
         for key, ref in mapping.items():
             # 1. Callable → run it
             if callable(ref):
-                claims[key] = ref(request)
+                resolvers.append((key, _call(ref)))
                 continue
 
-            # 2. Strings → interpret special prefixes
-            if isinstance(ref, str):
-                if ref.startswith("$.query."):
-                    claims[key] = request.args.get(ref[len("$.query.") :])
+            # 2. Strings → interpret selector prefixes
+            if isinstance(ref, str) and ref.startswith("$."):
+                prefix = ref[: ref.find(".", 2) + 1]
+                if factory := SELECTORS.get(prefix):
+                    resolvers.append((key, factory(ref[len(prefix) :])))
+                    needs_body = needs_body or prefix == "$.body."
                     continue
-                if ref.startswith("$.body."):
-                    body = request.get_json(silent=True) or {}
-                    claims[key] = body.get(ref[len("$.body.") :])
+
+            # 3. Dicts → compile recursively; literal-only dicts stay literal
+            if isinstance(ref, dict):
+                plan = self.compile(ref)
+                if plan.resolvers:
+                    resolvers.append((key, _nested(plan)))
+                    needs_body = needs_body or plan.needs_body
                     continue
 
-            # 3. Everything else → literal value (int, list, dict, etc.)
-            claims[key] = ref
+            # 4. Everything else → literal value (int, list, dict, etc.)
+            literals[key] = ref
 
-        return claims
+        return ClaimPlan(literals, resolvers, needs_body)
+
+    def build(self, request, mapping):
+        """Compile ``mapping`` and build it once; hold on to ``compile``'s
+        plan instead when the same mapping serves many requests."""
+        return self.compile(mapping).build(request)
@@ -1,6 +1,8 @@
 import uuid
 from datetime import datetime
 
+from .token import decode_token
+
 
 def build_command_claims(
     user: str,
@@ -27,3 +29,38 @@ def build_command_claims(
         "sub": user,
         "command": command,
     }
+
+
+class TokenReplayedError(Exception):
+    """Raised (as the cause of ``ValueError``) for a command token seen before."""
+
+
+def verify_command_token(
+    config: dict,
+    token: str,
+    seen,
+    target: str | None = None,
+    key=None,
+    revocations=None,
+) -> dict:
+    """Verify a one-shot command token and record its ``jti`` in ``seen``.
+
+    ``seen`` is a ``MemoryJtiStore`` or ``SQLiteJtiStore``; ``target`` is the
+    expected ``aud`` (defaults to config ``audience``). Raises ``ValueError``
+    if the token is invalid, revoked, lacks ``jti``/``exp``, or was already
+    presented — the token is only accepted the first time. A token without
+    a ``command`` claim, such as a batch root, is not a command token.
+    """
+    if target is not None:
+        config = dict(config, audience=target)
+    claims = decode_token(config, token, key=key, revocations=revocations)
+
+    jti, exp = claims.get("jti"), claims.get("exp")
+    if not jti or exp is None:
+        raise ValueError("Invalid token: command tokens must carry jti and exp")
+    if "command" not in claims:
+        raise ValueError("Invalid token: token carries no command")
+    if not seen.first_use(jti, exp):
+        e = TokenReplayedError(f"Token {jti} has already been used")
+        raise ValueError(f"Invalid token: {e}") from e
+    return claims
@@ -0,0 +1,252 @@
+"""Merkle-batched command tokens: one signature for many commands.
+
+``issue_command_batch`` builds the claims of every command with
+``build_command_claims``, hashes each claim set into a Merkle tree and signs
+only the root, as a JWT carrying ``merkle_root`` and ``merkle_leaves``.
+The root's ``typ`` and ``aud`` (``BATCH_ROOT_TYP``, ``BATCH_ROOT_AUDIENCE``)
+keep it from passing as a plain token, command or otherwise.
+Each command gets a *credential*::
+
+    <root JWT>~<base64url claims JSON>~<base64url inclusion proof>
+
+The proof holds the leaf index, the leaf count and one sibling hash per
+tree level, so it grows by 32 bytes each time the batch doubles.
+``verify_batched_command`` checks the root signature, recomputes the root
+from the claims and proof, and then applies the checks of
+``verify_command_token`` to the command's own claims: expiry, audience,
+revocation and one-shot ``jti``.
+
+Leaves and inner nodes are hashed with distinct prefixes (``0x00`` and
+``0x01``, as in RFC 6962) so an inner node can never pass as a leaf. On a
+level with an odd number of nodes, the last node is carried up unchanged.
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+import struct
+import time
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+import jwt
+
+from .command import TokenReplayedError, build_command_claims
+from .revocation import TokenRevokedError
+from .token import (
+    BATCH_ROOT_AUDIENCE,
+    BATCH_ROOT_TYP,
+    SigningKey,
+    decode_token,
+    issue_token,
+)
+
+SEPARATOR = "~"
+_PROOF_HEADER = struct.Struct(">II")  # leaf index, leaf count
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def leaf_hash(data: bytes) -> bytes:
+    return hashlib.sha256(b"\x00" + data).digest()
+
+
+def _node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def merkle_levels(leaves: List[bytes]) -> List[List[bytes]]:
+    """Every level of the tree over ``leaves``, from the leaves up to the root."""
+    if not leaves:
+        raise ValueError("A Merkle tree needs at least one leaf")
+    levels = [leaves]
+    while len(level := levels[-1]) > 1:
+        parents = [
+            _node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_proof(levels: List[List[bytes]], index: int) -> bytes:
+    """Encode the sibling path of leaf ``index`` as compact proof bytes."""
+    proof = [_PROOF_HEADER.pack(index, len(levels[0]))]
+    for level in levels[:-1]:
+        if index ^ 1 < len(level):
+            proof.append(level[index ^ 1])
+        index //= 2
+    return b"".join(proof)
+
+
+def root_from_proof(leaf: bytes, proof: bytes) -> Tuple[bytes, int]:
+    """Recompute the root from a leaf hash and proof; returns ``(root, count)``.
+
+    Raises ``ValueError`` if the proof is malformed for its leaf count.
+    """
+    if len(proof) < _PROOF_HEADER.size:
+        raise ValueError("inclusion proof is truncated")
+    index, count = _PROOF_HEADER.unpack_from(proof)
+    path = proof[_PROOF_HEADER.size :]
+    if index >= count:
+        raise ValueError("inclusion proof index is out of range")
+
+    node, offset, size = leaf, 0, count
+    while size > 1:
+        if index ^ 1 < size:
+            sibling = path[offset : offset + 32]
+            if len(sibling) != 32:
+                raise ValueError("inclusion proof is truncated")
+            offset += 32
+            if index & 1:
+                node = _node_hash(sibling, node)
+            else:
+                node = _node_hash(node, sibling)
+        index //= 2
+        size = (size + 1) // 2
+    if offset != len(path):
+        raise ValueError("inclusion proof has trailing data")
+    return node, count
+
+
+def issue_command_batch(
+    config: dict,
+    commands: Iterable[Tuple[str, str, str]],
+    now: datetime,
+    ttl: int,
+    signing_key: SigningKey | None = None,
+    jti_factory=lambda: uuid.uuid4().hex,
+) -> dict:
+    """Issue ``(user, target, command)`` triples under one signed Merkle root.
+
+    Returns ``{"root", "jti", "commands"}``: the root token, its ``jti`` and
+    one ``{"target", "credential", "jti"}`` per command, in input order.
+    The root's ``jti`` names the batch: revoking it revokes every command
+    in it. As for single command tokens, ``allowed_custom_claims`` is not
+    applied.
+    """
+    claim_sets, leaves = [], []
+    for user, target, command in commands:
+        claims = build_command_claims(
+            user=user,
+            command=command,
+            target=target,
+            config=config,
+            now=now,
+            ttl=ttl,
+            jti_factory=jti_factory,
+        )
+        data = json.dumps(claims, separators=(",", ":"), sort_keys=True).encode()
+        claim_sets.append((claims, _b64encode(data)))
+        leaves.append(leaf_hash(data))
+
+    levels = merkle_levels(leaves)
+    now_ts = int(now.timestamp())
+    root_claims = {
+        "typ": BATCH_ROOT_TYP,
+        "aud": BATCH_ROOT_AUDIENCE,
+        "iat": now_ts,
+        "nbf": now_ts,
+        "exp": now_ts + ttl,
+        "jti": jti_factory(),
+        "merkle_root": _b64encode(levels[-1][0]),
+        "merkle_leaves": len(leaves),
+    }
+    issue_config = dict(config)
+    issue_config.pop("allowed_custom_claims", None)
+    root = issue_token(issue_config, root_claims, signing_key=signing_key)
+
+    commands = []
+    for index, (claims, encoded) in enumerate(claim_sets):
+        proof = _b64encode(inclusion_proof(levels, index))
+        commands.append(
+            {
+                "target": claims["aud"],
+                "credential": SEPARATOR.join((root, encoded, proof)),
+                "jti": claims["jti"],
+            }
+        )
+    return {"root": root, "jti": root_claims["jti"], "commands": commands}
+
+
+def _check_claims(claims: dict, root_claims: dict, audience: str | None) -> None:
+    """The registered-claim checks ``jwt.decode`` would run on the command."""
+    now = time.time()
+    if claims["exp"] <= now:
+        e = jwt.ExpiredSignatureError("Signature has expired")
+    elif claims.get("nbf", 0) > now:
+        e = jwt.ImmatureSignatureError("The token is not yet valid (nbf)")
+    elif claims.get("iss") != root_claims.get("iss"):
+        e = jwt.InvalidIssuerError("Invalid issuer")
+    elif audience is None:
+        e = jwt.InvalidAudienceError("Invalid audience")
+    elif claims.get("aud") != audience:
+        e = jwt.InvalidAudienceError("Audience doesn't match")
+    else:
+        return
+    raise ValueError(f"Invalid token: {e}") from e
+
+
+def is_batched_credential(token: str) -> bool:
+    """True if ``token`` is a batched credential rather than a plain JWT."""
+    return SEPARATOR in token
+
+
+def verify_batched_command(
+    config: dict,
+    credential: str,
+    seen,
+    target: str | None = None,
+    key=None,
+    revocations=None,
+) -> dict:
+    """Verify a batched command credential and record its ``jti`` in ``seen``.
+
+    The counterpart of ``verify_command_token``, with the same arguments and
+    errors: returns the command's claims, or raises ``ValueError`` if the
+    root token is invalid or revoked, the proof does not lead to its root,
+    the command is expired, for another ``target`` (default: config
+    ``audience``), revoked, or was already presented. ``seen=None`` skips
+    the replay check, as ``decode_token`` would for a plain token.
+    """
+    try:
+        root, encoded, proof = credential.split(SEPARATOR)
+        data, proof_bytes = _b64decode(encoded), _b64decode(proof)
+        claims = json.loads(data)
+    except (ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid token: malformed batched credential ({e})") from e
+
+    root_claims = decode_token(
+        config, root, key=key, revocations=revocations, batch_root=True
+    )
+    try:
+        computed, count = root_from_proof(leaf_hash(data), proof_bytes)
+    except ValueError as e:
+        raise ValueError(f"Invalid token: {e}") from e
+    if (
+        count != root_claims.get("merkle_leaves")
+        or _b64encode(computed) != root_claims.get("merkle_root")
+        or not isinstance(claims, dict)
+    ):
+        raise ValueError("Invalid token: command is not part of the signed batch")
+
+    jti, exp = claims.get("jti"), claims.get("exp")
+    if not jti or not isinstance(exp, int):
+        raise ValueError("Invalid token: command tokens must carry jti and exp")
+    _check_claims(claims, root_claims, target or config.get("audience"))
+    if revocations is not None and revocations.is_revoked(jti):
+        e = TokenRevokedError(f"Token {jti} has been revoked")
+        raise ValueError(f"Invalid token: {e}") from e
+    if seen is not None and not seen.first_use(jti, exp):
+        e = TokenReplayedError(f"Token {jti} has already been used")
+        raise ValueError(f"Invalid token: {e}") from e
+    return claims
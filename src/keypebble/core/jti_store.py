@@ -0,0 +1,180 @@
+"""Stores of seen ``jti`` values for one-shot (command) token verification.
+
+A target that accepts a command token records its ``jti`` until the token's
+``exp``; a second presentation inside that window is a replay. Entries are
+forgotten once the token has expired, so memory is bounded by the number of
+live tokens.
+
+``MemoryJtiStore`` serves one process and expires entries through a
+hierarchical timing wheel: adding an entry and expiring it are both O(1),
+and advancing the clock visits only occupied slots, skipping idle
+seconds, so a long gap between requests costs nothing extra. ``SQLiteJtiStore`` keeps the same
+contract in a SQLite database in WAL mode, so several worker processes on
+one host share it; expiry there is an indexed range delete.
+"""
+
+import sqlite3
+import threading
+import time
+
+WHEEL_BITS = 6
+WHEEL_SLOTS = 1 << WHEEL_BITS  # 64 slots per level
+WHEEL_LEVELS = 4  # 1 s resolution, horizon 64**4 s (~194 days)
+
+
+class TimingWheel:
+    """Hierarchical timing wheel with one-second ticks.
+
+    Level ``n`` has 64 slots each spanning ``64**n`` seconds. An entry is
+    placed on the lowest level whose span covers its delay and cascades down
+    a level each time the level above turns over, so each entry moves at
+    most ``WHEEL_LEVELS`` times before it expires. Entries beyond the
+    horizon wait in the top level and are re-placed when it turns over.
+    """
+
+    def __init__(self, now: int):
+        self.tick = int(now)
+        self.levels = [[[] for _ in range(WHEEL_SLOTS)] for _ in range(WHEEL_LEVELS)]
+
+    def add(self, key, deadline: int) -> None:
+        """Schedule ``key`` to be returned by ``advance`` once ``deadline`` passes."""
+        self._place(key, max(int(deadline), self.tick + 1))
+
+    def _place(self, key, deadline: int) -> None:
+        delay = deadline - self.tick
+        level = 0
+        while level < WHEEL_LEVELS - 1 and delay >= WHEEL_SLOTS << (WHEEL_BITS * level):
+            level += 1
+        slot = (deadline >> (WHEEL_BITS * level)) & (WHEEL_SLOTS - 1)
+        self.levels[level][slot].append((deadline, key))
+
+    def advance(self, now: int) -> list:
+        """Move the clock to ``now``; returns keys whose deadline has passed."""
+        expired = []
+        while self.tick < int(now):
+            self.tick = self._next_busy_tick(int(now))
+            # Cascade every level whose slot boundary this tick crosses.
+            level = 1
+            while level < WHEEL_LEVELS and self.tick % (1 << (WHEEL_BITS * level)) == 0:
+                slot = (self.tick >> (WHEEL_BITS * level)) & (WHEEL_SLOTS - 1)
+                entries = self.levels[level][slot]
+                self.levels[level][slot] = []
+                for deadline, key in entries:
+                    if deadline <= self.tick:
+                        expired.append(key)
+                    else:
+                        self._place(key, deadline)
+                level += 1
+
+            slot = self.tick & (WHEEL_SLOTS - 1)
+            entries = self.levels[0][slot]
+            self.levels[0][slot] = []
+            for deadline, key in entries:
+                if deadline <= self.tick:
+                    expired.append(key)
+                else:
+                    self._place(key, deadline)
+        return expired
+
+    def _next_busy_tick(self, limit: int) -> int:
+        """First tick after ``tick`` visiting a non-empty slot, capped at ``limit``."""
+        best = limit
+        for level in range(WHEEL_LEVELS):
+            shift = WHEEL_BITS * level
+            # Level ``level`` visits a slot at every multiple of 64**level.
+            t = ((self.tick >> shift) + 1) << shift
+            for _ in range(WHEEL_SLOTS):
+                if t >= best:
+                    break
+                if self.levels[level][(t >> shift) & (WHEEL_SLOTS - 1)]:
+                    best = t
+                    break
+                t += 1 << shift
+        return best
+
+
+class MemoryJtiStore:
+    """In-process seen-``jti`` store; thread-safe."""
+
+    def __init__(self, now: float | None = None):
+        self._seen: dict[str, int] = {}
+        self._wheel = TimingWheel(int(time.time() if now is None else now))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def first_use(self, jti: str, exp: int, now: float | None = None) -> bool:
+        """Record ``jti`` until ``exp``; False if it was already recorded (a replay)."""
+        now = int(time.time() if now is None else now)
+        with self._lock:
+            for key in self._wheel.advance(now):
+                del self._seen[key]
+            if jti in self._seen:
+                return False
+            self._seen[jti] = exp
+            self._wheel.add(jti, exp)
+            return True
+
+
+class SQLiteJtiStore:
+    """Seen-``jti`` store in a SQLite database shared by processes on one host."""
+
+    # Delete expired rows after this many inserts from one process.
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._inserts = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_jti "
+            "(jti TEXT PRIMARY KEY, exp INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS seen_jti_exp ON seen_jti (exp)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self) -> int:
+        (count,) = (
+            self._conn()
+            .execute("SELECT COUNT(*) FROM seen_jti WHERE exp > ?", (int(time.time()),))
+            .fetchone()
+        )
+        return count
+
+    def first_use(self, jti: str, exp: int, now: float | None = None) -> bool:
+        """Record ``jti`` until ``exp``; False if it was already recorded (a replay)."""
+        now = int(time.time() if now is None else now)
+        conn = self._conn()
+        # One atomic statement: insert, or take over a row that has expired
+        # but not been purged yet. A live row is left alone (rowcount 0).
+        cur = conn.execute(
+            "INSERT INTO seen_jti (jti, exp) VALUES (?, ?) "
+            "ON CONFLICT (jti) DO UPDATE SET exp = excluded.exp "
+            "WHERE seen_jti.exp <= ?",
+            (jti, int(exp), now),
+        )
+        self._inserts += 1
+        if self._inserts % self.PURGE_EVERY == 0:
+            self.purge(now)
+        return cur.rowcount == 1
+
+    def purge(self, now: float | None = None) -> int:
+        """Delete rows for expired tokens; returns how many were deleted."""
+        now = int(time.time() if now is None else now)
+        cur = self._conn().execute("DELETE FROM seen_jti WHERE exp <= ?", (now,))
+        return cur.rowcount
+
+
+def open_jti_store(path: str | None = None):
+    """``SQLiteJtiStore`` at ``path``, or a ``MemoryJtiStore`` without one."""
+    return SQLiteJtiStore(path) if path else MemoryJtiStore()
@@ -32,6 +32,76 @@ def parse_scopes(scopes: list[str]) -> list[dict]:
     return result
 
 
+def merge_access(access: list[dict], collapse: bool = True) -> list[dict]:
+    """Merge entries for the same resource, unioning their actions.
+
+    Order is first appearance, and entries left without actions are
+    dropped. With ``collapse``, ``*`` subsumes every other action; pass
+    ``collapse=False`` for scopes a policy has yet to filter, which may
+    grant ``pull`` but not ``*``.
+    """
+    merged: dict[tuple[str, str], list[str]] = {}
+    for entry in access:
+        actions = merged.setdefault((entry["type"], entry["name"]), [])
+        actions.extend(a for a in entry["actions"] if a not in actions)
+    return [
+        {
+            "type": type_,
+            "name": name,
+            "actions": ["*"] if collapse and "*" in actions else actions,
+        }
+        for (type_, name), actions in merged.items()
+        if actions
+    ]
+
+
+def canonicalize_scopes(scopes: list[str], collapse: bool = True) -> list[str]:
+    """Normalize scope strings: one per resource, actions merged, malformed dropped.
+
+    ``collapse`` is passed to ``merge_access``.
+    """
+    return [
+        f"{e['type']}:{e['name']}:{','.join(e['actions'])}"
+        for e in merge_access(parse_scopes(scopes), collapse)
+    ]
+
+
+def compact_access(access: list[dict]) -> list[dict]:
+    """Group ``access`` entries by type, actions and namespace.
+
+    ``[{"type": "repository", "name": "team/app", "actions": ["pull"]}, ...]``
+    becomes ``[{"type": "repository", "actions": ["pull"], "prefix": "team/",
+    "names": ["app", ...]}]``, so a grant of hundreds of repositories in a
+    few namespaces costs a few bytes per repository. ``expand_access``
+    reverses it.
+    """
+    groups: dict[tuple, list[str]] = {}
+    for entry in access:
+        name = entry["name"]
+        prefix = name[: name.rfind("/") + 1]
+        key = (entry["type"], tuple(entry["actions"]), prefix)
+        groups.setdefault(key, []).append(name[len(prefix) :])
+    return [
+        {"type": type_, "actions": list(actions), "prefix": prefix, "names": names}
+        for (type_, actions, prefix), names in groups.items()
+    ]
+
+
+def expand_access(claims: dict) -> list[dict]:
+    """The standard ``access`` list of ``claims``, whichever encoding it uses."""
+    if "access_compact" in claims:
+        return [
+            {
+                "type": group["type"],
+                "name": group.get("prefix", "") + name,
+                "actions": list(group["actions"]),
+            }
+            for group in claims["access_compact"]
+            for name in group["names"]
+        ]
+    return claims.get("access", [])
+
+
 class Policy:
     """Unified policy class for access enforcement and claim generation."""
 
@@ -0,0 +1,132 @@
+"""Revocation list for token ``jti`` values.
+
+Entries live until the revoked token's own ``exp``: after that the token is
+rejected by its expiry anyway, so the entry is dropped and memory stays
+bounded by the number of tokens revoked within one token lifetime.
+
+Lookups are a single hash-table membership test, so the check for the
+common case — a token that was never revoked — costs well under a
+microsecond and takes no lock. Expired entries are pruned from a min-heap
+ordered by ``exp`` whenever a new revocation is recorded.
+
+With ``path`` set, revocations are also appended to a JSON Lines journal
+(``{"jti": ..., "exp": ...}`` per line) so they survive restarts and can be
+loaded by other verifiers such as ``keypebble verify``. A journal has one
+writer (the server); other processes open it with ``readonly=True``.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Rewrite the journal once it holds this many more lines than live entries.
+COMPACT_SLACK = 1000
+
+
+class TokenRevokedError(Exception):
+    """Raised (as the cause of ``ValueError``) for a token whose ``jti`` is revoked."""
+
+
+class RevocationList:
+    """Revoked ``jti`` values with their expiry times."""
+
+    def __init__(self, path: str | None = None, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._expiry: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+        self._lock = threading.Lock()
+        self._journal_lines = 0
+        if path:
+            self._load()
+
+    @classmethod
+    def from_config(cls, config: dict, readonly: bool = False) -> "RevocationList":
+        """Build from the optional ``revocation`` config section."""
+        return cls((config.get("revocation") or {}).get("path"), readonly)
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def is_revoked(self, jti: str | None) -> bool:
+        return jti is not None and jti in self._expiry
+
+    def entries(self) -> list[tuple[str, int]]:
+        """Snapshot of ``(jti, exp)`` pairs (may include just-expired ones)."""
+        with self._lock:
+            return list(self._expiry.items())
+
+    def revoke(self, jti: str, exp: int, now: float | None = None) -> None:
+        """Revoke ``jti`` until ``exp`` (a Unix timestamp)."""
+        if not jti:
+            raise ValueError("jti is required")
+        if self.readonly:
+            raise ValueError("revocation list is read-only")
+        exp = int(exp)
+        now = time.time() if now is None else now
+        with self._lock:
+            self._purge(now)
+            if exp <= now or self._expiry.get(jti, exp - 1) >= exp:
+                return  # already expired, or already revoked at least as long
+            self._expiry[jti] = exp
+            heapq.heappush(self._heap, (exp, jti))
+            if self.path:
+                self._append(jti, exp)
+
+    def purge(self, now: float | None = None) -> int:
+        """Drop entries whose tokens have expired; returns how many were dropped."""
+        with self._lock:
+            return self._purge(time.time() if now is None else now)
+
+    def _purge(self, now: float) -> int:
+        dropped = 0
+        while self._heap and self._heap[0][0] <= now:
+            exp, jti = heapq.heappop(self._heap)
+            # A jti revoked again with a later exp has a newer heap entry.
+            if self._expiry.get(jti) == exp:
+                del self._expiry[jti]
+                dropped += 1
+        if (
+            self.path
+            and not self.readonly
+            and self._journal_lines > len(self._expiry) + COMPACT_SLACK
+        ):
+            self._compact()
+        return dropped
+
+    # --- Journal -------------------------------------------------------------
+
+    def _load(self) -> None:
+        path = Path(self.path)
+        if path.exists():
+            now = time.time()
+            lines = path.read_text().splitlines()
+            self._journal_lines = len(lines)
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                    jti, exp = entry["jti"], int(entry["exp"])
+                except (ValueError, KeyError, TypeError):
+                    continue  # tolerate a torn final line
+                if exp > now and self._expiry.get(jti, exp - 1) < exp:
+                    self._expiry[jti] = exp
+        self._heap = [(exp, jti) for jti, exp in self._expiry.items()]
+        heapq.heapify(self._heap)
+        if not self.readonly:
+            self._compact()
+
+    def _append(self, jti: str, exp: int) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"jti": jti, "exp": exp}) + "\n")
+        self._journal_lines += 1
+
+    def _compact(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for jti, exp in self._expiry.items():
+                f.write(json.dumps({"jti": jti, "exp": exp}) + "\n")
+        os.replace(tmp, self.path)
+        self._journal_lines = len(self._expiry)
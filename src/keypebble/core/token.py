@@ -1,9 +1,14 @@
+import logging
 import time
 from pathlib import Path
 from typing import Any, Dict
 
 import jwt
 
+from .revocation import RevocationList, TokenRevokedError
+
+log = logging.getLogger(__name__)
+
 
 def _load_secret(config: dict) -> str:
     """Return HS256 secret from inline config or file path."""
@@ -51,10 +56,81 @@ def _load_x5c_chain(config: dict) -> list[str] | None:
 
 REGISTERED_CLAIMS = {"iss", "aud", "sub", "iat", "nbf", "exp", "jti"}
 
+# Batch roots (see ``command_batch``) carry this ``typ`` claim and audience,
+# so a root can never pass for a token of its own: ``decode_token`` rejects
+# it unless asked for a root, and no command target uses the audience.
+BATCH_ROOT_TYP = "keypebble-command-batch"
+BATCH_ROOT_AUDIENCE = "urn:keypebble:command-batch"
+
+
+class SigningKey:
+    """Algorithm, parsed key and JWT headers resolved once from config.
+
+    Build with ``load_signing_key`` and pass to ``issue_token`` to mint many
+    tokens without re-reading and re-parsing key files on every call.
+    """
+
+    def __init__(self, algorithm: str, key: Any, headers: Dict[str, Any]):
+        self.algorithm = algorithm
+        self.key = key
+        self.headers = headers
+
 
-def issue_token(config: dict, custom_claims: dict | None = None) -> str:
-    """Issue a signed JWT using HS256 or RS256, including optional kid/x5c headers."""
+def load_signing_key(config: dict) -> SigningKey:
+    """Load signing material for HS256 or RS256, including optional kid/x5c headers."""
     algorithm = config.get("algorithm", "HS256").upper()
+
+    # --- JWT header metadata ---
+    headers: Dict[str, Any] = {"typ": "JWT", "alg": algorithm}
+    if kid := config.get("key_id"):
+        headers["kid"] = kid
+    if algorithm == "RS256" and (x5c := _load_x5c_chain(config)):
+        headers["x5c"] = x5c
+
+    # --- Key material ---
+    if algorithm == "RS256":
+        pem = _load_private_key(config)
+        key = jwt.get_algorithm_by_name(algorithm).prepare_key(pem)
+    elif algorithm == "HS256":
+        key = _load_secret(config)
+    else:
+        raise ValueError(f"Unsupported algorithm: {algorithm}")
+
+    return SigningKey(algorithm, key, headers)
+
+
+class TokenTooLargeError(ValueError):
+    """Raised when a signed token exceeds ``token_size.max_bytes``."""
+
+
+def check_token_size(config: dict, token: str) -> None:
+    """Enforce the optional ``token_size.max_bytes`` budget on a signed token.
+
+    Registries and proxies cap header sizes (often 8 KiB), so an oversized
+    token is better refused, or at least logged, where it is issued.
+    """
+    budget = config.get("token_size") or {}
+    max_bytes = budget.get("max_bytes")
+    if max_bytes is None or len(token) <= int(max_bytes):
+        return
+    message = f"token is {len(token)} bytes, over the {max_bytes}-byte budget"
+    if budget.get("on_oversize", "reject") == "warn":
+        log.warning("%s", message)
+        return
+    raise TokenTooLargeError(message)
+
+
+def issue_token(
+    config: dict,
+    custom_claims: dict | None = None,
+    signing_key: SigningKey | None = None,
+) -> str:
+    """Issue a signed JWT using HS256 or RS256, including optional kid/x5c headers.
+
+    ``signing_key`` reuses material from ``load_signing_key``; by default the
+    key is loaded from ``config`` on each call. Raises ``TokenTooLargeError``
+    if the token breaks the ``token_size`` budget (see ``check_token_size``).
+    """
     now = int(time.time())
     ttl = int(config.get("default_ttl_seconds", 3600))
 
@@ -76,39 +152,69 @@ def issue_token(config: dict, custom_claims: dict | None = None) -> str:
         **(custom_claims or {}),
     }
 
-    # --- JWT header metadata ---
-    headers: Dict[str, Any] = {"typ": "JWT", "alg": algorithm}
-    if kid := config.get("key_id"):
-        headers["kid"] = kid
-    if algorithm == "RS256" and (x5c := _load_x5c_chain(config)):
-        headers["x5c"] = x5c
-
     # --- Signing ---
-    if algorithm == "RS256":
-        key = _load_private_key(config)
-    elif algorithm == "HS256":
-        key = _load_secret(config)
-    else:
-        raise ValueError(f"Unsupported algorithm: {algorithm}")
-
-    return jwt.encode(payload, key, algorithm=algorithm, headers=headers)
-
-
-def decode_token(config: dict, token: str) -> Dict[str, Any]:
-    """Decode and verify a JWT using configured secret or public key."""
+    signing_key = signing_key or load_signing_key(config)
+    token = jwt.encode(
+        payload,
+        signing_key.key,
+        algorithm=signing_key.algorithm,
+        headers=signing_key.headers,
+    )
+    check_token_size(config, token)
+    return token
+
+
+def load_verification_key(config: dict) -> Any:
+    """Load the HS256 secret or parsed RS256 public key used to verify tokens."""
     algorithm = config.get("algorithm", "HS256").upper()
-
-    if algorithm == "RS256":
-        key = _load_public_key(config)
-    else:
-        key = _load_secret(config)
+    if algorithm != "RS256":
+        return _load_secret(config)
+
+    key = jwt.get_algorithm_by_name(algorithm).prepare_key(_load_public_key(config))
+    # rs256_public_key falls back to the private key file; verify with its public half
+    if hasattr(key, "public_key"):
+        key = key.public_key()
+    return key
+
+
+def decode_token(
+    config: dict,
+    token: str,
+    key: Any = None,
+    revocations: RevocationList | None = None,
+    verify_audience: bool = True,
+    batch_root: bool = False,
+) -> Dict[str, Any]:
+    """Decode and verify a JWT using configured secret or public key.
+
+    ``key`` reuses material from ``load_verification_key``; by default it is
+    loaded from ``config`` on each call. With ``revocations``, a token whose
+    ``jti`` has been revoked is rejected. ``verify_audience=False`` accepts
+    any ``aud`` (callers such as introspection check it themselves).
+
+    Command batch roots are rejected; ``batch_root=True`` accepts only
+    them, checking ``BATCH_ROOT_AUDIENCE`` instead of the config audience.
+    """
+    algorithm = config.get("algorithm", "HS256").upper()
+    if key is None:
+        key = load_verification_key(config)
+    audience = BATCH_ROOT_AUDIENCE if batch_root else config.get("audience")
 
     try:
-        return jwt.decode(
+        claims = jwt.decode(
             token,
             key,
             algorithms=[algorithm],
-            audience=config.get("audience"),
+            audience=audience if verify_audience else None,
+            options={"verify_aud": verify_audience},
         )
     except jwt.InvalidTokenError as e:
         raise ValueError(f"Invalid token: {e}") from e
+    if (claims.get("typ") == BATCH_ROOT_TYP) != batch_root:
+        kind = "is not" if batch_root else "is"
+        raise ValueError(f"Invalid token: token {kind} a command batch root")
+
+    if revocations is not None and revocations.is_revoked(claims.get("jti")):
+        e = TokenRevokedError(f"Token {claims['jti']} has been revoked")
+        raise ValueError(f"Invalid token: {e}") from e
+    return claims
@@ -0,0 +1,171 @@
+"""Local minting daemon: warm keys and policy behind a Unix domain socket.
+
+``keypebble serve`` listens on ``service.daemon_socket`` when it is set, and
+``keypebble issue``/``command`` hand their request to it instead of importing
+PyJWT, parsing the key and loading the policy in a fresh process.
+
+Frames are a 4-byte big-endian length followed by a UTF-8 JSON object. A
+connection may carry any number of request/response pairs. Requests are::
+
+    {"op": "issue", "config": PATH, "policy": PATH | null, "generate": bool,
+     "item": {claims}}
+    {"op": "command", "config": PATH, "item": {"user", "target", "command"}}
+
+and responses are the same records ``--batch`` prints (``{"token": ...}``,
+``{"token": ..., "jti": ...}`` or ``{"error": ...}``). A daemon only mints for
+the config and policy files it was started with; anything else is answered
+with ``{"unavailable": reason}`` and the CLI signs in-process instead.
+
+The client half imports nothing beyond the standard library so delegating
+stays cheap; the server half is only imported by ``keypebble serve``.
+"""
+
+import json
+import os
+import socket
+import struct
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 1 << 20
+CLIENT_TIMEOUT_SECONDS = 5.0
+
+
+def send_frame(sock: socket.socket, payload: dict) -> None:
+    data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> dict | None:
+    """Read one frame; ``None`` on a clean end of stream."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+    data = _recv_exactly(sock, length)
+    if data is None:
+        raise ValueError("connection closed mid-frame")
+    return json.loads(data)
+
+
+# --- Client ------------------------------------------------------------------
+
+
+def socket_path(config: dict) -> str | None:
+    """Daemon socket for ``config``: ``$KEYPEBBLE_DAEMON_SOCKET`` or ``service.daemon_socket``."""
+    return os.environ.get("KEYPEBBLE_DAEMON_SOCKET") or (
+        config.get("service") or {}
+    ).get("daemon_socket")
+
+
+def request(path: str, payload: dict, timeout: float = CLIENT_TIMEOUT_SECONDS):
+    """Send one request to the daemon at ``path``.
+
+    Returns the response, or ``None`` when no daemon is reachable or it
+    cannot serve the request, so the caller can fall back to in-process
+    signing.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            send_frame(sock, payload)
+            response = recv_frame(sock)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(response, dict) or "unavailable" in response:
+        return None
+    return response
+
+
+# --- Server ------------------------------------------------------------------
+
+
+class MintDaemon:
+    """Answers framed mint requests with keys and policy loaded once."""
+
+    def __init__(self, config: dict, config_path: str, policy, policy_path, audit=None):
+        self.audit = audit
+        self.config_path = os.path.realpath(config_path)
+        self.policy_path = os.path.realpath(policy_path) if policy_path else None
+        self.reload(config, policy)
+
+    def reload(self, config: dict, policy) -> None:
+        """Swap in new config and policy; a ``service.reload`` listener."""
+        from keypebble.batch import command_state, issue_state
+
+        self.states = (
+            issue_state(config, policy, generate=False),
+            command_state(config, user=None),
+        )
+
+    def handle(self, req: dict) -> dict:
+        response = self._handle(req)
+        if self.audit is not None and "token" in response:
+            self.audit.record(f"daemon_{req['op']}", response["token"])
+        return response
+
+    def _handle(self, req: dict) -> dict:
+        from keypebble.batch import command_record, issue_record
+
+        if not isinstance(req, dict):
+            return {"unavailable": "malformed request"}
+        if os.path.realpath(str(req.get("config"))) != self.config_path:
+            return {"unavailable": "daemon serves a different config"}
+
+        issue_state, command_state = self.states
+        op = req.get("op")
+        if op == "issue":
+            policy = req.get("policy")
+            state = dict(issue_state, generate=bool(req.get("generate")))
+            if not policy:
+                state["policy"] = None
+            elif os.path.realpath(policy) != self.policy_path:
+                return {"unavailable": "daemon serves a different policy"}
+            return issue_record(req.get("item"), state)
+        if op == "command":
+            return command_record(req.get("item"), command_state)
+        return {"unavailable": f"unknown op {op!r}"}
+
+
+def serve_daemon(path: str, daemon: MintDaemon):
+    """Listen on ``path`` in a background thread; returns the server.
+
+    The socket is created owner-only (0600): anyone who can connect can mint.
+    A stale socket file from a previous run is replaced, but a live listener
+    on the same path is an error (see ``service.unix.claim_socket_path``).
+    """
+    import socketserver
+    import threading
+
+    from keypebble.service.unix import bind_privately, claim_socket_path
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                try:
+                    req = recv_frame(self.request)
+                except (OSError, ValueError):
+                    return
+                if req is None:
+                    return
+                send_frame(self.request, daemon.handle(req))
+
+    claim_socket_path(path)
+    with bind_privately(path, 0o600) as tmp:
+        server = socketserver.ThreadingUnixStreamServer(tmp, Handler)
+    server.server_address = path
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
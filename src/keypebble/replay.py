@@ -0,0 +1,162 @@
+"""Replay Docker pull-storm traffic against a running ``keypebble serve``.
+
+Events come from an nginx access log (the ``examples/docker-compose`` stack
+writes one to ``nginx_logs/``) or from a synthetic model of M clients each
+pulling an image with N layers. Each event is fired at its original offset
+from the first event, divided by ``speed``, so bursts keep their shape. The
+schedule is open-loop: a slow server does not slow down arrivals, it only
+shows up as latency (and as schedule lag if ``max_in_flight`` is exhausted).
+"""
+
+import http.client
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterable, Iterator, TextIO
+
+from keypebble.bench import http_sender, percentile, summarize
+
+# nginx "combined" format, optionally prefixed with $msec for sub-second timing:
+#   log_format replay '$msec $remote_addr - $remote_user [$time_local] "$request" ...';
+_LOG_LINE = re.compile(
+    r"^(?:(?P<msec>\d+\.\d+) )?\S+ \S+ (?P<user>\S+) \[(?P<time>[^\]]+)\] "
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3})'
+)
+
+
+def parse_nginx_log(stream: TextIO, path_prefix: str = "/v2/token") -> Iterator:
+    """Yield ``(timestamp, spec)`` for each token request in an nginx access log.
+
+    Only requests that reached keypebble are replayed: nginx answers
+    unauthenticated requests itself (``$remote_user`` is ``-``), so those
+    lines are skipped. Timestamps use ``$msec`` when present, else
+    ``$time_local`` (one-second resolution).
+    """
+    for line in stream:
+        m = _LOG_LINE.match(line)
+        if not m or not m["path"].startswith(path_prefix) or m["user"] == "-":
+            continue
+        if m["msec"]:
+            ts = float(m["msec"])
+        else:
+            ts = datetime.strptime(m["time"], "%d/%b/%Y:%H:%M:%S %z").timestamp()
+        yield ts, (m["method"], m["path"], {"X-Authenticated-User": m["user"]}, None)
+
+
+def synthetic_pull_storm(
+    clients: int,
+    layers: int,
+    repo: str = "bench/app-0",
+    user: str = "bench",
+    service: str = "bench-registry",
+    layer_interval: float = 0.01,
+    ramp: float = 0.0,
+) -> list:
+    """Model ``clients`` concurrent ``docker pull``s of an image with ``layers`` layers.
+
+    Client ``j`` starts at ``j * ramp / clients`` and requests a token for each
+    layer ``layer_interval`` seconds apart. Returns events sorted by time.
+    """
+    path = f"/v2/token?service={service}&scope=repository:{repo}:pull"
+    spec = ("GET", path, {"X-Authenticated-User": user}, None)
+    events = [
+        (j * ramp / clients + i * layer_interval, spec)
+        for j in range(clients)
+        for i in range(layers)
+    ]
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """User + system CPU seconds consumed so far by ``pid`` (Linux /proc)."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # fields[0] is state (field 3); utime and stime are fields 14 and 15
+    utime, stime = int(fields[11]), int(fields[12])
+    return (utime + stime) / os.sysconf("SC_CLK_TCK")
+
+
+def replay(
+    events: Iterable,
+    url: str,
+    speed: float = 1.0,
+    max_in_flight: int = 64,
+    server_pid: int | None = None,
+) -> dict:
+    """Fire ``events`` against ``url`` on their original schedule scaled by ``speed``."""
+    new_sender = http_sender(url)
+    local = threading.local()
+    lock = threading.Lock()
+    latencies: list[float] = []
+    lags: list[float] = []
+    errors = 0
+
+    def fire(spec, due):
+        nonlocal errors
+        send = getattr(local, "send", None)
+        if send is None:
+            send = local.send = new_sender()
+        started = time.perf_counter()
+        try:
+            ok = send(*spec) == 200
+        except (OSError, http.client.HTTPException):
+            local.send = None
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            lags.append(max(0.0, started - due))
+            if not ok:
+                errors += 1
+
+    cpu_before = process_cpu_seconds(server_pid) if server_pid else None
+    began = time.perf_counter()
+    first = None
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for ts, spec in events:
+            if first is None:
+                first = ts
+            due = began + (ts - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, spec, due)
+    elapsed = time.perf_counter() - began
+
+    report = {"target": url, "speed": speed, **summarize(latencies, errors, elapsed)}
+    lags.sort()
+    report["schedule_lag_ms"] = {
+        "p50": round(percentile(lags, 50) * 1000, 3),
+        "p99": round(percentile(lags, 99) * 1000, 3),
+        "max": round(lags[-1] * 1000, 3) if lags else 0.0,
+    }
+    if server_pid:
+        cpu = process_cpu_seconds(server_pid) - cpu_before
+        report["server_cpu_seconds"] = round(cpu, 3)
+        report["server_cpu_ms_per_request"] = (
+            round(cpu * 1000 / len(latencies), 3) if latencies else 0.0
+        )
+    return report
+
+
+def format_table(report: dict) -> str:
+    """Render a replay report as a small fixed-width table."""
+    rows = [
+        ("target", report["target"]),
+        ("speed", f"{report['speed']}x"),
+        ("requests", report["requests"]),
+        ("errors", report["errors"]),
+        ("throughput", f"{report['throughput_rps']:.1f} req/s"),
+        *((f"latency {k}", f"{v:.3f} ms") for k, v in report["latency_ms"].items()),
+        ("schedule lag p99", f"{report['schedule_lag_ms']['p99']:.3f} ms"),
+    ]
+    if "server_cpu_ms_per_request" in report:
+        rows.append(
+            ("server cpu/request", f"{report['server_cpu_ms_per_request']:.3f} ms")
+        )
+    width = max(len(name) for name, _ in rows)
+    return "\n".join(f"{name:<{width}}  {value}" for name, value in rows)
@@ -1,12 +1,137 @@
 # src/keypebble/service/app.py
+import json
+import threading
+import time
 from datetime import datetime, timezone
+from typing import Iterator
+
+import jwt
+from flask import Blueprint, Flask, current_app, g, jsonify, make_response, request
+
+from keypebble.core import (
+    RevocationList,
+    TokenTooLargeError,
+    build_command_claims,
+    issue_command_batch,
+    issue_token,
+    load_signing_key,
+    load_verification_key,
+)
+from keypebble.core.policy import (
+    Policy,
+    canonicalize_scopes,
+    compact_access,
+    merge_access,
+    parse_scopes,
+)
+from keypebble.service.audit import AuditLog
+from keypebble.service.coalesce import SingleFlight
+from keypebble.service.fanout import FanOut
+from keypebble.service.introspect import introspector_for
+from keypebble.service.ksa_cache import ksa_cache_for
+from keypebble.service.limits import AdmissionController
+from keypebble.service.metrics import Metrics
+from keypebble.service.responses import lean_token_body
+from keypebble.service.shared import SharedRevocationList, SharedState
 
-from flask import Blueprint, Flask, current_app, jsonify, make_response, request
+bp = Blueprint("basic", __name__)
 
-from keypebble.core import build_command_claims, issue_token
-from keypebble.core.policy import Policy, parse_scopes
+# Bounds on unauthenticated ``{"jti", "exp"}`` revocations (``revocation.*``).
+BARE_REVOCATION_DEFAULTS = {"max_ttl_seconds": 86400, "max_entries": 100000}
+
+
+@bp.before_request
+def admit_request():
+    """Apply configured size, rate and load-shedding limits before any signing."""
+    admission = getattr(current_app, "admission", None)
+    if admission is None or request.endpoint in ("basic.healthz", "basic.metrics"):
+        return None
+
+    identity = request.headers.get("X-Authenticated-User") or request.remote_addr
+    rejected = admission.admit(
+        identity or "anonymous", request.url_rule.rule, request.content_length
+    )
+    if rejected:
+        return _flask_response(*rejection_result(rejected))
+
+    g.admitted = True
+    return None
+
+
+@bp.teardown_request
+def release_request(exc):
+    if g.pop("admitted", False):
+        current_app.admission.release()
+
+
+def issuer_state(app) -> tuple:
+    """Return ``(config, policy, signing_key)`` for one request.
+
+    ``service.reload`` swaps config and policy together under
+    ``app.state_lock``, so a request reads them once, here, and finishes on
+    the state it started with even if a reload lands mid-request. The parsed
+    signing key is cached per config object.
+    """
+    with app.state_lock:
+        config, policy, cached = app.config, app.policy_handler, app.signing_key
+    if cached is None or cached[0] is not config:
+        try:
+            cached = (config, load_signing_key(config))
+        except ValueError:
+            # Misconfigured key: let issue_token raise where signing happens.
+            return config, policy, None
+        app.signing_key = cached
+    return config, policy, cached[1]
+
+
+def bare_revocation_limits(config: dict) -> dict:
+    """``BARE_REVOCATION_DEFAULTS`` overridden by the ``revocation`` block."""
+    conf = config.get("revocation") or {}
+    return {
+        key: int(conf.get(key, value))
+        for key, value in BARE_REVOCATION_DEFAULTS.items()
+    }
+
+
+def audit_token(app, endpoint: str, token: str) -> None:
+    """Queue an audit record of an issued token when ``audit`` is configured."""
+    audit = getattr(app, "audit", None)
+    if audit is not None:
+        audit.record(endpoint, token)
 
-bp = Blueprint("basic", __name__)
+
+def rejection_result(rejected: tuple) -> tuple[int, dict, dict]:
+    """Turn an ``AdmissionController.admit`` rejection into a handler result."""
+    status, error, retry_after = rejected
+    headers = {"Retry-After": str(retry_after)} if retry_after else {}
+    return status, {"error": error}, headers
+
+
+def wants_lean_response(config, header: str | None) -> bool:
+    """True if the config or the ``X-Lean-Response`` header opts into the minimal body."""
+    if config.get("lean_responses"):
+        return True
+    return (header or "").lower() == "true"
+
+
+def _flask_response(status: int, body, headers: dict | None = None):
+    """Wrap a ``(status, body, headers)`` handler result in a Flask response.
+
+    ``body`` is either a JSON-able dict, already-encoded JSON bytes, or an
+    iterator of bytes to stream. A streamed body is signed while the server
+    iterates it, so it keeps the request's admission slot until it is closed.
+    """
+    if not isinstance(body, dict):
+        resp = current_app.response_class(
+            body, status=status, mimetype="application/json"
+        )
+        if not isinstance(body, bytes) and g.pop("admitted", False):
+            resp.call_on_close(current_app.admission.release)
+    else:
+        resp = make_response(jsonify(body), status)
+    if headers:
+        resp.headers.update(headers)
+    return resp
 
 
 @bp.route("/healthz", methods=["GET"])
@@ -15,6 +140,13 @@ def healthz():
     return jsonify({"status": "ok"}), 200
 
 
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus exposition of this app's metrics."""
+    body, content_type = current_app.metrics.render()
+    return current_app.response_class(body, status=200, content_type=content_type)
+
+
 @bp.route("/auth", methods=["POST"])
 def auth():
     """Issue a JWT for the provided claims."""
@@ -22,7 +154,22 @@ def auth():
     if not isinstance(body, dict):
         return jsonify({"error": "invalid json"}), 400
 
-    token = issue_token(current_app.config, body)
+    admission = getattr(current_app, "admission", None)
+    max_claims = admission.max_auth_claims if admission else None
+    if max_claims is not None and len(body) > max_claims:
+        return jsonify({"error": "too many claims"}), 400
+
+    config, _, signing_key = issuer_state(current_app)
+    now = datetime.now(timezone.utc)
+    try:
+        token = issue_token(config, body, signing_key=signing_key)
+    except TokenTooLargeError as e:
+        return jsonify({"error": "token too large", "message": str(e)}), 400
+    audit_token(current_app, "auth", token)
+    if wants_lean_response(config, request.headers.get("X-Lean-Response")):
+        ttl = int(config.get("default_ttl_seconds", 3600))
+        issued_at = now.isoformat(timespec="seconds")
+        return _flask_response(200, lean_token_body(token, ttl, issued_at))
     return jsonify({"token": token, "claims": body}), 200
 
 
@@ -39,22 +186,30 @@ def build_v2_claims(
 ) -> dict:
     """Assemble JWT claims for a Docker registry token request.
     Raises ValueError if generate_mode is True and user not in policy.
+
+    Scopes are canonicalized (one entry per repository, actions merged);
+    with a policy, granted access is merged after filtering.
+    Grants larger than ``token_size.compact_access_over`` entries are sent
+    as ``access_compact`` (see ``core.policy.compact_access``) without the
+    redundant ``scope`` string.
     """
     if policy:
         if generate_mode:
             inferred = Policy.from_file(policy_path).generate_for(user)
-            final_scopes = inferred.get("scope", "").split()
+            final_scopes = canonicalize_scopes(inferred.get("scope", "").split())
             access_claims = parse_scopes(final_scopes)
         elif requested_scopes:
-            access_claims = policy.allowed_access(user, requested_scopes)
-            final_scopes = requested_scopes
+            # Filter the full union of actions first: collapsing to ``*``
+            # beforehand would drop actions the policy does grant.
+            final_scopes = canonicalize_scopes(requested_scopes)
+            access_claims = merge_access(policy.allowed_access(user, requested_scopes))
         else:
             access_claims, final_scopes = [], []
     else:
-        access_claims = parse_scopes(requested_scopes)
-        final_scopes = requested_scopes
+        final_scopes = canonicalize_scopes(requested_scopes)
+        access_claims = parse_scopes(final_scopes)
 
-    return {
+    claims = {
         "iss": config.get("issuer", "https://keypebble.local"),
         "aud": service_audience or config.get("audience", "docker-registry"),
         "iat": int(now.timestamp()),
@@ -65,66 +220,120 @@ def build_v2_claims(
         "scope": " ".join(final_scopes),
         "access": access_claims,
     }
+    compact_over = (config.get("token_size") or {}).get("compact_access_over")
+    if compact_over is not None and len(access_claims) > int(compact_over):
+        del claims["scope"], claims["access"]
+        claims["access_compact"] = compact_access(access_claims)
+    return claims
 
 
-@bp.route("/v2/token", methods=["GET"])
-def v2_token():
-    """Docker-style registry token endpoint with optional policy enforcement and generation."""
-    now = datetime.now(timezone.utc)
-    ttl = current_app.config.get("default_ttl_seconds", 3600)
+def collect_scopes(query_scopes: list[str], header_scopes: str | None) -> list[str]:
+    """Merge repeated ``?scope=`` params with the space-delimited ``X-Scopes`` header.
+
+    The result is canonical, so equivalent requests coalesce to one key.
+    ``*`` is not collapsed yet: the policy filters the full set of actions.
+    """
+    requested_scopes = list(query_scopes)
+    if header_scopes:
+        requested_scopes.extend(header_scopes.split())
+    return canonicalize_scopes(requested_scopes, collapse=False)
+
+
+def v2_token_result(
+    app,
+    user: str | None,
+    requested_scopes: list[str],
+    service_audience: str | None,
+    generate_requested: bool,
+    lean: bool,
+) -> tuple[int, dict | bytes, dict]:
+    """Framework-free core of ``GET /v2/token``.
+
+    Shared by the Flask route and the raw WSGI fast path so both behave
+    identically. Returns ``(status, body, headers)``.
+    """
+    config, policy, signing_key = issuer_state(app)
+    ttl = config.get("default_ttl_seconds", 3600)
 
     # --- 1. Identity ---
-    user = request.headers.get("X-Authenticated-User")
     if not user:
-        resp = make_response(jsonify({"error": "unauthenticated"}), 401)
-        resp.headers["WWW-Authenticate"] = 'Basic realm="Keypebble"'
-        return resp
-
-    # --- 2. Requested scopes ---
-    requested_scopes = []
-    if request.args.getlist("scope"):
-        requested_scopes.extend(request.args.getlist("scope"))
-    if request.headers.get("X-Scopes"):
-        requested_scopes.extend(request.headers.get("X-Scopes").split())
-
-    # --- 3. Build claims ---
-    policy = getattr(current_app, "policy_handler", None)
-    policy_path = current_app.config.get("POLICY_PATH")
-    generate_mode = (
-        policy is not None
-        and request.headers.get("X-Policy-Generate", "").lower() == "true"
-    )
+        return (
+            401,
+            {"error": "unauthenticated"},
+            {"WWW-Authenticate": 'Basic realm="Keypebble"'},
+        )
 
+    # --- 2. Build claims and sign ---
+    policy_path = config.get("POLICY_PATH")
+    generate_mode = policy is not None and generate_requested
+
+    def mint():
+        # Returns (now, claims, token), or (now, None, message) on policy denial.
+        now = datetime.now(timezone.utc)
+        try:
+            claims = build_v2_claims(
+                user=user,
+                requested_scopes=requested_scopes,
+                policy=policy,
+                policy_path=policy_path,
+                generate_mode=generate_mode,
+                config=config,
+                service_audience=service_audience,
+                now=now,
+                ttl=ttl,
+            )
+        except ValueError as e:
+            return now, None, str(e)
+        token = issue_token(config, claims, signing_key=signing_key)
+        audit_token(app, "v2_token", token)
+        return now, claims, token
+
+    singleflight = getattr(app, "singleflight", None)
     try:
-        claims = build_v2_claims(
-            user=user,
-            requested_scopes=requested_scopes,
-            policy=policy,
-            policy_path=policy_path,
-            generate_mode=generate_mode,
-            config=current_app.config,
-            service_audience=request.args.get("service"),
-            now=now,
-            ttl=ttl,
-        )
-    except ValueError as e:
-        return jsonify({"error": "unauthorized", "message": str(e)}), 403
+        if singleflight is None:
+            now, claims, token = mint()
+        else:
+            key = (user, tuple(requested_scopes), service_audience, generate_mode)
+            now, claims, token = singleflight.do(key, mint)
+    except TokenTooLargeError as e:
+        return 400, {"error": "token too large", "message": str(e)}, {}
+
+    if claims is None:
+        return 403, {"error": "unauthorized", "message": token}, {}
+
+    # --- 3. Respond (response shape is per request, even for shared tokens) ---
+    issued_at = now.isoformat(timespec="seconds")
+    if lean:
+        return 200, lean_token_body(token, ttl, issued_at), {}
+    return (
+        200,
+        {
+            "token": token,
+            "access_token": token,
+            "expires_in": ttl,
+            "issued_at": issued_at,
+            "nbf": now,
+            "claims": claims,
+        },
+        {},
+    )
 
-    token = issue_token(current_app.config, claims)
 
-    return (
-        jsonify(
-            {
-                "token": token,
-                "access_token": token,
-                "expires_in": ttl,
-                "issued_at": now.isoformat(timespec="seconds"),
-                "nbf": now,
-                "claims": claims,
-            }
+@bp.route("/v2/token", methods=["GET"])
+def v2_token():
+    """Docker-style registry token endpoint with optional policy enforcement and generation."""
+    headers = request.headers
+    result = v2_token_result(
+        current_app,
+        user=headers.get("X-Authenticated-User"),
+        requested_scopes=collect_scopes(
+            request.args.getlist("scope"), headers.get("X-Scopes")
         ),
-        200,
+        service_audience=request.args.get("service"),
+        generate_requested=headers.get("X-Policy-Generate", "").lower() == "true",
+        lean=wants_lean_response(current_app.config, headers.get("X-Lean-Response")),
     )
+    return _flask_response(*result)
 
 
 def build_ksa_claims(
@@ -153,6 +362,26 @@ def build_ksa_claims(
     }
 
 
+def ksa_minter(app, config: dict, signing_key):
+    """Return ``mint(namespace, name, audiences, ttl) -> (token, exp)`` for
+    ``config``; also run by the ``ksa_cache`` refresh worker."""
+
+    def mint(namespace: str, name: str, audiences: list, ttl: int) -> tuple:
+        claims = build_ksa_claims(
+            namespace=namespace,
+            service_account_name=name,
+            audiences=audiences,
+            config=dict(config),
+            now=datetime.now(timezone.utc),
+            ttl=ttl,
+        )
+        token = issue_token(config, claims, signing_key=signing_key)
+        audit_token(app, "ksa_token", token)
+        return token, claims["exp"]
+
+    return mint
+
+
 @bp.route(
     "/apis/authentication.k8s.io/v1/namespaces/<namespace>/serviceaccounts/<name>/token",
     methods=["POST"],
@@ -168,23 +397,20 @@ def ksa_token(namespace: str, name: str):
     if not audiences:
         return jsonify({"error": "spec.audiences is required"}), 400
 
-    ttl = int(
-        spec.get("expirationSeconds")
-        or current_app.config.get("default_ttl_seconds", 3600)
-    )
-    now = datetime.now(timezone.utc)
-
-    claims = build_ksa_claims(
-        namespace=namespace,
-        service_account_name=name,
-        audiences=audiences,
-        config=dict(current_app.config),
-        now=now,
-        ttl=ttl,
-    )
+    app = current_app._get_current_object()
+    config, _, signing_key = issuer_state(app)
+    ttl = int(spec.get("expirationSeconds") or config.get("default_ttl_seconds", 3600))
 
-    token = issue_token(current_app.config, claims)
-    expiry = datetime.fromtimestamp(claims["exp"], tz=timezone.utc)
+    mint = ksa_minter(app, config, signing_key)
+    cache = ksa_cache_for(app, config, mint)
+    try:
+        if cache is not None:
+            token, exp = cache.get(namespace, name, audiences, ttl)
+        else:
+            token, exp = mint(namespace, name, audiences, ttl)
+    except TokenTooLargeError as e:
+        return jsonify({"error": "token too large", "message": str(e)}), 400
+    expiry = datetime.fromtimestamp(exp, tz=timezone.utc)
 
     return (
         jsonify(
@@ -201,30 +427,32 @@ def ksa_token(namespace: str, name: str):
     )
 
 
-@bp.route("/command/token", methods=["POST"])
-def command_token():
-    """Issue a signed command token with an auto-generated nonce."""
-    body = request.get_json(silent=True)
+def command_token_result(app, body, ndjson: bool = False) -> tuple[int, dict, dict]:
+    """Framework-free core of ``POST /command/token``; see ``v2_token_result``.
+
+    A body with ``targets`` instead of ``target`` is a fan-out request, see
+    ``command_fanout_result``; ``ndjson`` selects its streaming format.
+    """
     if not isinstance(body, dict):
-        return jsonify({"error": "invalid or missing request body"}), 400
+        return 400, {"error": "invalid or missing request body"}, {}
+    if "targets" in body:
+        return command_fanout_result(app, body, ndjson)
 
     target = body.get("target")
     if not target:
-        return jsonify({"error": "target is required"}), 400
+        return 400, {"error": "target is required"}, {}
 
     command = body.get("command")
     if not command:
-        return jsonify({"error": "command is required"}), 400
+        return 400, {"error": "command is required"}, {}
 
     # NOTE: defaults to "anonymous"; CLI defaults to config issuer
     user = body.get("user", "anonymous")
-    ttl = int(
-        body.get("expirationSeconds")
-        or current_app.config.get("default_ttl_seconds", 3600)
-    )
+    config, _, signing_key = issuer_state(app)
+    ttl = int(body.get("expirationSeconds") or config.get("default_ttl_seconds", 3600))
     now = datetime.now(timezone.utc)
 
-    cfg = dict(current_app.config)
+    cfg = dict(config)
     claims = build_command_claims(
         user=user,
         command=command,
@@ -236,30 +464,287 @@ def command_token():
 
     # Structured claim builders produce trusted claims — skip allowlist filter
     cfg.pop("allowed_custom_claims", None)
-    token = issue_token(cfg, claims)
+    try:
+        token = issue_token(cfg, claims, signing_key=signing_key)
+    except TokenTooLargeError as e:
+        return 400, {"error": "token too large", "message": str(e)}, {}
+    audit_token(app, "command_token", token)
 
     return (
-        jsonify(
-            {
-                "token": token,
-                "jti": claims["jti"],
-                "expires_in": ttl,
-                "issued_at": now.isoformat(timespec="seconds"),
-            }
-        ),
         200,
+        {
+            "token": token,
+            "jti": claims["jti"],
+            "expires_in": ttl,
+            "issued_at": now.isoformat(timespec="seconds"),
+        },
+        {},
     )
 
 
+def command_fanout_result(app, body: dict, ndjson: bool = False) -> tuple:
+    """One command token per entry of ``body["targets"]``, streamed.
+
+    Everything but ``aud`` and ``jti`` is resolved once for the batch, and
+    tokens are signed on ``app.fanout``'s thread pool. The body is an
+    iterator of JSON bytes: a single ``{"expires_in", "issued_at",
+    "tokens": [...]}`` document, or with ``ndjson`` one object per line.
+    Each entry is ``{"target", "token", "jti"}``, or ``{"target", "error"}``
+    if that token could not be issued.
+
+    With ``"mode": "merkle"`` one root token is signed for the whole batch
+    (see ``keypebble.core.command_batch``); entries carry a ``credential``
+    instead of a ``token``, and the document a ``batch_jti``; as NDJSON,
+    every line carries ``batch_jti``, ``expires_in`` and ``issued_at``.
+    """
+    targets = body.get("targets")
+    if "target" in body:
+        return 400, {"error": "use either target or targets, not both"}, {}
+    if (
+        not isinstance(targets, list)
+        or not targets
+        or not all(isinstance(t, str) and t for t in targets)
+    ):
+        return 400, {"error": "targets must be a non-empty list of strings"}, {}
+    if len(targets) > app.fanout.max_targets:
+        error = f"at most {app.fanout.max_targets} targets per request"
+        return 400, {"error": error}, {}
+
+    command = body.get("command")
+    if not command:
+        return 400, {"error": "command is required"}, {}
+    mode = body.get("mode", "tokens")
+    if mode not in ("tokens", "merkle"):
+        return 400, {"error": "mode must be 'tokens' or 'merkle'"}, {}
+
+    user = body.get("user", "anonymous")
+    config, _, signing_key = issuer_state(app)
+    ttl = int(body.get("expirationSeconds") or config.get("default_ttl_seconds", 3600))
+    now = datetime.now(timezone.utc)
+    if signing_key is None:
+        signing_key = load_signing_key(config)  # raises like issue_token would
+
+    cfg = dict(config)
+    # Structured claim builders produce trusted claims — skip allowlist filter
+    issue_cfg = dict(cfg)
+    issue_cfg.pop("allowed_custom_claims", None)
+
+    def sign(target: str) -> dict:
+        claims = build_command_claims(
+            user=user, command=command, target=target, config=cfg, now=now, ttl=ttl
+        )
+        try:
+            token = issue_token(issue_cfg, claims, signing_key=signing_key)
+        except ValueError as e:
+            return {"target": target, "error": str(e)}
+        audit_token(app, "command_token", token)
+        return {"target": target, "token": token, "jti": claims["jti"]}
+
+    head = {"expires_in": ttl, "issued_at": now.isoformat(timespec="seconds")}
+    if mode == "merkle":
+        batch = issue_command_batch(
+            cfg, [(user, t, command) for t in targets], now, ttl, signing_key
+        )
+        audit_token(app, "command_batch", batch["root"])
+        for issued in batch["commands"]:
+            audit_token(app, "command_token", issued["credential"])
+        head["batch_jti"] = batch["jti"]
+        if ndjson:
+            # No document head to carry them: repeat on every line.
+            results = ({**r, **head} for r in batch["commands"])
+        else:
+            results = iter(batch["commands"])
+    else:
+        results = app.fanout.map(sign, targets)
+
+    if ndjson:
+        lines = (json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in results)
+        return 200, lines, {"Content-Type": "application/x-ndjson"}
+
+    return 200, _json_stream(head, "tokens", results), {}
+
+
+def _json_stream(head: dict, key: str, items) -> Iterator[bytes]:
+    """Encode ``{**head, key: list(items)}`` piecewise, one item at a time."""
+    yield json.dumps(head, separators=(",", ":"))[:-1].encode()
+    yield f',"{key}":['.encode()
+    for i, item in enumerate(items):
+        yield (b"," if i else b"") + json.dumps(item, separators=(",", ":")).encode()
+    yield b"]}\n"
+
+
+def wants_ndjson(accept: str | None) -> bool:
+    """True if the ``Accept`` header asks for newline-delimited JSON."""
+    return "application/x-ndjson" in (accept or "")
+
+
+@bp.route("/command/token", methods=["POST"])
+def command_token():
+    """Issue a signed command token with an auto-generated nonce."""
+    body = request.get_json(silent=True)
+    ndjson = wants_ndjson(request.headers.get("Accept"))
+    # A fan-out body streams after the request context is gone.
+    app = current_app._get_current_object()
+    return _flask_response(*command_token_result(app, body, ndjson))
+
+
+@bp.route("/revoke", methods=["POST"])
+def revoke():
+    """Revoke a token by ``jti`` until it expires.
+
+    Accepts ``{"token": "<jwt>"}`` (signature checked, expiry not) or
+    ``{"jti": "...", "exp": <unix time>}``. The bare form needs no key, so
+    its ``exp`` may be at most ``revocation.max_ttl_seconds`` ahead and it
+    is refused with 503 once ``revocation.max_entries`` revocations are
+    held. Signed tokens are always accepted: the issuer bounds those.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "invalid or missing request body"}), 400
+
+    config, _, _ = issuer_state(current_app)
+    if "token" in body:
+        try:
+            claims = jwt.decode(
+                body["token"],
+                load_verification_key(config),
+                algorithms=[config.get("algorithm", "HS256").upper()],
+                options={"verify_exp": False, "verify_aud": False},
+            )
+        except jwt.InvalidTokenError as e:
+            return jsonify({"error": "invalid token", "message": str(e)}), 400
+        jti, exp = claims.get("jti"), claims.get("exp")
+    else:
+        jti, exp = body.get("jti"), body.get("exp")
+
+    if not isinstance(jti, str) or not jti:
+        return jsonify({"error": "jti is required"}), 400
+    if not isinstance(exp, int) or isinstance(exp, bool):
+        return jsonify({"error": "exp is required"}), 400
+    # A signed token's exp is the issuer's own; a bare one is only a claim.
+    if "token" not in body:
+        limits = bare_revocation_limits(config)
+        if exp > time.time() + limits["max_ttl_seconds"]:
+            error = f"exp is more than {limits['max_ttl_seconds']} seconds ahead"
+            return jsonify({"error": error}), 400
+        revocations = current_app.revocations
+        if len(revocations) >= limits["max_entries"]:
+            revocations.purge()
+            if len(revocations) >= limits["max_entries"]:
+                return jsonify({"error": "revocation list is full"}), 503
+
+    try:
+        current_app.revocations.revoke(jti, exp)
+    except ValueError as e:  # shared revocation table full
+        return jsonify({"error": str(e)}), 503
+    if current_app.gossip is not None:
+        current_app.gossip.revoked(jti, exp)
+    return jsonify({"jti": jti, "revoked": True, "expires_at": exp}), 200
+
+
+@bp.route("/cluster", methods=["GET"])
+def cluster():
+    """This node's view of the gossip cluster."""
+    if current_app.gossip is None:
+        return jsonify({"error": "cluster mode is not enabled"}), 404
+    return jsonify(current_app.gossip.status()), 200
+
+
+def _introspection_params() -> dict:
+    """RFC 7662 form parameters, or the same fields as a JSON object."""
+    if request.form:
+        return request.form.to_dict()
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+
+@bp.route("/introspect", methods=["POST"])
+def introspect():
+    """RFC 7662 token introspection: ``token`` (and optional ``audience``)."""
+    params = _introspection_params()
+    token = params.get("token")
+    if not isinstance(token, str) or not token:
+        return jsonify({"error": "invalid_request"}), 400
+
+    config, _, _ = issuer_state(current_app)
+    result = introspector_for(current_app, config).introspect(
+        token,
+        revocations=current_app.revocations,
+        audience=params.get("audience"),
+        metrics=current_app.metrics,
+    )
+    return jsonify(result), 200
+
+
+@bp.route("/introspect/batch", methods=["POST"])
+def introspect_batch():
+    """Introspect ``{"tokens": [...]}``; results come back in the same order."""
+    body = request.get_json(silent=True)
+    tokens = body.get("tokens") if isinstance(body, dict) else None
+    if not isinstance(tokens, list):
+        return jsonify({"error": "invalid_request"}), 400
+
+    config, _, _ = issuer_state(current_app)
+    introspector = introspector_for(current_app, config)
+    if len(tokens) > introspector.max_batch:
+        return (
+            jsonify({"error": f"at most {introspector.max_batch} tokens per batch"}),
+            400,
+        )
+
+    results = [
+        introspector.introspect(
+            token,
+            revocations=current_app.revocations,
+            audience=body.get("audience"),
+            metrics=current_app.metrics,
+        )
+        for token in tokens
+    ]
+    return jsonify({"results": results}), 200
+
+
+def configure(app_config, config: dict, policy_path: str | None) -> None:
+    """Load keypebble ``config`` into a Flask config object."""
+    app_config.update(config)
+    if policy_path:
+        app_config["POLICY_PATH"] = policy_path
+    limits = config.get("limits")
+    if limits and limits.get("max_body_bytes") is not None:
+        app_config["MAX_CONTENT_LENGTH"] = int(limits["max_body_bytes"])
+
+
 def create_app(config: dict | None = None, policy_path: str | None = None):
     """Flask application factory."""
     app = Flask(__name__)
-    app.config.update(config or {})
-    if policy_path:
-        app.config["POLICY_PATH"] = policy_path
-        app.policy_handler = Policy.from_file(policy_path)
+    configure(app.config, config or {}, policy_path)
+    app.policy_handler = Policy.from_file(policy_path) if policy_path else None
+    app.state_lock = threading.Lock()
+    app.signing_key = None
+    app.metrics = Metrics()
+    shared = app.config.get("shared_state")
+    app.shared_state = SharedState(shared) if shared else None
+    if app.shared_state is not None:
+        app.revocations = SharedRevocationList(
+            app.shared_state.revocations,
+            (app.config.get("revocation") or {}).get("path"),
+        )
     else:
-        app.policy_handler = None
+        app.revocations = RevocationList.from_config(app.config)
+    app.introspector = None
+    app.ksa_cache = None
+    app.gossip = None
+    audit = app.config.get("audit")
+    app.audit = AuditLog(audit, metrics=app.metrics) if audit else None
+
+    limits = app.config.get("limits")
+    app.admission = (
+        AdmissionController(limits, shared=app.shared_state) if limits else None
+    )
+
+    app.singleflight = SingleFlight() if app.config.get("coalesce_requests") else None
+    app.fanout = FanOut(app.config.get("command_fanout"))
+
     app.register_blueprint(bp)
 
     return app
@@ -0,0 +1,220 @@
+"""Asynchronous, batched audit log of issued tokens.
+
+Request handlers call ``AuditLog.record(endpoint, token)``, which appends a
+tuple to a bounded ring buffer and returns: a ``collections.deque`` append
+is atomic under the GIL, so the hot path takes no lock and does no
+encoding or I/O. A background writer thread drains the buffer in batches
+and appends one JSON line per token to the current segment file::
+
+    {"ts":1700000000.123,"endpoint":"v2_token","claims":{"iss":...,"sub":...}}
+
+``claims`` is the token's payload exactly as signed (``jti``, ``sub``,
+``aud``, ``exp``, the granted ``access``/``scope`` ...), spliced in after a
+base64 decode rather than re-encoded, which keeps the writer several times
+faster than parsing and re-serializing every payload. A Merkle-batched
+command credential (``root~claims~proof``) is logged with its own claims.
+
+Segments are append-only files named ``audit-<UTC start>-<pid>-<n>.jsonl``
+that rotate by size and age. ``fsync`` is ``always`` (after every batch),
+``interval`` (at most every ``fsync_interval_seconds``) or ``never`` (left
+to the OS).
+
+When the buffer is full the ``overflow`` policy decides: ``block`` waits
+for the writer (no record is lost, requests slow down), ``drop`` discards
+and counts the record, and ``sample`` starts keeping one record in
+``sample_every`` once the buffer is half full; kept records carry
+``"sample_weight"`` so totals can be estimated, and the rest are counted.
+"""
+
+import atexit
+import base64
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+OVERFLOW_POLICIES = ("block", "drop", "sample")
+FSYNC_POLICIES = ("always", "interval", "never")
+
+DEFAULTS = {
+    "buffer_size": 65536,
+    "batch_size": 1024,
+    "flush_interval_ms": 100,
+    "segment_bytes": 64 * 1024 * 1024,
+    "segment_seconds": 3600,
+    "fsync": "interval",
+    "fsync_interval_seconds": 1.0,
+    "overflow": "drop",
+    "sample_every": 10,
+}
+
+
+class AuditLog:
+    """Ring buffer plus background segment writer, built from the ``audit`` config."""
+
+    def __init__(self, conf: dict, metrics=None):
+        settings = {**DEFAULTS, **conf}
+        if not settings.get("dir"):
+            raise ValueError("audit.dir is required")
+        if settings["overflow"] not in OVERFLOW_POLICIES:
+            raise ValueError(f"audit.overflow must be one of {OVERFLOW_POLICIES}")
+        if settings["fsync"] not in FSYNC_POLICIES:
+            raise ValueError(f"audit.fsync must be one of {FSYNC_POLICIES}")
+
+        self.dir = Path(settings["dir"])
+        self.capacity = int(settings["buffer_size"])
+        self.batch_size = int(settings["batch_size"])
+        self.flush_interval = int(settings["flush_interval_ms"]) / 1000
+        self.segment_bytes = int(settings["segment_bytes"])
+        self.segment_seconds = float(settings["segment_seconds"])
+        self.fsync = settings["fsync"]
+        self.fsync_interval = float(settings["fsync_interval_seconds"])
+        self.overflow = settings["overflow"]
+        self.sample_every = max(1, int(settings["sample_every"]))
+        self.metrics = metrics
+
+        self.dropped = 0
+        self.written = 0
+        self._buffer: deque = deque()
+        self._sample_count = 0
+        self._wake = threading.Event()
+        self._space = threading.Condition()
+        self._stopping = False
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._segment = None
+        self._segment_seq = 0
+        self._open_segment()
+
+        self._thread = threading.Thread(
+            target=self._run, name="keypebble-audit", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Producer side (request path) ----------------------------------------
+
+    def record(self, endpoint: str, token: str) -> bool:
+        """Queue a record of ``token``; False if the overflow policy dropped it."""
+        buffer = self._buffer
+        weight = 1
+        depth = len(buffer)
+        if self.overflow == "sample" and depth >= self.capacity // 2:
+            self._sample_count += 1
+            if self._sample_count % self.sample_every:
+                return self._drop("sampled_out")
+            weight = self.sample_every
+        if depth >= self.capacity:
+            if self.overflow != "block":
+                return self._drop("dropped")
+            self._wait_for_space()
+
+        buffer.append((time.time(), endpoint, token, weight))
+        if depth + 1 == self.batch_size:
+            self._wake.set()
+        return True
+
+    def _drop(self, outcome: str) -> bool:
+        self.dropped += 1
+        if self.metrics is not None:
+            self.metrics.audit_records.labels(outcome=outcome).inc()
+        return False
+
+    def _wait_for_space(self) -> None:
+        self._wake.set()
+        with self._space:
+            while len(self._buffer) >= self.capacity and not self._stopping:
+                self._space.wait(self.flush_interval)
+
+    # --- Writer side ---------------------------------------------------------
+
+    def _open_segment(self) -> None:
+        started = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._segment_seq += 1
+        name = f"audit-{started}-{os.getpid()}-{self._segment_seq}.jsonl"
+        self._segment = open(self.dir / name, "ab")
+        self._segment_opened = time.monotonic()
+        self._segment_size = 0
+        self._last_fsync = time.monotonic()
+
+    def _rotate_if_due(self) -> None:
+        if (
+            self._segment_size >= self.segment_bytes
+            or time.monotonic() - self._segment_opened >= self.segment_seconds
+        ):
+            self._sync()
+            self._segment.close()
+            self._open_segment()
+
+    def _sync(self) -> None:
+        self._segment.flush()
+        if self.fsync != "never":
+            os.fsync(self._segment.fileno())
+        self._last_fsync = time.monotonic()
+
+    @staticmethod
+    def _encode(entry) -> bytes:
+        ts, endpoint, token, weight = entry
+        try:
+            if "~" in token:  # batched credential: root~claims~proof
+                segment = token.split("~", 2)[1]
+            else:
+                segment = token.split(".", 2)[1]
+            claims = base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+        except (IndexError, ValueError):
+            claims = b"null"
+        line = b'{"ts":%.3f,"endpoint":"%s"' % (ts, endpoint.encode())
+        if weight != 1:
+            line += b',"sample_weight":%d' % weight
+        return line + b',"claims":' + claims + b"}\n"
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of records written."""
+        buffer = self._buffer
+        written = 0
+        while buffer:
+            batch = []
+            while buffer and len(batch) < self.batch_size:
+                batch.append(self._encode(buffer.popleft()))
+            data = b"".join(batch)
+            self._segment.write(data)
+            self._segment_size += len(data)
+            written += len(batch)
+            if self.overflow == "block":
+                with self._space:
+                    self._space.notify_all()
+            self._rotate_if_due()
+
+        if written:
+            self._segment.flush()
+            if self.fsync == "always" or (
+                self.fsync == "interval"
+                and time.monotonic() - self._last_fsync >= self.fsync_interval
+            ):
+                self._sync()
+            self.written += written
+            if self.metrics is not None:
+                self.metrics.audit_records.labels(outcome="written").inc(written)
+        else:
+            self._rotate_if_due()
+        return written
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the writer, write what is left and fsync the last segment."""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self._sync()
+        self._segment.close()
+        atexit.unregister(self.close)
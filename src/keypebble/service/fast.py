@@ -0,0 +1,191 @@
+"""Raw WSGI fast path for the hot token endpoints.
+
+``GET /v2/token`` and ``POST /command/token`` are a few dict operations and
+one signature; the request-context push, blueprint dispatch and ``jsonify``
+around them cost more than the work itself. ``FastPath`` answers those two
+routes straight from the WSGI environ and hands every other request to the
+wrapped Flask application unchanged.
+
+Both paths call the same ``*_result`` functions from ``service/app.py``, so
+behaviour (policy, lean responses, coalescing, admission control) is shared
+rather than re-implemented.
+"""
+
+import json
+from datetime import date
+from urllib.parse import parse_qsl
+
+from werkzeug.http import HTTP_STATUS_CODES, http_date
+from werkzeug.wsgi import ClosingIterator
+
+from keypebble.service.app import (
+    collect_scopes,
+    command_token_result,
+    rejection_result,
+    v2_token_result,
+    wants_lean_response,
+    wants_ndjson,
+)
+
+# Same status line format as werkzeug.Response.
+_STATUS_LINES = {
+    code: f"{code} {text.upper()}" for code, text in HTTP_STATUS_CODES.items()
+}
+
+
+def _json_default(value):
+    # Matches Flask's JSON provider for the one non-JSON type these routes emit.
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode(body) -> bytes:
+    if isinstance(body, bytes):
+        return body
+    text = json.dumps(
+        body, default=_json_default, separators=(",", ":"), sort_keys=True
+    )
+    return (text + "\n").encode("utf-8")
+
+
+def _query(environ) -> list[tuple[str, str]]:
+    qs = environ.get("QUERY_STRING", "")
+    if not qs:
+        return []
+    # WSGI strings are latin-1 decoded bytes; re-decode as UTF-8 like Werkzeug.
+    qs = qs.encode("latin-1").decode("utf-8", "replace")
+    return parse_qsl(qs, keep_blank_values=True)
+
+
+def _json_body(environ, limit: int | None):
+    """Mirror ``request.get_json(silent=True)``: ``None`` unless valid JSON.
+
+    Raises ``ValueError`` for a body longer than ``limit`` bytes, which
+    Flask refuses with 413 via ``MAX_CONTENT_LENGTH``.
+    """
+    mimetype = environ.get("CONTENT_TYPE", "").split(";", 1)[0].strip().lower()
+    if not (
+        mimetype == "application/json"
+        or (mimetype.startswith("application/") and mimetype.endswith("+json"))
+    ):
+        return None
+
+    stream = environ["wsgi.input"]
+    length = _content_length(environ)
+    if length is not None and limit is not None and length > limit:
+        raise ValueError("request body too large")
+    if length:
+        data = stream.read(length)
+    elif environ.get("wsgi.input_terminated"):
+        # No declared length: read one byte past the limit to detect overflow.
+        data = stream.read() if limit is None else stream.read(limit + 1)
+        if limit is not None and len(data) > limit:
+            raise ValueError("request body too large")
+    else:
+        data = b""
+
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def _content_length(environ) -> int | None:
+    """The ``Content-Length`` header; ``ValueError`` unless a non-negative int."""
+    length = environ.get("CONTENT_LENGTH")
+    if not length:
+        return None
+    if not length.strip().isdigit():
+        raise ValueError("invalid Content-Length")
+    return int(length)
+
+
+class FastPath:
+    """WSGI middleware serving the hot token routes without Flask dispatch."""
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.routes = {
+            ("GET", "/v2/token"): self.v2_token,
+            ("POST", "/command/token"): self.command_token,
+        }
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        handler = self.routes.get((environ.get("REQUEST_METHOD"), path))
+        if handler is None:
+            return self.wsgi_app(environ, start_response)
+        try:
+            length = _content_length(environ)
+        except ValueError as e:
+            return self._respond(start_response, 400, {"error": str(e)}, {})
+
+        admission = getattr(self.app, "admission", None)
+        if admission is None:
+            return self._respond(start_response, *handler(environ))
+
+        identity = environ.get("HTTP_X_AUTHENTICATED_USER") or environ.get(
+            "REMOTE_ADDR"
+        )
+        rejected = admission.admit(identity or "anonymous", path, length)
+        if rejected:
+            return self._respond(start_response, *rejection_result(rejected))
+        try:
+            status, body, headers = handler(environ)
+        except BaseException:
+            admission.release()
+            raise
+        if isinstance(body, (dict, bytes)):
+            admission.release()
+        else:
+            # A streamed body is signed while it is iterated: hold the
+            # in-flight slot until the server closes it.
+            body = ClosingIterator(body, admission.release)
+        return self._respond(start_response, status, body, headers)
+
+    def v2_token(self, environ):
+        query = _query(environ)
+        scopes = [v for k, v in query if k == "scope"]
+        service = next((v for k, v in query if k == "service"), None)
+        generate = environ.get("HTTP_X_POLICY_GENERATE", "").lower() == "true"
+        return v2_token_result(
+            self.app,
+            user=environ.get("HTTP_X_AUTHENTICATED_USER"),
+            requested_scopes=collect_scopes(scopes, environ.get("HTTP_X_SCOPES")),
+            service_audience=service,
+            generate_requested=generate,
+            lean=wants_lean_response(
+                self.app.config, environ.get("HTTP_X_LEAN_RESPONSE")
+            ),
+        )
+
+    def command_token(self, environ):
+        ndjson = wants_ndjson(environ.get("HTTP_ACCEPT"))
+        try:
+            body = _json_body(environ, self.app.config.get("MAX_CONTENT_LENGTH"))
+        except ValueError as e:
+            return rejection_result((413, str(e), None))
+        return command_token_result(self.app, body, ndjson)
+
+    def _respond(self, start_response, status, body, headers):
+        headers = {"Content-Type": "application/json", **headers}
+        if not isinstance(body, (dict, bytes)):
+            # Streamed body (fan-out): no Content-Length, the server chunks it.
+            start_response(_STATUS_LINES[status], list(headers.items()))
+            return body
+        payload = _encode(body)
+        headers["Content-Length"] = str(len(payload))
+        start_response(_STATUS_LINES[status], list(headers.items()))
+        return [payload]
+
+
+def install_fast_path(app):
+    """Route the hot token endpoints of ``app`` through ``FastPath``.
+
+    The Flask app stays the WSGI entry point (``app.run``, test clients and
+    WSGI servers are unaffected); only its ``wsgi_app`` is wrapped.
+    """
+    app.wsgi_app = FastPath(app, app.wsgi_app)
+    return app
@@ -0,0 +1,465 @@
+"""Cluster mode: gossip revocations and policy versions between nodes.
+
+Nodes behind one load balancer each hold their own revocation list, so a
+``POST /revoke`` on one node has to reach the others. With a ``cluster``
+block, ``keypebble serve`` runs a ``GossipNode`` that spreads revoked
+``jti`` values and each node's policy hash to its peers:
+
+* **Deltas over UDP.** A new revocation (local or learned) is queued and
+  piggybacked on the next ``retransmit_mult * log2(peers + 2)`` gossip
+  rounds. Every ``interval_ms`` the node sends one datagram of at most
+  ``max_datagram_bytes`` to each of ``fanout`` random peers, so bandwidth
+  per node is bounded regardless of how many revocations arrive.
+  Epidemic spread reaches every node in O(log n) rounds.
+* **Anti-entropy over TCP.** Every ``anti_entropy_seconds`` the node
+  sends one random peer a digest per bucket of its live revocations
+  (``SYNC_BUCKETS`` buckets, by hash of the ``jti``). Both sides then send
+  only the entries of the buckets that differ, in frames of at most
+  ``SYNC_CHUNK_BYTES``, so a sync costs a few KiB when the sets agree and
+  never hits the frame limit however large they grow. This repairs
+  anything lost with a dropped datagram, and brings restarted or new
+  nodes up to date. Failed syncs are logged and counted.
+
+Every message is a JSON object ``{"mac": ..., "body": ...}``, where the MAC
+is an HMAC-SHA256 of the body under ``cluster.secret``. Unauthenticated
+messages are ignored. TCP uses the daemon's length-prefixed frames.
+UDP and TCP listen on the same port number.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import math
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from keypebble.daemon import MAX_FRAME_BYTES, recv_frame, send_frame
+
+log = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "bind": "0.0.0.0:7946",
+    "peers": [],
+    "interval_ms": 200,
+    "fanout": 3,
+    "max_datagram_bytes": 1400,
+    "anti_entropy_seconds": 10.0,
+    "retransmit_mult": 3,
+}
+TCP_TIMEOUT_SECONDS = 5.0
+SYNC_BUCKETS = 256
+SYNC_CHUNK_BYTES = MAX_FRAME_BYTES // 4
+
+
+def parse_address(value: str) -> tuple[str, int]:
+    """``"host:port"`` to ``(host, port)``."""
+    host, _, port = str(value).rpartition(":")
+    if not host or not port:
+        raise ValueError(f"expected host:port, got {value!r}")
+    return host, int(port)
+
+
+def policy_hash(path: str | None) -> str | None:
+    """Short content hash identifying a policy file version."""
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+class _SyncServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _canonical(body) -> bytes:
+    return json.dumps(body, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _bucket(jti: str) -> int:
+    return hashlib.sha256(jti.encode()).digest()[0] % SYNC_BUCKETS
+
+
+def differing_buckets(ours: list, theirs) -> list[int]:
+    """Buckets whose digests differ; every bucket if ``theirs`` is malformed."""
+    if not isinstance(theirs, list) or len(theirs) != len(ours):
+        return list(range(len(ours)))
+    return [i for i, (a, b) in enumerate(zip(ours, theirs)) if a != b]
+
+
+class GossipNode:
+    """One cluster member: gossip rounds, anti-entropy and the listeners."""
+
+    def __init__(self, conf: dict, revocations, policy_path=None, metrics=None):
+        settings = {**DEFAULTS, **conf}
+        if not settings.get("secret"):
+            raise ValueError("cluster.secret is required")
+        self.secret = str(settings["secret"]).encode()
+        self.revocations = revocations
+        self.policy_path = policy_path
+        self.metrics = metrics
+        self.interval = int(settings["interval_ms"]) / 1000
+        self.fanout = int(settings["fanout"])
+        self.max_datagram_bytes = int(settings["max_datagram_bytes"])
+        self.anti_entropy_interval = float(settings["anti_entropy_seconds"])
+        self.retransmit_mult = int(settings["retransmit_mult"])
+
+        self._bind(*parse_address(settings["bind"]))
+        self.node_id = str(
+            settings.get("node_id") or f"{socket.gethostname()}:{self.port}"
+        )
+        self.peers = {parse_address(p) for p in settings["peers"]}
+
+        # jti -> exp for every live revocation this node knows about, and the
+        # subset still being piggybacked: jti -> [exp, transmissions left].
+        self.known: dict[str, int] = {}
+        self.pending: dict[str, list] = {}
+        # node_id -> (policy hash, time the node set it)
+        self.policies: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        now = time.time()
+        for jti, exp in revocations.entries():
+            if exp > now:
+                # Not queued for gossip: anti-entropy reconciles older state.
+                self.known[jti] = exp
+        self.set_policy(policy_hash(policy_path))
+        self._threads: list[threading.Thread] = []
+
+    def _bind(self, host: str, port: int) -> None:
+        """Bind UDP and TCP to the same port; with port 0, find a free pair."""
+        node = self
+
+        class SyncHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                self.request.settimeout(TCP_TIMEOUT_SECONDS)
+                try:
+                    node._serve_sync(self.request)
+                except (OSError, ValueError) as e:
+                    node._sync_failed(self.client_address, e)
+
+        attempts = 10 if port == 0 else 1
+        for attempt in range(attempts):
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp.bind((host, port))
+            try:
+                tcp = _SyncServer((host, udp.getsockname()[1]), SyncHandler)
+            except OSError:
+                udp.close()
+                if attempt == attempts - 1:
+                    raise
+                continue
+            break
+        udp.settimeout(0.2)  # so the receive loop notices stop()
+        self._udp, self._tcp = udp, tcp
+        self.port = udp.getsockname()[1]
+
+    # --- Lifecycle -----------------------------------------------------------
+
+    def start(self) -> "GossipNode":
+        for target in (self._receive_loop, self._tcp.serve_forever, self._tick_loop):
+            thread = threading.Thread(
+                target=target, name="keypebble-gossip", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._threads:
+            self._tcp.shutdown()  # blocks unless serve_forever is running
+        self._tcp.server_close()
+        self._udp.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+    # --- Local events --------------------------------------------------------
+
+    def revoked(self, jti: str, exp: int) -> None:
+        """Spread a revocation this node has already applied locally."""
+        with self._lock:
+            self._remember(jti, int(exp), time.time())
+
+    def set_policy(self, digest: str | None) -> None:
+        with self._lock:
+            self.policies[self.node_id] = (digest, time.time())
+        self._update_gauges()
+
+    def on_reload(self, config, policy) -> None:
+        """``service.reload`` listener: announce the reloaded policy's hash."""
+        self.set_policy(policy_hash(self.policy_path))
+
+    # --- State ---------------------------------------------------------------
+
+    def _retransmits(self) -> int:
+        return self.retransmit_mult * math.ceil(math.log2(len(self.peers) + 2))
+
+    def _remember(self, jti: str, exp: int, now: float) -> bool:
+        """Record a revocation; True if it is new (or extends a known one)."""
+        if exp <= now or self.known.get(jti, exp - 1) >= exp:
+            return False
+        self.known[jti] = exp
+        self.pending[jti] = [exp, self._retransmits()]
+        return True
+
+    def _merge(self, entries, via: str) -> int:
+        """Apply revocations from a peer; returns how many were new."""
+        now = time.time()
+        learned = []
+        with self._lock:
+            for entry in entries:
+                try:
+                    jti, exp = str(entry[0]), int(entry[1])
+                except (IndexError, TypeError, ValueError):
+                    continue
+                if self._remember(jti, exp, now):
+                    learned.append((jti, exp))
+        for jti, exp in learned:
+            try:
+                self.revocations.revoke(jti, exp, now)
+            except ValueError as e:
+                log.warning("could not apply gossiped revocation %s: %s", jti, e)
+        if learned and self.metrics is not None:
+            self.metrics.cluster_revocations.labels(via=via).inc(len(learned))
+        return len(learned)
+
+    def _merge_policies(self, policies) -> None:
+        if not isinstance(policies, dict):
+            return
+        with self._lock:
+            for node_id, value in policies.items():
+                try:
+                    digest, stamp = value[0], float(value[1])
+                except (IndexError, TypeError, ValueError):
+                    continue
+                if (
+                    node_id != self.node_id
+                    and stamp > self.policies.get(node_id, (None, -1.0))[1]
+                ):
+                    self.policies[node_id] = (digest, stamp)
+        self._update_gauges()
+
+    def _purge(self, now: float) -> None:
+        for jti in [j for j, exp in self.known.items() if exp <= now]:
+            del self.known[jti]
+            self.pending.pop(jti, None)
+
+    def bucket_digests(self) -> list[str]:
+        """Short hash of each bucket of the live revocation set."""
+        buckets: list[list] = [[] for _ in range(SYNC_BUCKETS)]
+        with self._lock:
+            items = sorted(self.known.items())
+        for jti, exp in items:
+            buckets[_bucket(jti)].append([jti, exp])
+        return [hashlib.sha256(_canonical(b)).hexdigest()[:16] for b in buckets]
+
+    def status(self) -> dict:
+        with self._lock:
+            own = self.policies[self.node_id][0]
+            return {
+                "node": self.node_id,
+                "peers": sorted(f"{h}:{p}" for h, p in self.peers),
+                "revocations": len(self.known),
+                "pending": len(self.pending),
+                "policy": own,
+                "policies": {n: d for n, (d, _) in self.policies.items()},
+                "policy_divergent": sorted(
+                    n for n, (d, _) in self.policies.items() if d != own
+                ),
+            }
+
+    def _update_gauges(self) -> None:
+        if self.metrics is None:
+            return
+        status = self.status()
+        self.metrics.cluster_peers.set(len(status["peers"]))
+        self.metrics.cluster_policy_divergent.set(len(status["policy_divergent"]))
+
+    # --- Messages ------------------------------------------------------------
+
+    def _seal(self, body: dict) -> dict:
+        mac = hmac.new(self.secret, _canonical(body), hashlib.sha256).hexdigest()
+        return {"mac": mac, "body": body}
+
+    def _open(self, message) -> dict | None:
+        if not isinstance(message, dict) or not isinstance(message.get("body"), dict):
+            return None
+        body = message["body"]
+        mac = hmac.new(self.secret, _canonical(body), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(mac, str(message.get("mac"))):
+            return None
+        return body
+
+    def _delta(self) -> bytes:
+        """Next datagram: header plus as many pending revocations as fit."""
+        with self._lock:
+            body = {
+                "node": self.node_id,
+                "port": self.port,
+                "policies": {n: list(v) for n, v in self.policies.items()},
+                "rev": [],
+            }
+            budget = self.max_datagram_bytes - len(_canonical(self._seal(body)))
+            # Freshest first: they have the most rounds left to go.
+            queue = sorted(self.pending.items(), key=lambda kv: -kv[1][1])
+            for jti, entry in queue:
+                size = len(_canonical([jti, entry[0]])) + 1
+                if size > budget:
+                    break
+                budget -= size
+                body["rev"].append([jti, entry[0]])
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self.pending[jti]
+        return _canonical(self._seal(body))
+
+    def _tick_loop(self) -> None:
+        next_sync = time.monotonic() + self.anti_entropy_interval
+        while not self._stopping.wait(self.interval):
+            try:
+                self.gossip_round()
+                if time.monotonic() >= next_sync:
+                    next_sync = time.monotonic() + self.anti_entropy_interval
+                    self.anti_entropy()
+            except Exception:  # keep gossiping whatever one round hit
+                log.exception("gossip round failed")
+
+    def gossip_round(self) -> None:
+        with self._lock:
+            self._purge(time.time())
+            peers = list(self.peers)
+        if not peers:
+            return
+        data = self._delta()
+        for peer in random.sample(peers, min(self.fanout, len(peers))):
+            try:
+                self._udp.sendto(data, peer)
+            except OSError:
+                pass
+
+    def _receive_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                data, addr = self._udp.recvfrom(65535)
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            try:
+                body = self._open(json.loads(data))
+            except ValueError:
+                continue
+            if body is None or body.get("node") == self.node_id:
+                continue
+            if isinstance(body.get("port"), int):
+                with self._lock:
+                    self.peers.add((addr[0], body["port"]))
+            self._merge_policies(body.get("policies"))
+            if isinstance(body.get("rev"), list):
+                self._merge(body["rev"], via="gossip")
+
+    # --- Anti-entropy ----------------------------------------------------------
+
+    def _policies(self) -> dict:
+        with self._lock:
+            return {n: list(v) for n, v in self.policies.items()}
+
+    def _entries(self, buckets: list[int]) -> list[list]:
+        """Live revocations in ``buckets``, snapshotted before the exchange."""
+        wanted = set(buckets)
+        with self._lock:
+            return [[j, e] for j, e in self.known.items() if _bucket(j) in wanted]
+
+    def _send_entries(self, sock, entries: list[list]) -> None:
+        """Send ``entries`` as sealed frames of at most ``SYNC_CHUNK_BYTES``."""
+        chunk: list = []
+        size = 0
+        for entry in entries:
+            entry_size = len(_canonical(entry)) + 1
+            if chunk and size + entry_size > SYNC_CHUNK_BYTES:
+                send_frame(sock, self._seal({"rev": chunk, "more": True}))
+                chunk, size = [], 0
+            chunk.append(entry)
+            size += entry_size
+        send_frame(sock, self._seal({"rev": chunk, "more": False}))
+
+    def _receive_entries(self, sock) -> int:
+        """Merge frames from ``_send_entries``; returns how many were new."""
+        learned = 0
+        while True:
+            chunk = self._open(recv_frame(sock))
+            if chunk is None or not isinstance(chunk.get("rev"), list):
+                raise ValueError("unauthenticated or malformed sync frame")
+            learned += self._merge(chunk["rev"], via="sync")
+            if not chunk.get("more"):
+                return learned
+
+    def _sync_done(self, result: str) -> None:
+        if self.metrics is not None:
+            self.metrics.cluster_syncs.labels(result=result).inc()
+
+    def _sync_failed(self, peer, error) -> None:
+        log.warning("anti-entropy with %s:%s failed: %s", *peer[:2], error)
+        self._sync_done("error")
+
+    def anti_entropy(self, peer: tuple[str, int] | None = None) -> bool:
+        """Reconcile with one peer (random by default); True if it answered."""
+        if peer is None:
+            with self._lock:
+                if not self.peers:
+                    return False
+                peer = random.choice(list(self.peers))
+        try:
+            with socket.create_connection(peer, TCP_TIMEOUT_SECONDS) as sock:
+                send_frame(
+                    sock,
+                    self._seal({"op": "sync", "buckets": self.bucket_digests()}),
+                )
+                reply = self._open(recv_frame(sock))
+                if reply is None:
+                    raise ValueError("unauthenticated or missing sync reply")
+                self._merge_policies(reply.get("policies"))
+                diff = [
+                    i
+                    for i in reply.get("diff") or []
+                    if isinstance(i, int) and 0 <= i < SYNC_BUCKETS
+                ]
+                if not diff:
+                    self._sync_done("in_sync")
+                    return True
+                self._send_entries(sock, self._entries(diff))
+                self._receive_entries(sock)
+        except (OSError, ValueError) as e:
+            self._sync_failed(peer, e)
+            return False
+        self._sync_done("repaired")
+        return True
+
+    def _serve_sync(self, sock) -> None:
+        request = self._open(recv_frame(sock))
+        if request is None or request.get("op") != "sync":
+            return
+        diff = differing_buckets(self.bucket_digests(), request.get("buckets"))
+        send_frame(sock, self._seal({"policies": self._policies(), "diff": diff}))
+        if not diff:
+            return
+        ours = self._entries(diff)
+        self._receive_entries(sock)
+        self._send_entries(sock, ours)
+
+
+def start_gossip(app, conf: dict, policy_path: str | None = None) -> GossipNode:
+    """Start a ``GossipNode`` for ``app`` and attach it as ``app.gossip``."""
+    node = GossipNode(
+        conf, app.revocations, policy_path=policy_path, metrics=app.metrics
+    )
+    app.gossip = node.start()
+    return node
@@ -0,0 +1,137 @@
+"""Token introspection (RFC 7662) backed by a verification cache.
+
+A token's signature, ``exp`` and ``nbf`` never change, so once a token has
+verified, its claims are cached under the SHA-256 digest of the token (the
+raw token is never stored) until its ``exp``. Repeat introspections of the
+same token cost one hash and one dictionary lookup instead of a signature
+check. Revocation is not cacheable and is checked on every call.
+
+The cache is bounded (least-recently-used eviction) and belongs to one
+config: ``introspector_for`` builds a fresh ``Introspector`` — new
+verification key, empty cache — whenever a reload swaps the config.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from keypebble.core import decode_token, load_verification_key
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_MAX_BATCH = 100
+
+
+class VerificationCache:
+    """Verified claims keyed by token digest, evicted at ``exp`` or when full."""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, digest: bytes, now: float) -> dict | None:
+        with self._lock:
+            claims = self._entries.get(digest)
+            if claims is None:
+                return None
+            if claims["exp"] <= now:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return claims
+
+    def put(self, digest: bytes, claims: dict) -> None:
+        if self.max_entries <= 0 or not isinstance(claims.get("exp"), int):
+            return  # tokens without exp would never leave the cache
+        with self._lock:
+            self._entries[digest] = claims
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _audience_matches(claims: dict, audience: str) -> bool:
+    aud = claims.get("aud")
+    return audience == aud or (isinstance(aud, list) and audience in aud)
+
+
+def key_id(config, key) -> bytes:
+    """Short fingerprint of a verification key and its algorithm."""
+    if hasattr(key, "public_bytes"):
+        from cryptography.hazmat.primitives import serialization
+
+        key = key.public_bytes(
+            serialization.Encoding.DER,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    elif isinstance(key, str):
+        key = key.encode()
+    algorithm = config.get("algorithm", "HS256").upper().encode()
+    return hashlib.sha256(algorithm + b"\0" + key).digest()[:8]
+
+
+class Introspector:
+    """Verification key and cache for one config.
+
+    With ``shared`` (a ``service.shared.SharedState``) the cache is the
+    host-wide shared one, partitioned by verification key.
+    """
+
+    def __init__(self, config, shared=None):
+        self.config = config
+        self.key = load_verification_key(config)
+        conf = config.get("introspection") or {}
+        if shared is not None:
+            from keypebble.service.shared import SharedVerificationCache
+
+            self.cache = SharedVerificationCache(
+                shared.introspection, key_id(config, self.key)
+            )
+        else:
+            self.cache = VerificationCache(
+                int(conf.get("cache_size", DEFAULT_CACHE_SIZE))
+            )
+        self.max_batch = int(conf.get("max_batch", DEFAULT_MAX_BATCH))
+
+    def introspect(
+        self, token, revocations=None, audience: str | None = None, metrics=None
+    ) -> dict:
+        """Return ``{"active": true, **claims}`` or ``{"active": false}``."""
+        if not isinstance(token, str) or not token:
+            return {"active": False}
+
+        now = time.time()
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(digest, now)
+        if metrics is not None:
+            metrics.introspection_cache.labels(
+                result="miss" if claims is None else "hit"
+            ).inc()
+        if claims is None:
+            try:
+                claims = decode_token(
+                    self.config, token, key=self.key, verify_audience=False
+                )
+            except ValueError:
+                return {"active": False}
+            self.cache.put(digest, claims)
+
+        if revocations is not None and revocations.is_revoked(claims.get("jti")):
+            return {"active": False}
+        if audience is not None and not _audience_matches(claims, audience):
+            return {"active": False}
+        return {"active": True, **claims}
+
+
+def introspector_for(app, config) -> Introspector:
+    """The app's ``Introspector`` for ``config``, rebuilt after a reload."""
+    introspector = app.introspector
+    if introspector is None or introspector.config is not config:
+        introspector = app.introspector = Introspector(
+            config, getattr(app, "shared_state", None)
+        )
+    return introspector
@@ -0,0 +1,220 @@
+"""Refresh-ahead cache for Kubernetes service-account tokens.
+
+Controllers request the same service-account token over and over, and each
+request would otherwise cost a claim build and a signature. The cache keys
+issued tokens by ``(namespace, name, sorted audiences, TTL bucket)`` and
+serves a cached token while at least ``min_remaining`` of its lifetime is
+left. A background worker re-mints a token once ``refresh_at`` of its
+lifetime has passed, provided it was requested since it was last minted,
+so a hot service account always finds a fresh token and never waits on a
+signature. Tokens nobody asks for are left to expire and then dropped.
+
+Like the introspection cache, a cache belongs to one config:
+``ksa_cache_for`` replaces it, and stops the old worker, after a reload.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+DEFAULTS = {
+    "refresh_at": 0.5,
+    "min_remaining": 0.25,
+    "ttl_bucket_seconds": 60,
+    "max_entries": 10000,
+}
+
+# mint(namespace, name, audiences, ttl) -> (token, exp)
+Mint = Callable[[str, str, list, int], Tuple[str, int]]
+
+
+def _audience_key(audiences) -> tuple | str:
+    """Hashable form of ``spec.audiences`` as sent; a list is order-insensitive.
+
+    A list and a bare string never share a key: they issue different ``aud``.
+    """
+    if isinstance(audiences, list):
+        return tuple(sorted(json.dumps(a, sort_keys=True) for a in audiences))
+    return json.dumps(audiences, sort_keys=True)
+
+
+class _Entry:
+    __slots__ = ("args", "token", "iat", "exp", "requested", "refreshing")
+
+    def __init__(self, args: tuple, token: str, iat: float, exp: int):
+        self.args = args
+        self.token = token
+        self.iat = iat
+        self.exp = exp
+        self.requested = False
+        self.refreshing = False
+
+    def refresh_due(self, refresh_at: float) -> float:
+        return self.iat + (self.exp - self.iat) * refresh_at
+
+
+class KsaTokenCache:
+    """Issued KSA tokens for one config, refreshed ahead of expiry."""
+
+    def __init__(
+        self,
+        conf: dict,
+        mint: Mint,
+        metrics=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        conf = {**DEFAULTS, **(conf if isinstance(conf, dict) else {})}
+        self.refresh_at = float(conf["refresh_at"])
+        self.min_remaining = float(conf["min_remaining"])
+        if not 0 < self.refresh_at < 1 - self.min_remaining <= 1:
+            raise ValueError(
+                "ksa_cache needs 0 < refresh_at < 1 - min_remaining, so tokens "
+                "are refreshed before they stop being served"
+            )
+        self.bucket = max(1, int(conf["ttl_bucket_seconds"]))
+        self.max_entries = int(conf["max_entries"])
+        self.mint = mint
+        self.metrics = metrics
+        self.config = None  # the config ``mint`` was bound to; see ksa_cache_for
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._worker: threading.Thread | None = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, namespace: str, name: str, audiences: list, ttl: int) -> tuple:
+        bucket = -(-ttl // self.bucket) * self.bucket
+        return (namespace, name, _audience_key(audiences), bucket)
+
+    def _count(self, result: str) -> None:
+        if self.metrics is not None:
+            self.metrics.ksa_cache.labels(result=result).inc()
+
+    def get(self, namespace: str, name: str, audiences: list, ttl: int) -> tuple:
+        """Return ``(token, exp)``, from the cache or freshly minted."""
+        key = self.key(namespace, name, audiences, ttl)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.exp - now >= (entry.exp - entry.iat) * self.min_remaining:
+                    entry.requested = True
+                    self._entries.move_to_end(key)
+                    self._count("hit")
+                    return entry.token, entry.exp
+                self._count("stale")
+            else:
+                self._count("miss")
+
+        if isinstance(audiences, list):
+            audiences = list(audiences)
+        args = (namespace, name, audiences, ttl)
+        token, exp = self.mint(*args)
+        self._store(key, _Entry(args, token, now, exp))
+        return token, exp
+
+    def _store(self, key: tuple, entry: _Entry) -> None:
+        with self._lock:
+            if self._closed or self.max_entries <= 0:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name="keypebble-ksa-refresh", daemon=True
+                )
+                self._worker.start()
+
+    def refresh_due(self) -> float | None:
+        """Refresh every due, requested entry; return when the next one is due.
+
+        Entries past ``exp`` are dropped. Called by the worker thread, and
+        directly by tests.
+        """
+        now = self.clock()
+        due, next_due = [], None
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.exp <= now:
+                    del self._entries[key]
+                    continue
+                if not entry.requested or entry.refreshing:
+                    continue
+                at = entry.refresh_due(self.refresh_at)
+                if at <= now:
+                    entry.refreshing = True
+                    due.append((key, entry))
+                elif next_due is None or at < next_due:
+                    next_due = at
+
+        for key, entry in due:
+            try:
+                token, exp = self.mint(*entry.args)
+            except Exception:
+                # Keep serving the old token; a request will mint inline once
+                # it is too close to expiry.
+                entry.refreshing = False
+                self._count("refresh_error")
+                continue
+            self._count("refresh")
+            self._store(key, _Entry(entry.args, token, self.clock(), exp))
+        return next_due
+
+    def _run(self) -> None:
+        while True:
+            next_due = self.refresh_due()
+            with self._wake:
+                if self._closed:
+                    return
+                # Wake for the next refresh, a new entry, or close(); poll
+                # at least every second so entries that turn hot are seen.
+                timeout = 1.0
+                if next_due is not None:
+                    timeout = min(timeout, max(0.0, next_due - self.clock()))
+                self._wake.wait(timeout)
+                if self._closed:
+                    return
+
+    def close(self) -> None:
+        """Stop the worker and drop every cached token."""
+        with self._wake:
+            self._closed = True
+            self._entries.clear()
+            self._wake.notify()
+        if self._worker is not None:
+            self._worker.join()
+
+
+def ksa_cache_for(app, config, mint: Mint) -> KsaTokenCache | None:
+    """The app's ``KsaTokenCache`` for ``config``, rebuilt after a reload.
+
+    ``None`` unless ``config`` has a ``ksa_cache`` block; an empty block
+    enables it with the defaults. ``mint`` is only used when a new cache is
+    built, so it should close over ``config``.
+    """
+    conf = config.get("ksa_cache")
+    cache = app.ksa_cache
+    if (cache is None and conf is None) or (
+        cache is not None and cache.config is config
+    ):
+        return cache
+    with app.state_lock:
+        cache = app.ksa_cache
+        if cache is not None and cache.config is config:
+            return cache
+        if cache is not None:
+            cache.close()
+        cache = None
+        if conf is not None:
+            cache = KsaTokenCache(conf, mint, metrics=app.metrics)
+            cache.config = config
+        app.ksa_cache = cache
+    return cache
@@ -0,0 +1,146 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, holding at most ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Consume one token. Returns 0.0 on success, else seconds until one is free."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by ``(identity, endpoint)`` with bounded memory.
+
+    Buckets live in an ``OrderedDict`` kept in least-recently-used order, so
+    each call is O(1): the touched bucket moves to the end, and eviction only
+    ever inspects the front. Buckets idle for ``idle_seconds`` are dropped;
+    as long as that is longer than ``burst / rate`` a dropped bucket would
+    have refilled anyway, so eviction never grants extra requests.
+    """
+
+    def __init__(
+        self,
+        max_buckets: int = 10000,
+        idle_seconds: float = 300.0,
+        clock=time.monotonic,
+    ):
+        self.max_buckets = max_buckets
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key, rate: float, burst: float) -> float:
+        """Take a token for ``key``. Returns 0.0 if allowed, else the retry delay."""
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(now)
+            self._evict(now)
+            return wait
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        while len(buckets) > self.max_buckets:
+            buckets.popitem(last=False)
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest.updated < self.idle_seconds:
+                break
+            buckets.popitem(last=False)
+
+
+class AdmissionController:
+    """Request admission for the token endpoints, built from the ``limits`` config.
+
+    Checks run cheapest-first: body size, then the per-identity/per-endpoint
+    rate limit, then global load shedding on in-flight requests. Every check
+    is optional; an empty ``limits`` block admits everything.
+
+    ``admit`` returns ``None`` when the request may proceed, otherwise a
+    ``(status, error, retry_after)`` tuple. Admitted requests must be paired
+    with a ``release()`` once the response is produced.
+    """
+
+    def __init__(self, conf: dict, clock=time.monotonic, shared=None):
+        self.max_body_bytes = conf.get("max_body_bytes")
+        self.max_auth_claims = conf.get("max_auth_claims")
+        self.max_in_flight = conf.get("max_in_flight")
+        self.retry_after_seconds = int(conf.get("retry_after_seconds", 1))
+
+        rate = conf.get("rate_per_second")
+        self.default_rate = (
+            (float(rate), float(conf.get("burst", rate))) if rate else None
+        )
+        self.endpoint_rates = {
+            endpoint: (
+                float(c["rate_per_second"]),
+                float(c.get("burst", c["rate_per_second"])),
+            )
+            for endpoint, c in (conf.get("endpoints") or {}).items()
+        }
+        idle_seconds = float(conf.get("idle_seconds", 300))
+        if shared is not None:
+            from keypebble.service.shared import SharedRateLimiter
+
+            # One set of buckets for every worker on the host.
+            self.limiter = SharedRateLimiter(shared.rate_limits, idle_seconds, clock)
+        else:
+            self.limiter = RateLimiter(
+                max_buckets=int(conf.get("max_buckets", 10000)),
+                idle_seconds=idle_seconds,
+                clock=clock,
+            )
+
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def admit(
+        self, identity: str, endpoint: str, content_length: int | None = None
+    ) -> tuple[int, str, int | None] | None:
+        if (
+            self.max_body_bytes is not None
+            and content_length
+            and content_length > self.max_body_bytes
+        ):
+            return 413, "request body too large", None
+
+        rate = self.endpoint_rates.get(endpoint, self.default_rate)
+        if rate:
+            wait = self.limiter.acquire((identity, endpoint), *rate)
+            if wait:
+                return 429, "rate limit exceeded", max(1, math.ceil(wait))
+
+        with self._lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return 503, "server busy", self.retry_after_seconds
+            self.in_flight += 1
+        return None
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
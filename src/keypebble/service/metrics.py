@@ -0,0 +1,86 @@
+"""Prometheus metrics for ``keypebble serve``, exposed at ``GET /metrics``.
+
+Each app owns its ``CollectorRegistry`` so several apps in one process (tests,
+embedding) never share counters.
+"""
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    generate_latest,
+)
+
+
+class Metrics:
+    """Collectors for one app."""
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.reloads = Counter(
+            "keypebble_config_reloads",
+            "Reloads of config, keys and policy, by result",
+            ["result"],
+            registry=self.registry,
+        )
+        self.config_generation = Gauge(
+            "keypebble_config_generation",
+            "Number of successful reloads since start (0 = config loaded at startup)",
+            registry=self.registry,
+        )
+        self.last_reload_successful = Gauge(
+            "keypebble_config_last_reload_successful",
+            "1 if the most recent reload succeeded, 0 if it failed",
+            registry=self.registry,
+        )
+        self.last_reload_success_time = Gauge(
+            "keypebble_config_last_reload_success_timestamp_seconds",
+            "Unix time of the most recent successful reload",
+            registry=self.registry,
+        )
+        self.introspection_cache = Counter(
+            "keypebble_introspection_cache",
+            "Introspection verification cache lookups, by result",
+            ["result"],
+            registry=self.registry,
+        )
+        self.ksa_cache = Counter(
+            "keypebble_ksa_cache",
+            "KSA token cache lookups and background refreshes, by result",
+            ["result"],
+            registry=self.registry,
+        )
+        self.audit_records = Counter(
+            "keypebble_audit_records",
+            "Audit log records of issued tokens, by outcome",
+            ["outcome"],
+            registry=self.registry,
+        )
+        self.cluster_peers = Gauge(
+            "keypebble_cluster_peers",
+            "Peers this node gossips with",
+            registry=self.registry,
+        )
+        self.cluster_policy_divergent = Gauge(
+            "keypebble_cluster_policy_divergent_nodes",
+            "Known cluster nodes whose policy hash differs from this node's",
+            registry=self.registry,
+        )
+        self.cluster_revocations = Counter(
+            "keypebble_cluster_revocations_received",
+            "Revocations learned from peers, by channel (gossip or sync)",
+            ["via"],
+            registry=self.registry,
+        )
+        self.cluster_syncs = Counter(
+            "keypebble_cluster_syncs",
+            "Anti-entropy exchanges, by result (in_sync, repaired or error)",
+            ["result"],
+            registry=self.registry,
+        )
+        self.last_reload_successful.set(1)
+
+    def render(self) -> tuple[bytes, str]:
+        """Return the exposition body and its content type."""
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,102 @@
+"""Graceful reload of config, keys and policy for ``keypebble serve``.
+
+``Reloader.reload`` builds the complete new state — config, parsed signing
+key, policy — before touching the app, then swaps it in under
+``app.state_lock``. Requests read their state once through
+``issuer_state`` (see ``service/app.py``), so in-flight requests finish on
+the state they started with and new requests see the new one. Any failure
+leaves the running state untouched.
+
+Settings that shape the server itself (``service.*``, ``limits``,
+``coalesce_requests``, ``fast_path``) are read once at startup and still
+need a restart.
+"""
+
+import logging
+import signal
+import threading
+import time
+
+from keypebble.config import load_config
+from keypebble.core import load_signing_key
+from keypebble.core.policy import Policy
+from keypebble.service.app import configure
+
+log = logging.getLogger(__name__)
+
+
+class Reloader:
+    """Reloads ``app`` from ``config_path`` and ``policy_path`` on demand or SIGHUP."""
+
+    def __init__(self, app, config_path: str, policy_path: str | None = None):
+        self.app = app
+        self.config_path = config_path
+        self.policy_path = policy_path
+        self.generation = 0
+        # Called as listener(config, policy) after each successful swap.
+        self.listeners: list = []
+        self._lock = threading.Lock()
+
+    def reload(self) -> bool:
+        """Load and swap in new state; returns False (and keeps the old) on error."""
+        app = self.app
+        metrics = app.metrics
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                config = load_config(self.config_path)
+                if not isinstance(config, dict):
+                    raise ValueError("config file is empty or not a mapping")
+                app_config = app.make_config()
+                configure(app_config, config, self.policy_path)
+                signing_key = load_signing_key(app_config)
+                policy = (
+                    Policy.from_file(self.policy_path) if self.policy_path else None
+                )
+            except Exception as e:  # any failure must leave the old state serving
+                metrics.reloads.labels(result="error").inc()
+                metrics.last_reload_successful.set(0)
+                log.error(
+                    "reload of %s failed, still serving generation %d: %s",
+                    self.config_path,
+                    self.generation,
+                    e,
+                )
+                return False
+
+            with app.state_lock:
+                app.config = app_config
+                app.policy_handler = policy
+                app.signing_key = (app_config, signing_key)
+            for listener in self.listeners:
+                listener(config, policy)
+
+            self.generation += 1
+            metrics.reloads.labels(result="success").inc()
+            metrics.last_reload_successful.set(1)
+            metrics.last_reload_success_time.set(time.time())
+            metrics.config_generation.set(self.generation)
+            log.info(
+                "reloaded %s (generation %d) in %.1f ms",
+                self.config_path,
+                self.generation,
+                (time.perf_counter() - started) * 1000,
+            )
+            return True
+
+    def install(self):
+        """Reload on SIGHUP; returns the previous handler."""
+        return install_sighup(self.reload)
+
+
+def install_sighup(reload):
+    """Call ``reload()`` on SIGHUP; returns the previous handler.
+
+    The signal handler only starts a thread, so loading files and parsing
+    keys never runs on the thread that accepts connections.
+    """
+
+    def on_sighup(signum, frame):
+        threading.Thread(target=reload, name="keypebble-reload", daemon=True).start()
+
+    return signal.signal(signal.SIGHUP, on_sighup)
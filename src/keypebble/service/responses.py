@@ -0,0 +1,33 @@
+"""Pre-encoded JSON bodies for the hot token endpoints.
+
+The lean response shape never changes, so everything except the token, TTL and
+timestamp is encoded once at import time and joined per request.
+"""
+
+_TOKEN = b'{"token":"'
+_ACCESS_TOKEN = b'","access_token":"'
+_EXPIRES_IN = b'","expires_in":'
+_ISSUED_AT = b',"issued_at":"'
+_END = b'"}'
+
+
+def lean_token_body(token: str, expires_in: int, issued_at: str) -> bytes:
+    """Return ``{"token", "access_token", "expires_in", "issued_at"}`` as JSON bytes.
+
+    JWTs are dot-joined base64url segments and ``issued_at`` is an ISO-8601
+    timestamp, so neither value needs JSON escaping.
+    """
+    encoded = token.encode("ascii")
+    return b"".join(
+        (
+            _TOKEN,
+            encoded,
+            _ACCESS_TOKEN,
+            encoded,
+            _EXPIRES_IN,
+            str(int(expires_in)).encode("ascii"),
+            _ISSUED_AT,
+            issued_at.encode("ascii"),
+            _END,
+        )
+    )
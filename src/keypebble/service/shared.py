@@ -0,0 +1,466 @@
+"""Shared-memory state for several ``keypebble serve`` workers on one host.
+
+Each worker process otherwise keeps its own rate-limit buckets, revocation
+list and introspection cache, so limits are exceeded N-fold and revocations
+only reach the worker that received them. With a ``shared_state`` block,
+all three live in memory-mapped files (``/dev/shm`` by default) that every
+worker maps, giving one consistent, fixed-size view without an external
+service.
+
+``SharedTable`` is a hash table of fixed-size slots. The slots are split
+into ``stripes`` contiguous regions, each guarded by its own lock: a
+``threading.Lock`` between threads plus an ``fcntl`` byte-range lock on
+the file between processes. A key hashes to one stripe and to a window of
+``PROBE_WINDOW`` slots inside it, so every operation takes exactly one
+lock and touches at most that many slots. Every entry has an expiry; an
+expired slot is free. When a window is full, ``set`` evicts the entry that
+expires first unless the caller forbids eviction (revocations must never
+be evicted early).
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from keypebble.core.revocation import COMPACT_SLACK, RevocationList
+
+MAGIC = b"KPSHM001"
+PROBE_WINDOW = 16
+
+_HEADER = struct.Struct("<8sIII")  # magic, slots, value_size, stripes
+_HEADER_SIZE = 64
+# state (1 = used), digest, expires, value length; the value follows.
+_SLOT = struct.Struct("<B7x16sdI4x")
+_DIGEST_AT, _EXPIRES_AT, _LENGTH_AT = 8, 24, 32
+_EXPIRES = struct.Struct("<d")
+_LENGTH = struct.Struct("<I")
+_USED = 1
+_BUCKET = struct.Struct("<dd")  # rate-limit bucket: tokens, updated
+
+DEFAULTS = {
+    "dir": "/dev/shm/keypebble",
+    "stripes": 64,
+    "rate_limit_slots": 65536,
+    "revocation_slots": 65536,
+    "introspection_slots": 4096,
+    "introspection_value_bytes": 1024,
+}
+
+
+class SharedTable:
+    """Fixed-size hash table in a memory-mapped file, shared across processes.
+
+    Values are ``bytes`` of at most ``value_size``. All workers must open a
+    table with the same geometry; a mismatch raises ``ValueError``.
+    """
+
+    def __init__(
+        self, path: str, slots: int = 65536, value_size: int = 64, stripes: int = 64
+    ):
+        if slots < stripes or slots % stripes:
+            raise ValueError("shared table slots must be a multiple of stripes")
+        self.path = path
+        self.slots = slots
+        self.value_size = value_size
+        self.stripes = stripes
+        self.region = slots // stripes
+        self.window = min(PROBE_WINDOW, self.region)
+        self.slot_size = (_SLOT.size + value_size + 7) & ~7
+        size = _HEADER_SIZE + slots * self.slot_size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Byte 0 serialises initialisation between workers starting together.
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, slots, value_size, stripes), 0)
+            header = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+            if header != (MAGIC, slots, value_size, stripes):
+                raise ValueError(
+                    f"{path} has a different layout (slots, value size, stripes); "
+                    "remove it or use the same shared_state settings in every worker"
+                )
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._map = mmap.mmap(self._fd, size)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def count(self, now: float | None = None) -> int:
+        """Live (unexpired) entries; a full scan, for metrics and tests."""
+        now = time.time() if now is None else now
+        count = 0
+        for i in range(self.slots):
+            state, _, expires, _ = _SLOT.unpack_from(self._map, self._offset(i))
+            count += state == _USED and expires > now
+        return count
+
+    def _offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * self.slot_size
+
+    def _place(self, key) -> tuple[bytes, int, list[tuple[int, int]]]:
+        """Digest, stripe and window of ``key``.
+
+        The window is a list of byte ranges: one, or two when it wraps around
+        the end of the stripe.
+        """
+        if isinstance(key, str):
+            key = key.encode()
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        stripe = int.from_bytes(digest[:4], "little") % self.stripes
+        home = int.from_bytes(digest[4:8], "little") % self.region
+        base, end = stripe * self.region, home + self.window
+        if end <= self.region:
+            window = [(self._offset(base + home), self._offset(base + end))]
+        else:
+            window = [
+                (self._offset(base + home), self._offset(base + self.region)),
+                (self._offset(base), self._offset(base + end - self.region)),
+            ]
+        return digest, stripe, window
+
+    def _lock(self, stripe: int) -> None:
+        self._locks[stripe].acquire()
+        try:
+            # Stripe n locks byte n + 1 (byte 0 is the initialisation lock).
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe + 1)
+        except BaseException:
+            self._locks[stripe].release()
+            raise
+
+    def _unlock(self, stripe: int) -> None:
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe + 1)
+        finally:
+            self._locks[stripe].release()
+
+    def _find(self, digest: bytes, window) -> int | None:
+        """Offset of the slot holding ``digest`` (live or expired), if any."""
+        mm = self._map
+        for start, end in window:
+            # bytes.find runs in C; a hit must still be a slot's digest field.
+            pos = mm.find(digest, start, end)
+            while pos != -1:
+                off = pos - _DIGEST_AT
+                if (off - _HEADER_SIZE) % self.slot_size == 0 and mm[off] == _USED:
+                    return off
+                pos = mm.find(digest, pos + 1, end)
+        return None
+
+    def _expires(self, off: int) -> float:
+        return _EXPIRES.unpack_from(self._map, off + _EXPIRES_AT)[0]
+
+    def _value(self, off: int) -> bytes:
+        length = _LENGTH.unpack_from(self._map, off + _LENGTH_AT)[0]
+        return self._map[off + _SLOT.size : off + _SLOT.size + length]
+
+    def _free_slot(self, window, now: float, evict: bool) -> int | None:
+        """First empty or expired slot; else the soonest-expiring one if ``evict``."""
+        offsets = [
+            off for start, end in window for off in range(start, end, self.slot_size)
+        ]
+        for off in offsets:
+            if self._map[off] != _USED or self._expires(off) <= now:
+                return off
+        return min(offsets, key=self._expires) if evict else None
+
+    def get(self, key, now: float | None = None) -> bytes | None:
+        """Value stored under ``key``, or ``None`` if absent or expired."""
+        now = time.time() if now is None else now
+        digest, stripe, window = self._place(key)
+        self._lock(stripe)
+        try:
+            off = self._find(digest, window)
+            if off is None or self._expires(off) <= now:
+                return None
+            return self._value(off)
+        finally:
+            self._unlock(stripe)
+
+    def update(self, key, fn, now: float | None = None, evict: bool = True) -> bool:
+        """Atomically replace the entry for ``key`` with ``fn(old)``.
+
+        ``old`` is ``(value, expires)`` or ``None``; ``fn`` returns the new
+        ``(value, expires)``, or ``None`` to leave the entry as it is.
+        Returns False when the key's window is full of live entries and
+        ``evict`` is off, True otherwise.
+        """
+        now = time.time() if now is None else now
+        digest, stripe, window = self._place(key)
+        self._lock(stripe)
+        try:
+            off = self._find(digest, window)
+            old = None
+            if off is not None and self._expires(off) > now:
+                old = (self._value(off), self._expires(off))
+            new = fn(old)
+            if new is None:
+                return True
+            value, expires = new
+            if len(value) > self.value_size:
+                raise ValueError(f"value of {len(value)} bytes exceeds slot size")
+            if off is None:
+                off = self._free_slot(window, now, evict)
+                if off is None:
+                    return False
+            _SLOT.pack_into(self._map, off, _USED, digest, float(expires), len(value))
+            self._map[off + _SLOT.size : off + _SLOT.size + len(value)] = value
+            return True
+        finally:
+            self._unlock(stripe)
+
+    def set(
+        self, key, value: bytes, expires: float, now: float | None = None, evict=True
+    ) -> bool:
+        """Store ``value`` under ``key`` until ``expires``; see ``update``."""
+        return self.update(key, lambda _: (value, expires), now, evict)
+
+    def delete(self, key) -> None:
+        digest, stripe, window = self._place(key)
+        self._lock(stripe)
+        try:
+            off = self._find(digest, window)
+            if off is not None:
+                self._map[off] = 0
+        finally:
+            self._unlock(stripe)
+
+
+class SharedState:
+    """The shared tables for one host, built from the ``shared_state`` config."""
+
+    def __init__(self, conf: dict):
+        settings = {**DEFAULTS, **conf}
+        root = Path(settings["dir"])
+        root.mkdir(parents=True, exist_ok=True, mode=0o700)
+        stripes = int(settings["stripes"])
+        self.rate_limits = SharedTable(
+            str(root / "rate_limits"),
+            int(settings["rate_limit_slots"]),
+            _BUCKET.size,
+            stripes,
+        )
+        self.revocations = SharedTable(
+            str(root / "revocations"), int(settings["revocation_slots"]), 0, stripes
+        )
+        self.introspection = SharedTable(
+            str(root / "introspection"),
+            int(settings["introspection_slots"]),
+            int(settings["introspection_value_bytes"]),
+            stripes,
+        )
+
+
+# --- Feature adapters ----------------------------------------------------------
+
+
+class SharedRateLimiter:
+    """``RateLimiter`` whose token buckets live in a ``SharedTable``.
+
+    A bucket expires ``idle_seconds`` after its last use, as with the
+    in-process limiter; when a window is full, the bucket idle longest is
+    evicted first. The default clock, ``time.monotonic``, is the same in
+    every process on the host.
+    """
+
+    def __init__(
+        self, table: SharedTable, idle_seconds: float = 300.0, clock=time.monotonic
+    ):
+        self.table = table
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+
+    def __len__(self) -> int:
+        return self.table.count(self.clock())
+
+    def acquire(self, key, rate: float, burst: float) -> float:
+        """Take a token for ``key``. Returns 0.0 if allowed, else the retry delay."""
+        now = self.clock()
+        wait = 0.0
+
+        def take(old):
+            nonlocal wait
+            if old is None:
+                tokens = burst
+            else:
+                tokens, updated = _BUCKET.unpack(old[0])
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            return _BUCKET.pack(tokens, now), now + self.idle_seconds
+
+        self.table.update("\0".join(key), take, now)
+        return wait
+
+
+class SharedRevocationList(RevocationList):
+    """``RevocationList`` whose entries live in a ``SharedTable``.
+
+    The table stores only digests, so the journal at ``path`` stays the
+    record of which ``jti`` values are revoked. Every worker appends to it
+    and compacts it under an ``fcntl`` lock on ``<path>.lock``, and each
+    keeps a mirror of the journal that ``entries()`` extends with only the
+    lines appended since its last call.
+    """
+
+    def __init__(self, table: SharedTable, path: str | None = None):
+        self.table = table
+        self._mirror: dict[str, int] = {}
+        self._offset = 0
+        self._inode = None
+        super().__init__(path)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def is_revoked(self, jti: str | None) -> bool:
+        return jti is not None and self.table.get(jti) is not None
+
+    def revoke(self, jti: str, exp: int, now: float | None = None) -> None:
+        if not jti:
+            raise ValueError("jti is required")
+        now = time.time() if now is None else now
+        if self._store(jti, int(exp), now) and self.path:
+            with self._lock, self._journal_lock():
+                self._append(jti, int(exp))
+                self._compact_if_slack(now)
+
+    def _store(self, jti: str, exp: int, now: float) -> bool:
+        """Record ``jti`` until ``exp``; True if that extended its revocation."""
+        changed = False
+
+        def extend(old):
+            nonlocal changed
+            if exp <= now or (old is not None and old[1] >= exp):
+                return None
+            changed = True
+            return b"", exp
+
+        if not self.table.update(jti, extend, now, evict=False):
+            raise ValueError("shared revocation table is full")
+        return changed
+
+    def purge(self, now: float | None = None) -> int:
+        """Compact the journal if it has grown; table slots are reused in place."""
+        if self.path:
+            with self._lock, self._journal_lock():
+                self._compact_if_slack(time.time() if now is None else now)
+        return 0
+
+    def entries(self) -> list[tuple[str, int]]:
+        """Revocations from the journal; the table itself stores only digests."""
+        if not self.path:
+            return []
+        with self._lock:
+            self._refresh()
+            return list(self._mirror.items())
+
+    # --- Journal -------------------------------------------------------------
+
+    def _load(self) -> None:
+        now = time.time()
+        with self._lock:
+            self._refresh()
+            for jti, exp in self._mirror.items():
+                self._store(jti, exp, now)
+
+    def _append(self, jti: str, exp: int) -> None:
+        # Not counted here: ``_refresh`` counts it along with other workers' lines.
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"jti": jti, "exp": exp}) + "\n")
+
+    @contextmanager
+    def _journal_lock(self):
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _refresh(self) -> None:
+        """Fold journal lines appended since the last call into the mirror."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                # Another worker compacted the journal: start over.
+                self._mirror, self._offset, self._inode = {}, 0, st.st_ino
+                self._journal_lines = 0
+            f.seek(self._offset)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]  # leave a torn line for later
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            self._journal_lines += 1
+            try:
+                entry = json.loads(line)
+                jti, exp = entry["jti"], int(entry["exp"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            self._mirror[jti] = max(exp, self._mirror.get(jti, exp))
+
+    def _compact_if_slack(self, now: float) -> None:
+        self._refresh()
+        self._mirror = {jti: exp for jti, exp in self._mirror.items() if exp > now}
+        if self._journal_lines <= len(self._mirror) + COMPACT_SLACK:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            for jti, exp in self._mirror.items():
+                f.write(json.dumps({"jti": jti, "exp": exp}) + "\n")
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._offset, self._inode = st.st_size, st.st_ino
+        self._journal_lines = len(self._mirror)
+
+
+class SharedVerificationCache:
+    """``VerificationCache`` whose entries live in a ``SharedTable``.
+
+    ``key_id`` identifies the verification key, so a worker never accepts
+    claims another worker verified under a key it no longer uses. Claims
+    too large for a slot are simply not cached.
+    """
+
+    def __init__(self, table: SharedTable, key_id: bytes):
+        self.table = table
+        self.key_id = key_id
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def get(self, digest: bytes, now: float) -> dict | None:
+        value = self.table.get(digest, now)
+        if value is None or not value.startswith(self.key_id):
+            return None
+        return json.loads(value[len(self.key_id) :])
+
+    def put(self, digest: bytes, claims: dict) -> None:
+        exp = claims.get("exp")
+        if not isinstance(exp, int):
+            return
+        value = self.key_id + json.dumps(claims, separators=(",", ":")).encode()
+        if len(value) <= self.table.value_size:
+            self.table.set(digest, value, exp)
@@ -0,0 +1,192 @@
+"""Several issuers in one ``keypebble serve`` process.
+
+A tenants file names one keypebble config (and optional policy) per tenant::
+
+    service: {port: 8080}          # the listener; tenant service.* is ignored
+    default: registry              # optional: tenant for unmatched requests
+    tenants:
+      registry:
+        config: /etc/keypebble/config.yaml
+        policy: /etc/keypebble/policy.yaml
+        hosts: [auth.example.com]
+        path_prefix: /registry
+      ksa:
+        config: /etc/keypebble/config.ksa.yaml
+        hosts: [ksa.example.com]
+
+Every tenant is a complete app from ``create_app``, so keys, policy,
+revocations, caches, admission control and the ``/metrics`` registry are
+per tenant by construction; only the interpreter and the listener are
+shared. ``TenantRouter`` picks the app with one dict lookup on the ``Host``
+header (port stripped), then one on the first path segment, which is moved
+from ``PATH_INFO`` to ``SCRIPT_NAME`` so the tenant's routes are unchanged.
+"""
+
+import logging
+
+from keypebble.config import load_config
+from keypebble.service.reload import Reloader, install_sighup
+
+log = logging.getLogger(__name__)
+
+_NOT_FOUND = b'{"error":"unknown tenant"}\n'
+
+
+def _strip_port(host: str) -> str:
+    if host.endswith("]"):  # bare IPv6 literal
+        return host
+    name, _, port = host.rpartition(":")
+    return name if name and port.isdigit() else host
+
+
+class TenantRouter:
+    """WSGI app dispatching each request to its tenant's app."""
+
+    def __init__(self):
+        self.by_host: dict = {}
+        self.by_prefix: dict = {}
+        self.default = None
+
+    def add(self, app, hosts=(), path_prefix: str | None = None) -> None:
+        for host in hosts:
+            host = _strip_port(host.lower())
+            if host in self.by_host:
+                raise ValueError(f"host {host!r} is routed to two tenants")
+            self.by_host[host] = app
+        if path_prefix:
+            segment = path_prefix.strip("/")
+            if not segment or "/" in segment:
+                raise ValueError(
+                    f"path_prefix {path_prefix!r} must be a single path segment"
+                )
+            if segment in self.by_prefix:
+                raise ValueError(f"path_prefix {path_prefix!r} is used twice")
+            self.by_prefix[segment] = app
+
+    def __call__(self, environ, start_response):
+        host = environ.get("HTTP_HOST")
+        app = self.by_host.get(_strip_port(host.lower())) if host else None
+        if app is None and self.by_prefix:
+            path = environ.get("PATH_INFO", "")
+            segment, _, rest = path[1:].partition("/")
+            app = self.by_prefix.get(segment)
+            if app is not None:
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/" + segment
+                environ["PATH_INFO"] = "/" + rest
+        if app is None:
+            app = self.default
+        if app is None:
+            start_response(
+                "404 NOT FOUND",
+                [
+                    ("Content-Type", "application/json"),
+                    ("Content-Length", str(len(_NOT_FOUND))),
+                ],
+            )
+            return [_NOT_FOUND]
+        return app(environ, start_response)
+
+
+class Tenant:
+    """One tenant's app and reloader, plus the paths they were loaded from."""
+
+    def __init__(self, name, app, config: dict, config_path, policy_path, reloader):
+        self.name = name
+        self.app = app
+        self.config = config
+        self.config_path = config_path
+        self.policy_path = policy_path
+        self.reloader = reloader
+
+
+def _isolate(name: str, config: dict, claimed: dict) -> None:
+    """Keep tenants from sharing files: each ``shared_state`` defaults to its
+    own directory, and two tenants may not name the same one."""
+    from keypebble.service.shared import DEFAULTS as SHARED_DEFAULTS
+
+    shared = config.get("shared_state")
+    if shared is not None and not shared.get("dir"):
+        config["shared_state"] = dict(shared, dir=f"{SHARED_DEFAULTS['dir']}/{name}")
+    for section in ("shared_state", "audit"):
+        directory = (config.get(section) or {}).get("dir")
+        if directory is None:
+            continue
+        owner = claimed.setdefault((section, directory), name)
+        if owner != name:
+            raise ValueError(
+                f"tenants {owner!r} and {name!r} share {section}.dir {directory!r}"
+            )
+
+
+class Tenants:
+    """Every tenant of a tenants file, and the router in front of them."""
+
+    def __init__(self, service: dict | None = None):
+        self.service = service or {}
+        self.tenants: dict = {}
+        self.router = TenantRouter()
+
+    def reload(self) -> bool:
+        """Reload every tenant; a failing tenant keeps its old state."""
+        results = [tenant.reloader.reload() for tenant in self.tenants.values()]
+        return all(results)
+
+    def install(self):
+        """Reload every tenant on SIGHUP; returns the previous handler."""
+        return install_sighup(self.reload)
+
+
+def load_tenants(path: str) -> Tenants:
+    """Build the apps and router described by the tenants file at ``path``."""
+    from keypebble.service.app import create_app
+    from keypebble.service.fast import install_fast_path
+
+    spec = load_config(path)
+    if not isinstance(spec, dict) or not isinstance(spec.get("tenants"), dict):
+        raise ValueError(f"{path}: expected a 'tenants' mapping")
+    if not spec["tenants"]:
+        raise ValueError(f"{path}: no tenants defined")
+
+    tenants = Tenants(spec.get("service"))
+    claimed: dict = {}
+    for name, entry in spec["tenants"].items():
+        if not isinstance(entry, dict) or not entry.get("config"):
+            raise ValueError(f"tenant {name!r} needs a config path")
+        hosts, prefix = entry.get("hosts") or [], entry.get("path_prefix")
+        if not hosts and not prefix and spec.get("default") != name:
+            raise ValueError(
+                f"tenant {name!r} needs hosts, a path_prefix, or to be the default"
+            )
+
+        config_path, policy_path = entry["config"], entry.get("policy")
+        config = load_config(config_path)
+        if not isinstance(config, dict):
+            raise ValueError(f"tenant {name!r}: {config_path} is not a mapping")
+        _isolate(name, config, claimed)
+        app = create_app(config, policy_path=policy_path)
+        app.tenant = name
+        if config.get("fast_path"):
+            install_fast_path(app)
+        tenants.router.add(app, hosts, prefix)
+        tenants.tenants[name] = Tenant(
+            name,
+            app,
+            config,
+            config_path,
+            policy_path,
+            Reloader(app, config_path, policy_path),
+        )
+        log.info(
+            "tenant %s: %s (hosts %s, prefix %s)",
+            name,
+            config_path,
+            ", ".join(hosts) or "-",
+            prefix or "-",
+        )
+
+    default = spec.get("default")
+    if default is not None:
+        if default not in tenants.tenants:
+            raise ValueError(f"default tenant {default!r} is not defined")
+        tenants.router.default = tenants.tenants[default].app
+    return tenants
@@ -0,0 +1,84 @@
+"""Unix domain socket listeners for ``keypebble serve``.
+
+Shared by the HTTP listener (``service.socket_path``) and the minting daemon
+(``service.daemon_socket``): both refuse to steal a path another live process
+is listening on, clear a stale socket file left by a crash, and create the
+socket with its final permissions so it is never briefly world-accessible.
+"""
+
+import os
+import socket
+import stat
+import tempfile
+from contextlib import contextmanager
+
+DEFAULT_SOCKET_MODE = 0o660
+
+
+def claim_socket_path(path: str) -> None:
+    """Make ``path`` available for binding, removing a stale socket file.
+
+    Raises ``RuntimeError`` if something is still listening on ``path`` or
+    if ``path`` exists but is not a socket.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise RuntimeError(f"{path} exists and is not a socket")
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise RuntimeError(f"another process is already listening on {path}")
+    finally:
+        probe.close()
+
+
+@contextmanager
+def bind_privately(path: str, mode: int):
+    """Yield a path to bind to instead of ``path``; it is moved there after.
+
+    The socket is bound inside a fresh 0700 directory next to ``path``,
+    given ``mode`` and only then renamed into place. Unlike narrowing the
+    umask, this leaves the process-wide umask alone for other threads.
+    """
+    private = tempfile.mkdtemp(
+        prefix=".keypebble-", dir=os.path.dirname(os.path.abspath(path))
+    )
+    tmp = os.path.join(private, "sock")
+    try:
+        yield tmp
+        os.chmod(tmp, mode)
+        os.rename(tmp, path)
+    finally:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        os.rmdir(private)
+
+
+def parse_mode(value, default: int = DEFAULT_SOCKET_MODE) -> int:
+    """Accept ``0o660``/``432`` from YAML or an octal string like ``"0660"``."""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return int(value, 8)
+    return int(value)
+
+
+def make_unix_server(path: str, app, mode: int = DEFAULT_SOCKET_MODE):
+    """Threaded HTTP/1.1 WSGI server for ``app`` listening on ``path``.
+
+    HTTP/1.1 lets a reverse proxy keep upstream connections alive.
+    """
+    from werkzeug.serving import make_server
+
+    claim_socket_path(path)
+    with bind_privately(path, mode) as tmp:
+        server = make_server(f"unix://{tmp}", 0, app, threaded=True)
+    server.server_address = path
+    return server
@@ -2,16 +2,30 @@
 import pytest
 
 from keypebble.service.app import create_app
+from keypebble.service.fast import install_fast_path
+
+
+@pytest.fixture(params=["flask", "fast_path"])
+def make_app(request):
+    """App factory run against both the Flask routes and the raw WSGI fast path."""
+
+    def factory(config, policy_path=None):
+        app = create_app(config, policy_path=policy_path)
+        if request.param == "fast_path":
+            install_fast_path(app)
+        return app
+
+    return factory
 
 
 @pytest.fixture
-def app():
+def app(make_app):
     config = {
         "hs256_secret": "test-secret",
         "issuer": "keypebble-test",
         "audience": "keypebble-edge",
     }
-    return create_app(config)
+    return make_app(config)
 
 
 @pytest.fixture
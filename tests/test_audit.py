@@ -0,0 +1,171 @@
+import json
+
+import pytest
+
+from keypebble.bench import bench_audit
+from keypebble.core import issue_token
+from keypebble.service.audit import AuditLog
+
+CONFIG = {
+    "hs256_secret": "audit-secret-0123456789abcdef0123456789",
+    "issuer": "keypebble-test",
+    "audience": "registry",
+}
+
+# Writer effectively idle until close(), so tests control when records drain.
+IDLE = {"flush_interval_ms": 60000, "batch_size": 1000}
+
+
+def _lines(directory):
+    return [
+        json.loads(line)
+        for path in sorted(directory.glob("audit-*.jsonl"))
+        for line in path.read_text().splitlines()
+    ]
+
+
+def test_records_are_written_with_signed_claims(tmp_path):
+    audit = AuditLog({"dir": str(tmp_path), "fsync": "always"})
+    token = issue_token(CONFIG, {"sub": "alice", "jti": "j1"})
+
+    assert audit.record("auth", token)
+    audit.close()
+
+    (line,) = _lines(tmp_path)
+    assert line["endpoint"] == "auth"
+    assert line["claims"]["sub"] == "alice"
+    assert line["claims"]["jti"] == "j1"
+    assert line["claims"]["aud"] == "registry"
+    assert "exp" in line["claims"]
+    assert audit.written == 1
+
+
+def test_drop_policy_counts_overflow(tmp_path):
+    audit = AuditLog({"dir": str(tmp_path), "buffer_size": 4, **IDLE})
+    results = [audit.record("auth", "a.e30.c") for _ in range(10)]
+    audit.close()
+
+    assert results.count(True) == 4
+    assert audit.dropped == 6
+    assert len(_lines(tmp_path)) == 4
+
+
+def test_sample_policy_keeps_weighted_records(tmp_path):
+    audit = AuditLog(
+        {
+            "dir": str(tmp_path),
+            "buffer_size": 10,
+            "overflow": "sample",
+            "sample_every": 2,
+            **IDLE,
+        }
+    )
+    for _ in range(15):
+        audit.record("auth", "a.e30.c")
+    audit.close()
+
+    lines = _lines(tmp_path)
+    # Five records below the half-full mark, then one in two until full.
+    assert len(lines) == 10
+    assert [line.get("sample_weight", 1) for line in lines[5:]] == [2] * 5
+    assert audit.dropped == 5
+
+
+def test_block_policy_loses_nothing(tmp_path):
+    audit = AuditLog(
+        {
+            "dir": str(tmp_path),
+            "buffer_size": 2,
+            "overflow": "block",
+            "flush_interval_ms": 5,
+        }
+    )
+    for _ in range(50):
+        assert audit.record("auth", "a.e30.c")
+    audit.close()
+
+    assert audit.dropped == 0
+    assert len(_lines(tmp_path)) == 50
+
+
+def test_segments_rotate_by_size(tmp_path):
+    audit = AuditLog(
+        {
+            "dir": str(tmp_path),
+            "segment_bytes": 1,
+            "batch_size": 1,
+            "flush_interval_ms": 60000,
+        }
+    )
+    for _ in range(3):
+        audit.record("auth", "a.e30.c")
+    audit.close()
+
+    segments = [p for p in tmp_path.glob("audit-*.jsonl") if p.stat().st_size]
+    assert len(segments) == 3
+    assert len(_lines(tmp_path)) == 3
+
+
+@pytest.mark.parametrize(
+    "conf",
+    [{}, {"dir": "x", "overflow": "spill"}, {"dir": "x", "fsync": "sometimes"}],
+)
+def test_invalid_config_is_rejected(conf):
+    with pytest.raises(ValueError):
+        AuditLog(conf)
+
+
+def test_service_endpoints_are_audited(make_app, tmp_path):
+    app = make_app(dict(CONFIG, audit={"dir": str(tmp_path)}))
+    client = app.test_client()
+
+    client.post("/auth", json={"sub": "alice"})
+    client.get("/v2/token", headers={"X-Authenticated-User": "bob"})
+    client.post("/command/token", json={"target": "edge-01", "command": "uptime"})
+    app.audit.close()
+
+    lines = _lines(tmp_path)
+    assert [line["endpoint"] for line in lines] == [
+        "auth",
+        "v2_token",
+        "command_token",
+    ]
+    assert lines[1]["claims"]["sub"] == "bob"
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'keypebble_audit_records_total{outcome="written"} 3.0' in metrics
+
+
+def test_merkle_fanout_audits_every_command(make_app, tmp_path):
+    app = make_app(dict(CONFIG, audit={"dir": str(tmp_path)}))
+    resp = app.test_client().post(
+        "/command/token",
+        json={
+            "targets": ["edge-01", "edge-02"],
+            "command": "uptime",
+            "user": "op",
+            "mode": "merkle",
+        },
+    )
+    app.audit.close()
+
+    batch_jti = resp.get_json()["batch_jti"]
+    tokens = resp.get_json()["tokens"]
+    lines = _lines(tmp_path)
+    assert [line["endpoint"] for line in lines] == [
+        "command_batch",
+        "command_token",
+        "command_token",
+    ]
+    assert lines[0]["claims"]["jti"] == batch_jti
+    for line, issued in zip(lines[1:], tokens):
+        claims = line["claims"]
+        assert (claims["aud"], claims["jti"]) == (issued["target"], issued["jti"])
+        assert (claims["sub"], claims["command"]) == ("op", "uptime")
+
+
+def test_bench_audit_reports_sink_throughput(tmp_path):
+    report = bench_audit(concurrency=2, duration=0.2, overflow="block")
+
+    assert report["workload"] == "audit"
+    assert report["audit"]["dropped"] == 0
+    assert report["audit"]["written"] == report["requests"] > 0
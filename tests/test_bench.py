@@ -0,0 +1,68 @@
+import json
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from keypebble import cli
+from keypebble.bench import WORKLOADS, bench, format_table, percentile, request_spec
+from keypebble.service.app import create_app
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 99.9) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+def test_request_spec_fills_in_user():
+    method, path, headers, body = request_spec("ksa", "ci-bot")
+    assert method == "POST"
+    assert path.endswith("/serviceaccounts/ci-bot/token")
+    assert headers["Content-Type"] == "application/json"
+    assert json.loads(body)["spec"]["audiences"]
+
+
+@pytest.mark.parametrize("workload", sorted(WORKLOADS))
+def test_in_process_workloads_succeed(workload):
+    report = bench(workload, concurrency=2, duration=0.2)
+    assert report["requests"] > 0
+    assert report["errors"] == 0
+    lat = report["latency_ms"]
+    assert lat["p50"] <= lat["p95"] <= lat["p99"] <= lat["p999"] <= lat["max"]
+
+
+def test_http_target(tmp_path):
+    app = create_app({"hs256_secret": "bench-http-secret", "audience": "bench"})
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        report = bench(
+            "command",
+            concurrency=2,
+            duration=0.2,
+            url=f"http://127.0.0.1:{server.server_port}",
+        )
+    finally:
+        server.shutdown()
+
+    assert report["target"].startswith("http://127.0.0.1:")
+    assert report["requests"] > 0
+    assert report["errors"] == 0
+    assert "throughput" in format_table(report)
+
+
+def test_cli_bench_writes_json_report(tmp_path, capsys):
+    out = tmp_path / "report.json"
+    args = cli.build_parser().parse_args(
+        ["bench", "--workload", "auth", "--duration", "0.2", "--json", str(out)]
+    )
+    args.func(args)
+
+    assert "latency p99" in capsys.readouterr().out
+    report = json.loads(out.read_text())
+    assert report["workload"] == "auth"
+    assert set(report["latency_ms"]) == {"mean", "p50", "p95", "p99", "p999", "max"}
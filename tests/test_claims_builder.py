@@ -2,6 +2,8 @@
 
 from types import SimpleNamespace
 
+import pytest
+
 from keypebble.core.claims import ClaimBuilder
 
 
@@ -80,3 +82,110 @@ def test_unmatched_prefix_is_treated_as_literal():
     claims = builder.build(make_request(), mapping)
     # no prefix handler matched → treated literally
     assert claims["foo"] == "$.unknown.value"
+
+
+def test_compiled_plan_parses_body_once():
+    calls = []
+
+    def get_json(silent=True):
+        calls.append(silent)
+        return {"username": "alice", "team": "core"}
+
+    req = SimpleNamespace(args={"account": "bob"}, method="POST", get_json=get_json)
+    plan = ClaimBuilder().compile(
+        {"sub": "$.body.username", "team": "$.body.team", "acct": "$.query.account"}
+    )
+
+    assert plan.build(req) == {"sub": "alice", "team": "core", "acct": "bob"}
+    assert calls == [True]
+
+
+def test_literal_only_plan_skips_the_request():
+    plan = ClaimBuilder().compile({"service": "docker-registry", "count": 3})
+    claims = plan.build(None)
+
+    assert claims == {"service": "docker-registry", "count": 3}
+    assert plan.resolvers == [] and not plan.needs_body
+    # Each build returns its own dict.
+    claims["count"] = 4
+    assert plan.build(None)["count"] == 3
+
+
+def test_plan_without_body_selectors_does_not_parse_body():
+    def get_json(silent=True):
+        raise AssertionError("body parsed")
+
+    req = SimpleNamespace(args={"account": "bob"}, method="GET", get_json=get_json)
+    plan = ClaimBuilder().compile({"sub": "$.query.account", "svc": "registry"})
+    assert plan.build(req) == {"svc": "registry", "sub": "bob"}
+
+
+def test_nested_body_paths():
+    body = {
+        "spec": {"audiences": ["registry", "vault"], "ttl": 600},
+        "meta": {"a.b": "dotted"},
+    }
+    plan = ClaimBuilder().compile(
+        {
+            "aud": "$.body.spec.audiences[0]",
+            "last": "$.body.spec.audiences[-1]",
+            "ttl": "$.body.spec.ttl",
+            "dotted": '$.body.meta["a.b"]',
+        }
+    )
+    assert plan.build(make_request(body=body)) == {
+        "aud": "registry",
+        "last": "vault",
+        "ttl": 600,
+        "dotted": "dotted",
+    }
+
+
+def test_missing_and_mistyped_paths_resolve_to_none():
+    body = {"spec": {"audiences": ["registry"], "name": "svc"}}
+    plan = ClaimBuilder().compile(
+        {
+            "missing": "$.body.spec.nope.deeper",
+            "out_of_range": "$.body.spec.audiences[5]",
+            "index_on_dict": "$.body.spec[0]",
+            "key_on_list": "$.body.spec.audiences.first",
+            "key_on_str": "$.body.spec.name.length",
+        }
+    )
+    assert set(plan.build(make_request(body=body)).values()) == {None}
+    # A list or absent body is not an error either.
+    req = SimpleNamespace(args={}, method="POST", get_json=lambda silent=True: [1])
+    assert plan.build(req)["missing"] is None
+
+
+def test_malformed_paths_fail_at_compile_time():
+    for ref in ("$.body.spec[", "$.body.a..b", "$.body.", "$.body.x[abc]"):
+        with pytest.raises(ValueError):
+            ClaimBuilder().compile({"x": ref})
+
+
+def test_header_path_and_nested_mappings():
+    req = SimpleNamespace(
+        args={},
+        method="POST",
+        headers={"X-Foo": "bar"},
+        view_args={"namespace": "ci", "name": "builder"},
+        get_json=lambda silent=True: {"spec": {"audiences": ["registry"]}},
+    )
+    plan = ClaimBuilder().compile(
+        {
+            "aud": "$.body.spec.audiences",
+            "foo": "$.header.X-Foo",
+            "kubernetes.io": {
+                "namespace": "$.path.namespace",
+                "serviceaccount": {"name": "$.path.name"},
+            },
+            "static": {"kind": "literal"},
+        }
+    )
+    assert plan.build(req) == {
+        "static": {"kind": "literal"},
+        "aud": ["registry"],
+        "foo": "bar",
+        "kubernetes.io": {"namespace": "ci", "serviceaccount": {"name": "builder"}},
+    }
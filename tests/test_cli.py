@@ -2,6 +2,8 @@
 import json
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 from keypebble import cli
 
 
@@ -11,7 +13,7 @@ def test_issue_command_invokes_issue_token(tmp_path):
     cfg_file.write_text("foo: bar")
 
     mock_token = "abc123"
-    with patch("keypebble.cli.issue_token", return_value=mock_token) as mock_issue:
+    with patch("keypebble.core.issue_token", return_value=mock_token) as mock_issue:
         args = cli.build_parser().parse_args(
             [
                 "issue",
@@ -41,8 +43,8 @@ def test_issue_command_applies_policy_if_provided(tmp_path):
     ]
 
     with (
-        patch("keypebble.cli.issue_token", return_value=mock_token) as mock_issue,
-        patch("keypebble.cli.Policy") as mock_policy_class,
+        patch("keypebble.core.issue_token", return_value=mock_token) as mock_issue,
+        patch("keypebble.core.policy.Policy") as mock_policy_class,
     ):
         mock_policy_class.from_file.return_value = mock_policy
         args = cli.build_parser().parse_args(
@@ -92,8 +94,8 @@ def test_issue_command_generates_claims_from_policy(tmp_path):
     }
 
     with (
-        patch("keypebble.cli.issue_token", return_value=mock_token) as mock_issue,
-        patch("keypebble.cli.Policy") as mock_policy_class,
+        patch("keypebble.core.issue_token", return_value=mock_token) as mock_issue,
+        patch("keypebble.core.policy.Policy") as mock_policy_class,
     ):
         mock_policy_class.from_file.return_value = mock_policy
         args = cli.build_parser().parse_args(
@@ -125,7 +127,9 @@ def test_serve_command_calls_create_app_with_policy(tmp_path):
     policy_file.write_text("users: {}")
 
     mock_app = MagicMock()
-    with patch("keypebble.cli.create_app", return_value=mock_app) as mock_create:
+    with patch(
+        "keypebble.service.app.create_app", return_value=mock_app
+    ) as mock_create:
         args = cli.build_parser().parse_args(
             ["serve", "--config", str(cfg_file), "--policy", str(policy_file)]
         )
@@ -135,3 +139,51 @@ def test_serve_command_calls_create_app_with_policy(tmp_path):
     kwargs = mock_create.call_args.kwargs
     assert kwargs["policy_path"] == str(policy_file)
     mock_app.run.assert_called_once()
+
+
+def test_serve_command_installs_fast_path_when_configured(tmp_path):
+    """fast_path: true in the config wraps the app's wsgi_app before running."""
+    cfg_file = tmp_path / "config.yaml"
+    cfg_file.write_text("fast_path: true")
+
+    mock_app = MagicMock()
+    with (
+        patch("keypebble.service.app.create_app", return_value=mock_app),
+        patch("keypebble.service.fast.install_fast_path") as mock_install,
+    ):
+        args = cli.build_parser().parse_args(["serve", "--config", str(cfg_file)])
+        args.func(args)
+
+    mock_install.assert_called_once_with(mock_app)
+    mock_app.run.assert_called_once()
+
+
+def test_serve_command_runs_tenant_router(tmp_path):
+    """--tenants serves every tenant behind one router on service.port."""
+    cfg_file = tmp_path / "config.yaml"
+    cfg_file.write_text('hs256_secret: "s"')
+    tenants_file = tmp_path / "tenants.yaml"
+    tenants_file.write_text(
+        f"service: {{port: 9090}}\ntenants:\n  a:\n    config: {cfg_file}\n"
+        "    hosts: [a.example.com]\n"
+    )
+
+    with (
+        patch("werkzeug.serving.run_simple") as mock_run,
+        patch("keypebble.service.tenants.install_sighup") as mock_sighup,
+    ):
+        args = cli.build_parser().parse_args(["serve", "--tenants", str(tenants_file)])
+        args.func(args)
+
+    router = mock_run.call_args.args[2]
+    assert mock_run.call_args.args[:2] == ("0.0.0.0", 9090)
+    assert set(router.by_host) == {"a.example.com"}
+    mock_sighup.assert_called_once()
+
+
+def test_serve_requires_exactly_one_of_config_and_tenants(tmp_path):
+    parser = cli.build_parser()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["serve"])
+    with pytest.raises(SystemExit):
+        parser.parse_args(["serve", "--config", "a.yaml", "--tenants", "t.yaml"])
@@ -0,0 +1,185 @@
+import io
+import json
+from unittest.mock import patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from keypebble import cli
+from keypebble.batch import ordered_map
+from keypebble.core import token as token_module
+
+SECRET = "batch-secret"
+
+
+@pytest.fixture
+def cfg_file(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(f'issuer: "batch-test"\nhs256_secret: "{SECRET}"\n')
+    return path
+
+
+def _run(argv, capsys):
+    args = cli.build_parser().parse_args(argv)
+    args.func(args)
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def _decode(token):
+    return jwt.decode(
+        token, SECRET, algorithms=["HS256"], options={"verify_aud": False}
+    )
+
+
+def _square(x):
+    return x * x
+
+
+def test_ordered_map_preserves_order_across_processes():
+    assert list(ordered_map(_square, range(200), jobs=2)) == [x * x for x in range(200)]
+
+
+def test_issue_batch_one_token_per_line(cfg_file, tmp_path, capsys):
+    batch = tmp_path / "claims.jsonl"
+    batch.write_text('{"sub": "alice"}\n\n{"sub": "bob"}\n[1, 2]\nnot-json\n')
+
+    results = _run(["issue", "--config", str(cfg_file), "--batch", str(batch)], capsys)
+
+    assert [_decode(r["token"])["sub"] for r in results[:2]] == ["alice", "bob"]
+    assert "error" in results[2]
+    assert "error" in results[3]
+
+
+def test_issue_batch_applies_policy(cfg_file, tmp_path, capsys):
+    policy = tmp_path / "policy.yaml"
+    policy.write_text(
+        'users:\n  alice:\n    repos: ["demo/app"]\n    actions: ["pull"]\n'
+    )
+    batch = tmp_path / "claims.jsonl"
+    batch.write_text(
+        json.dumps({"sub": "alice", "scope": "repository:demo/app:pull,push"})
+        + "\n"
+        + json.dumps({"sub": "mallory"})
+        + "\n"
+    )
+
+    results = _run(
+        [
+            "issue",
+            "--config",
+            str(cfg_file),
+            "--policy",
+            str(policy),
+            "--batch",
+            str(batch),
+        ],
+        capsys,
+    )
+
+    assert _decode(results[0]["token"])["access"] == [
+        {"type": "repository", "name": "demo/app", "actions": ["pull"]}
+    ]
+    assert "not found" in results[1]["error"]
+
+
+def test_command_batch_accepts_objects_and_tuples(cfg_file, monkeypatch, capsys):
+    lines = [
+        {"user": "op", "target": "edge-01", "command": "uptime"},
+        ["op2", "edge-02", "reboot"],
+        [None, "edge-03", "ls"],
+        {"target": "edge-04"},
+    ]
+    monkeypatch.setattr(
+        "sys.stdin", io.StringIO("\n".join(json.dumps(x) for x in lines))
+    )
+
+    results = _run(["command", "--config", str(cfg_file), "--batch", "-"], capsys)
+
+    claims = [_decode(r["token"]) for r in results[:3]]
+    assert [c["aud"] for c in claims] == ["edge-01", "edge-02", "edge-03"]
+    assert [c["sub"] for c in claims] == ["op", "op2", "batch-test"]
+    assert [c["jti"] for c in claims] == [r["jti"] for r in results[:3]]
+    assert results[3] == {"error": "command is required"}
+
+
+def test_command_batch_parallel_keeps_input_order(cfg_file, tmp_path, capsys):
+    batch = tmp_path / "commands.jsonl"
+    batch.write_text(
+        "\n".join(json.dumps(["op", f"edge-{i}", "uptime"]) for i in range(50))
+    )
+
+    results = _run(
+        [
+            "command",
+            "--config",
+            str(cfg_file),
+            "--batch",
+            str(batch),
+            "--jobs",
+            "2",
+        ],
+        capsys,
+    )
+
+    assert [_decode(r["token"])["aud"] for r in results] == [
+        f"edge-{i}" for i in range(50)
+    ]
+
+
+def test_batch_loads_rs256_key_once(tmp_path, capsys):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_path = tmp_path / "key.pem"
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(f'algorithm: "RS256"\nrs256_private_key: "{key_path}"\n')
+    batch = tmp_path / "commands.jsonl"
+    batch.write_text("\n".join(json.dumps(["op", f"e{i}", "ls"]) for i in range(5)))
+
+    with patch.object(
+        token_module, "_load_private_key", wraps=token_module._load_private_key
+    ) as loader:
+        results = _run(["command", "--config", str(cfg), "--batch", str(batch)], capsys)
+
+    assert loader.call_count == 1
+    assert len(results) == 5
+    for r in results:
+        jwt.decode(
+            r["token"],
+            key.public_key(),
+            algorithms=["RS256"],
+            options={"verify_aud": False},
+        )
+
+
+def test_command_without_batch_still_requires_target(cfg_file):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(
+            ["command", "--config", str(cfg_file), "--command", "ls"]
+        )
+
+
+def test_command_with_several_targets_prints_one_line_each(cfg_file, capsys):
+    targets = [f"edge-{i:02d}" for i in range(12)]
+    argv = ["command", "--config", str(cfg_file), "--command", "uptime", "--no-daemon"]
+    for target in targets:
+        argv += ["--target", target]
+
+    with patch.object(
+        token_module, "_load_secret", wraps=token_module._load_secret
+    ) as loader:
+        results = _run(argv, capsys)
+
+    assert loader.call_count == 1
+    assert [r["target"] for r in results] == targets
+    claims = [_decode(r["token"]) for r in results]
+    assert [c["aud"] for c in claims] == targets
+    assert len({c["jti"] for c in claims}) == len(targets)
+    assert all(c["sub"] == "batch-test" for c in claims)
@@ -0,0 +1,90 @@
+"""Startup regression tests for the CLI.
+
+Each case runs in a fresh interpreter so ``sys.modules`` reflects exactly what
+the subcommand imported.
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Wall-clock budget for import + run, generous enough for slow CI runners but
+# well under what pulling in Flask/Werkzeug on top of PyJWT costs there.
+STARTUP_BUDGET_SECONDS = {"issue": 1.0, "command": 1.0, "verify": 1.0}
+
+HEAVY = ("flask", "werkzeug", "jwt", "cryptography", "yaml")
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from keypebble import cli
+if len(sys.argv) > 1:
+    args = cli.build_parser().parse_args(sys.argv[1:])
+    args.func(args)
+elapsed = time.perf_counter() - start
+loaded = sorted({m.split(".")[0] for m in sys.modules} & set(%r))
+print(json.dumps({"elapsed": elapsed, "loaded": loaded}), file=sys.stderr)
+""" % (HEAVY,)
+
+
+def _run(*argv):
+    proc = subprocess.run(
+        [sys.executable, "-c", SCRIPT, *argv],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+@pytest.fixture
+def cfg_file(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text('issuer: "test"\nhs256_secret: "change-me"\n')
+    return str(path)
+
+
+def test_importing_cli_loads_no_heavy_dependencies():
+    assert _run()["loaded"] == []
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["issue", "--claims", '{"sub": "alice"}'],
+        ["command", "--target", "edge-01", "--command", "uptime"],
+        ["verify"],
+    ],
+    ids=["issue", "command", "verify"],
+)
+def test_token_subcommands_never_load_flask(cfg_file, argv):
+    report = _run(argv[0], "--config", cfg_file, *argv[1:])
+    assert "flask" not in report["loaded"]
+    assert "werkzeug" not in report["loaded"]
+    assert report["elapsed"] < STARTUP_BUDGET_SECONDS[argv[0]]
+
+
+def test_delegating_to_daemon_skips_jwt_and_crypto(tmp_path):
+    from keypebble.config import load_config
+    from keypebble.daemon import MintDaemon, serve_daemon
+
+    sock = tmp_path / "kp.sock"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(
+        'issuer: "test"\nhs256_secret: "change-me"\n'
+        f'service:\n  daemon_socket: "{sock}"\n'
+    )
+    server = serve_daemon(
+        str(sock), MintDaemon(load_config(str(cfg)), str(cfg), None, None)
+    )
+    try:
+        report = _run("issue", "--config", str(cfg), "--claims", '{"sub": "alice"}')
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert "jwt" not in report["loaded"]
+    assert "cryptography" not in report["loaded"]
@@ -0,0 +1,79 @@
+import json
+import time
+
+import pytest
+
+from keypebble import cli
+from keypebble.core import issue_token
+
+CONFIG = {"issuer": "verify-test", "audience": "edge", "hs256_secret": "s3cret"}
+
+
+@pytest.fixture
+def cfg_file(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text('issuer: "verify-test"\naudience: "edge"\nhs256_secret: "s3cret"\n')
+    return path
+
+
+def _verify(argv, capsys):
+    args = cli.build_parser().parse_args(["verify", *argv])
+    args.func(args)
+    captured = capsys.readouterr()
+    return [json.loads(line) for line in captured.out.splitlines()], captured.err
+
+
+def test_verify_reports_claims_and_failures_in_order(cfg_file, tmp_path, capsys):
+    good = issue_token(CONFIG, {"sub": "alice"})
+    expired = issue_token(
+        CONFIG, {"sub": "bob", "exp": int(time.time()) - 60, "iat": 0, "nbf": 0}
+    )
+    forged = issue_token(dict(CONFIG, hs256_secret="other"), {"sub": "eve"})
+    tokens = tmp_path / "tokens.txt"
+    tokens.write_text("\n".join([good, expired, "garbage", forged, good]) + "\n")
+
+    results, summary = _verify(
+        ["--config", str(cfg_file), "--input", str(tokens)], capsys
+    )
+
+    assert [r["valid"] for r in results] == [True, False, False, False, True]
+    assert results[0]["claims"]["sub"] == "alice"
+    assert results[1]["reason"] == "ExpiredSignatureError"
+    assert results[2]["reason"] == "DecodeError"
+    assert results[3]["reason"] == "InvalidSignatureError"
+    assert "verified 5 tokens: 2 valid, 3 invalid" in summary
+    assert "ExpiredSignatureError: 1" in summary
+
+
+def test_verify_audience_override(cfg_file, tmp_path, capsys):
+    token = issue_token(CONFIG, {"aud": "edge-node-07"})
+    tokens = tmp_path / "tokens.txt"
+    tokens.write_text(token)
+
+    results, _ = _verify(["--config", str(cfg_file), "--input", str(tokens)], capsys)
+    assert results[0]["reason"] == "InvalidAudienceError"
+
+    results, _ = _verify(
+        [
+            "--config",
+            str(cfg_file),
+            "--input",
+            str(tokens),
+            "--audience",
+            "edge-node-07",
+        ],
+        capsys,
+    )
+    assert results[0]["valid"] is True
+
+
+def test_verify_parallel_from_stdin(cfg_file, monkeypatch, capsys):
+    import io
+
+    tokens = [issue_token(CONFIG, {"sub": f"user-{i}"}) for i in range(100)]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(tokens)))
+
+    results, summary = _verify(["--config", str(cfg_file), "--jobs", "2"], capsys)
+
+    assert [r["claims"]["sub"] for r in results] == [f"user-{i}" for i in range(100)]
+    assert "100 valid, 0 invalid" in summary
@@ -0,0 +1,142 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import jwt
+import pytest
+
+from keypebble.core.token import issue_token
+from keypebble.service.coalesce import SingleFlight
+
+
+def _slow(fn, delay=0.2):
+    """Wrap fn so concurrent callers overlap, counting real executions."""
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        time.sleep(delay)
+        return fn(*args, **kwargs)
+
+    wrapper.calls = calls
+    return wrapper
+
+
+# ---------------------------------------------------------------------------
+# SingleFlight units
+# ---------------------------------------------------------------------------
+
+
+def test_singleflight_shares_result_between_concurrent_callers():
+    flight = SingleFlight()
+    fn = _slow(lambda: object())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: flight.do("k", fn), range(8)))
+
+    assert len(fn.calls) == 1
+    assert all(r is results[0] for r in results)
+    assert len(flight) == 0
+
+
+def test_singleflight_distinct_keys_run_separately():
+    flight = SingleFlight()
+    fn = _slow(lambda: None, delay=0.05)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda k: flight.do(k, fn), ["a", "b", "c", "d"]))
+
+    assert len(fn.calls) == 4
+
+
+def test_singleflight_propagates_errors_to_waiters():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def boom():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("nope")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "k", boom)
+        started.wait()
+        follower = pool.submit(flight.do, "k", boom)
+        for fut in (leader, follower):
+            with pytest.raises(ValueError, match="nope"):
+                fut.result()
+
+
+def test_singleflight_does_not_cache_after_completion():
+    flight = SingleFlight()
+    fn = _slow(lambda: object(), delay=0)
+    assert flight.do("k", fn) is not flight.do("k", fn)
+    assert len(fn.calls) == 2
+
+
+# ---------------------------------------------------------------------------
+# /v2/token integration
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def coalescing_app(make_app):
+    return make_app(
+        {
+            "hs256_secret": "test-secret",
+            "issuer": "keypebble-test",
+            "audience": "keypebble-edge",
+            "coalesce_requests": True,
+        }
+    )
+
+
+def _burst(app, headers_list):
+    def fetch(headers):
+        return app.test_client().get(
+            "/v2/token?service=registry&scope=repository:foo/bar:pull",
+            headers=headers,
+        )
+
+    with ThreadPoolExecutor(max_workers=len(headers_list)) as pool:
+        return list(pool.map(fetch, headers_list))
+
+
+def test_identical_requests_share_one_signature(coalescing_app):
+    slow_issue = _slow(issue_token)
+    with patch("keypebble.service.app.issue_token", slow_issue):
+        responses = _burst(coalescing_app, [{"X-Authenticated-User": "ci"}] * 6)
+
+    assert len(slow_issue.calls) == 1
+    tokens = {r.get_json()["token"] for r in responses}
+    assert len(tokens) == 1
+    payload = jwt.decode(
+        tokens.pop(), "test-secret", algorithms=["HS256"], audience="registry"
+    )
+    assert payload["scope"] == "repository:foo/bar:pull"
+
+
+def test_response_shape_stays_per_request(coalescing_app):
+    slow_issue = _slow(issue_token)
+    headers = [
+        {"X-Authenticated-User": "ci"},
+        {"X-Authenticated-User": "ci", "X-Lean-Response": "true"},
+    ]
+    with patch("keypebble.service.app.issue_token", slow_issue):
+        full, lean = _burst(coalescing_app, headers)
+
+    assert len(slow_issue.calls) == 1
+    assert "claims" in full.get_json()
+    assert "claims" not in lean.get_json()
+    assert full.get_json()["token"] == lean.get_json()["token"]
+
+
+def test_different_users_are_not_coalesced(coalescing_app):
+    slow_issue = _slow(issue_token)
+    headers = [{"X-Authenticated-User": "alice"}, {"X-Authenticated-User": "bob"}]
+    with patch("keypebble.service.app.issue_token", slow_issue):
+        responses = _burst(coalescing_app, headers)
+
+    assert len(slow_issue.calls) == 2
+    assert len({r.get_json()["token"] for r in responses}) == 2
@@ -0,0 +1,193 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from keypebble import cli
+from keypebble.core import (
+    MemoryJtiStore,
+    RevocationList,
+    decode_token,
+    issue_command_batch,
+    verify_batched_command,
+    verify_command_token,
+)
+from keypebble.core import token as token_module
+from keypebble.core.command_batch import (
+    inclusion_proof,
+    leaf_hash,
+    merkle_levels,
+    root_from_proof,
+)
+from keypebble.core.token import BATCH_ROOT_AUDIENCE
+
+CONFIG = {
+    "hs256_secret": "batch-secret-0123456789abcdef0123456789ab",
+    "issuer": "keypebble-test",
+}
+
+
+def _batch(count=5, now=None, ttl=300):
+    commands = [("op", f"edge-{i}", f"run {i}") for i in range(count)]
+    return issue_command_batch(CONFIG, commands, now or datetime.now(timezone.utc), ttl)
+
+
+@pytest.mark.parametrize("count", [1, 2, 3, 7, 8, 17])
+def test_every_leaf_proves_the_root(count):
+    leaves = [leaf_hash(str(i).encode()) for i in range(count)]
+    levels = merkle_levels(leaves)
+    for index, leaf in enumerate(leaves):
+        assert root_from_proof(leaf, inclusion_proof(levels, index)) == (
+            levels[-1][0],
+            count,
+        )
+
+
+def test_batch_signs_once_and_each_credential_verifies():
+    with patch.object(
+        token_module.jwt, "encode", wraps=token_module.jwt.encode
+    ) as encode:
+        batch = _batch(count=100)
+    assert encode.call_count == 1
+
+    seen = MemoryJtiStore()
+    for i, command in enumerate(batch["commands"]):
+        assert command["credential"].startswith(batch["root"] + "~")
+        claims = verify_batched_command(
+            CONFIG, command["credential"], seen, target=f"edge-{i}"
+        )
+        assert (claims["aud"], claims["command"]) == (f"edge-{i}", f"run {i}")
+        assert claims["jti"] == command["jti"]
+
+
+def test_replay_wrong_target_and_tampering_are_rejected():
+    credential = _batch()["commands"][1]["credential"]
+    seen = MemoryJtiStore()
+    verify_batched_command(CONFIG, credential, seen, target="edge-1")
+    with pytest.raises(ValueError, match="already been used"):
+        verify_batched_command(CONFIG, credential, seen, target="edge-1")
+    with pytest.raises(ValueError, match="Audience"):
+        verify_batched_command(CONFIG, credential, MemoryJtiStore(), target="edge-2")
+
+    root, claims, proof = credential.split("~")
+    other = _batch()["commands"][1]["credential"].split("~")
+    for forged in (
+        "~".join((root, other[1], proof)),  # claims from another batch
+        "~".join((other[0], claims, proof)),  # someone else's root
+        "~".join((root, claims, proof[:-4])),  # truncated proof
+        "~".join((root, claims)),
+    ):
+        with pytest.raises(ValueError):
+            verify_batched_command(CONFIG, forged, MemoryJtiStore(), target="edge-1")
+
+
+def test_batch_root_is_not_a_plain_token():
+    root = _batch()["root"]
+    with pytest.raises(ValueError, match="Audience"):
+        verify_command_token(CONFIG, root, MemoryJtiStore(), target="edge-0")
+    with pytest.raises(ValueError, match="batch root"):
+        decode_token(CONFIG, root, verify_audience=False)
+    # Not even under the root's own audience.
+    with pytest.raises(ValueError, match="batch root"):
+        verify_command_token(CONFIG, root, MemoryJtiStore(), target=BATCH_ROOT_AUDIENCE)
+
+
+def test_expired_and_revoked_commands_are_rejected():
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    expired = _batch(now=past, ttl=60)["commands"][0]["credential"]
+    with pytest.raises(ValueError, match="expired"):
+        verify_batched_command(CONFIG, expired, None, target="edge-0")
+
+    batch = _batch()
+    revocations = RevocationList()
+    revocations.revoke(batch["commands"][0]["jti"], 2**31)
+    with pytest.raises(ValueError, match="revoked"):
+        verify_batched_command(
+            CONFIG,
+            batch["commands"][0]["credential"],
+            None,
+            "edge-0",
+            None,
+            revocations,
+        )
+    # Revoking the batch jti revokes every command in it.
+    revocations.revoke(batch["jti"], 2**31)
+    with pytest.raises(ValueError, match="revoked"):
+        verify_batched_command(
+            CONFIG,
+            batch["commands"][1]["credential"],
+            None,
+            "edge-1",
+            None,
+            revocations,
+        )
+
+
+def test_endpoint_merkle_mode(make_app):
+    client = make_app(dict(CONFIG)).test_client()
+    resp = client.post(
+        "/command/token",
+        json={"targets": ["a", "b", "c"], "command": "ls", "mode": "merkle"},
+    )
+
+    data = json.loads(resp.get_data())
+    assert [t["target"] for t in data["tokens"]] == ["a", "b", "c"]
+    assert len({t["credential"].split("~")[0] for t in data["tokens"]}) == 1
+    claims = verify_batched_command(
+        CONFIG, data["tokens"][2]["credential"], MemoryJtiStore(), target="c"
+    )
+    assert claims["sub"] == "anonymous"
+
+    bad = client.post(
+        "/command/token", json={"targets": ["a"], "command": "ls", "mode": "x"}
+    )
+    assert bad.status_code == 400
+
+
+def test_endpoint_merkle_mode_ndjson_carries_batch_jti(make_app):
+    client = make_app(dict(CONFIG)).test_client()
+    resp = client.post(
+        "/command/token",
+        json={"targets": ["a", "b"], "command": "ls", "mode": "merkle"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    lines = [json.loads(line) for line in resp.get_data().splitlines()]
+    assert [line["target"] for line in lines] == ["a", "b"]
+    root_jti = decode_token(
+        CONFIG, lines[0]["credential"].split("~")[0], batch_root=True
+    )["jti"]
+    for line in lines:
+        assert line["batch_jti"] == root_jti
+        assert line["expires_in"] > 0 and line["issued_at"]
+
+
+def test_cli_merkle_issue_and_verify(tmp_path, capsys):
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(
+        f'issuer: "{CONFIG["issuer"]}"\nhs256_secret: "{CONFIG["hs256_secret"]}"\n'
+    )
+    argv = ["command", "--config", str(cfg), "--command", "ls", "--merkle"]
+    args = cli.build_parser().parse_args(argv + ["--target", "a", "--target", "b"])
+    args.func(args)
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["target"] for r in records] == ["a", "b"]
+    assert records[0]["batch_jti"] == records[1]["batch_jti"]
+
+    batch = tmp_path / "commands.jsonl"
+    batch.write_text('["op", "c", "ls"]\n{"target": "d"}\n')
+    args = cli.build_parser().parse_args(argv + ["--batch", str(batch)])
+    args.func(args)
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert lines[0]["target"] == "c"
+    assert lines[1] == {"error": "command is required"}
+
+    credentials = tmp_path / "credentials.txt"
+    credentials.write_text(records[0]["credential"] + "\n")
+    args = cli.build_parser().parse_args(
+        ["verify", "--config", str(cfg), "--input", str(credentials), "--audience", "a"]
+    )
+    args.func(args)
+    (result,) = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    assert result["valid"] and result["claims"]["aud"] == "a"
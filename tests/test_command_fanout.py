@@ -0,0 +1,97 @@
+import json
+
+import jwt
+import pytest
+
+from keypebble.service.fanout import FanOut
+
+SECRET = "fanout-secret-0123456789abcdef0123456789ab"
+CONFIG = {"hs256_secret": SECRET, "issuer": "keypebble-test"}
+
+
+def _decode(token):
+    return jwt.decode(
+        token, SECRET, algorithms=["HS256"], options={"verify_aud": False}
+    )
+
+
+@pytest.fixture
+def client(make_app):
+    config = dict(CONFIG, command_fanout={"workers": 4, "chunk_size": 8})
+    return make_app(config).test_client()
+
+
+def test_one_token_per_target_in_order(client):
+    targets = [f"edge-{i:03d}" for i in range(100)]
+    resp = client.post(
+        "/command/token",
+        json={"targets": targets, "command": "uptime", "user": "op"},
+    )
+
+    assert resp.status_code == 200
+    data = json.loads(resp.get_data())
+    assert data["expires_in"] == 3600
+    assert [t["target"] for t in data["tokens"]] == targets
+
+    claims = [_decode(t["token"]) for t in data["tokens"]]
+    assert [c["aud"] for c in claims] == targets
+    assert [c["jti"] for c in claims] == [t["jti"] for t in data["tokens"]]
+    assert len({c["jti"] for c in claims}) == 100
+    assert {(c["sub"], c["command"], c["iat"]) for c in claims} == {
+        ("op", "uptime", claims[0]["iat"])
+    }
+
+
+def test_ndjson_streams_one_object_per_line(client):
+    resp = client.post(
+        "/command/token",
+        json={"targets": ["a", "b", "c"], "command": "ls"},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.get_data().splitlines()]
+    assert [line["target"] for line in lines] == ["a", "b", "c"]
+    assert _decode(lines[1]["token"])["aud"] == "b"
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ({"targets": [], "command": "ls"}, "targets must be a non-empty list"),
+        ({"targets": ["a", ""], "command": "ls"}, "targets must be a non-empty list"),
+        ({"targets": "a", "command": "ls"}, "targets must be a non-empty list"),
+        ({"targets": ["a"]}, "command is required"),
+        ({"targets": ["a"], "target": "b", "command": "ls"}, "not both"),
+        ({"targets": ["a"] * 11, "command": "ls"}, "at most 10 targets"),
+    ],
+)
+def test_invalid_fanout_requests_are_rejected(make_app, body, error):
+    client = make_app(dict(CONFIG, command_fanout={"max_targets": 10})).test_client()
+    resp = client.post("/command/token", json=body)
+    assert resp.status_code == 400
+    assert error in resp.get_json()["error"]
+
+
+def test_per_target_errors_do_not_abort_the_batch(make_app):
+    config = dict(CONFIG, token_size={"max_bytes": 300})
+    client = make_app(config).test_client()
+    resp = client.post(
+        "/command/token", json={"targets": ["short", "x" * 300], "command": "ls"}
+    )
+
+    tokens = json.loads(resp.get_data())["tokens"]
+    assert "token" in tokens[0]
+    assert tokens[1]["target"] == "x" * 300
+    assert "budget" in tokens[1]["error"]
+
+
+def test_fanout_map_keeps_order_across_chunks():
+    fanout = FanOut({"workers": 3, "chunk_size": 2})
+    try:
+        assert list(fanout.map(lambda x: x * x, range(50))) == [
+            x * x for x in range(50)
+        ]
+    finally:
+        fanout.close()
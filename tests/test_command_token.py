@@ -260,7 +260,7 @@ def test_cli_command_invokes_build_and_issue(tmp_path, capsys):
     cfg_file = tmp_path / "config.yaml"
     cfg_file.write_text("issuer: test-issuer\nhs256_secret: s3cret")
 
-    with patch("keypebble.cli.issue_token", return_value="signed-token") as mock_issue:
+    with patch("keypebble.core.issue_token", return_value="signed-token") as mock_issue:
         args = cli.build_parser().parse_args(
             [
                 "command",
@@ -291,7 +291,7 @@ def test_cli_command_user_defaults_to_issuer(tmp_path):
     cfg_file = tmp_path / "config.yaml"
     cfg_file.write_text("issuer: my-control-plane\nhs256_secret: s3cret")
 
-    with patch("keypebble.cli.issue_token", return_value="tok") as mock_issue:
+    with patch("keypebble.core.issue_token", return_value="tok") as mock_issue:
         args = cli.build_parser().parse_args(
             [
                 "command",
@@ -0,0 +1,212 @@
+import json
+import os
+import socket
+import stat
+
+import jwt
+import pytest
+
+from keypebble import cli
+from keypebble.core.policy import Policy
+from keypebble.daemon import (
+    MintDaemon,
+    recv_frame,
+    request,
+    send_frame,
+    serve_daemon,
+)
+
+SECRET = "daemon-secret-0123456789abcdef0123456789"
+
+
+@pytest.fixture
+def files(tmp_path):
+    sock = tmp_path / "kp.sock"
+    config = tmp_path / "config.yaml"
+    config.write_text(
+        f'issuer: "daemon-test"\nhs256_secret: "{SECRET}"\n'
+        f'service:\n  daemon_socket: "{sock}"\n'
+    )
+    policy = tmp_path / "policy.yaml"
+    policy.write_text(
+        'users:\n  alice:\n    repos: ["demo/app"]\n    actions: ["pull"]\n'
+    )
+    return config, policy, sock
+
+
+@pytest.fixture
+def daemon(files):
+    config_path, policy_path, sock = files
+    from keypebble.config import load_config
+
+    d = MintDaemon(
+        load_config(str(config_path)),
+        str(config_path),
+        Policy.from_file(str(policy_path)),
+        str(policy_path),
+    )
+    server = serve_daemon(str(sock), d)
+    yield d
+    server.shutdown()
+    server.server_close()
+
+
+def _decode(token):
+    return jwt.decode(
+        token, SECRET, algorithms=["HS256"], options={"verify_aud": False}
+    )
+
+
+def _cli(argv, capsys):
+    args = cli.build_parser().parse_args(argv)
+    args.func(args)
+    return capsys.readouterr().out.strip()
+
+
+def test_frames_round_trip():
+    a, b = socket.socketpair()
+    with a, b:
+        send_frame(a, {"op": "issue", "item": {"sub": "ü"}})
+        send_frame(a, {"second": True})
+        a.shutdown(socket.SHUT_WR)
+        assert recv_frame(b) == {"op": "issue", "item": {"sub": "ü"}}
+        assert recv_frame(b) == {"second": True}
+        assert recv_frame(b) is None
+
+
+def test_request_without_daemon_returns_none(tmp_path):
+    assert request(str(tmp_path / "missing.sock"), {"op": "issue"}) is None
+
+
+def test_socket_is_owner_only(files, daemon):
+    mode = stat.S_IMODE(os.stat(files[2]).st_mode)
+    assert mode == 0o600
+
+
+def test_daemon_mints_issue_and_command(files, daemon):
+    config, _, sock = files
+    issued = request(
+        str(sock), {"op": "issue", "config": str(config), "item": {"sub": "bob"}}
+    )
+    assert _decode(issued["token"])["sub"] == "bob"
+
+    commanded = request(
+        str(sock),
+        {
+            "op": "command",
+            "config": str(config),
+            "item": {"user": "op", "target": "edge-01", "command": "uptime"},
+        },
+    )
+    claims = _decode(commanded["token"])
+    assert claims["aud"] == "edge-01"
+    assert claims["jti"] == commanded["jti"]
+
+
+def test_daemon_refuses_other_config_and_policy(files, daemon, tmp_path):
+    config, _, sock = files
+    other = tmp_path / "other.yaml"
+    other.write_text(config.read_text())
+
+    assert request(str(sock), {"op": "issue", "config": str(other)}) is None
+    assert (
+        request(
+            str(sock),
+            {"op": "issue", "config": str(config), "policy": str(other), "item": {}},
+        )
+        is None
+    )
+
+
+def test_cli_issue_delegates_with_policy(files, daemon, capsys, monkeypatch):
+    config, policy, _ = files
+    calls = []
+    monkeypatch.setattr(
+        daemon, "handle", lambda req, h=daemon.handle: calls.append(req) or h(req)
+    )
+
+    token = _cli(
+        ["issue", "--config", str(config), "--policy", str(policy)]
+        + [
+            "--claims",
+            json.dumps({"sub": "alice", "scope": "repository:demo/app:pull,push"}),
+        ],
+        capsys,
+    )
+
+    assert len(calls) == 1
+    assert _decode(token)["access"] == [
+        {"type": "repository", "name": "demo/app", "actions": ["pull"]}
+    ]
+
+
+def test_cli_command_delegates_and_no_daemon_skips(files, daemon, capsys, monkeypatch):
+    config, _, _ = files
+    calls = []
+    monkeypatch.setattr(
+        daemon, "handle", lambda req, h=daemon.handle: calls.append(req) or h(req)
+    )
+    argv = [
+        "command",
+        "--config",
+        str(config),
+        "--target",
+        "edge-02",
+        "--command",
+        "ls",
+    ]
+
+    token = _cli(argv, capsys)
+    assert _decode(token)["sub"] == "daemon-test"
+    assert len(calls) == 1
+
+    token = _cli(argv + ["--no-daemon"], capsys)
+    assert _decode(token)["aud"] == "edge-02"
+    assert len(calls) == 1
+
+
+def test_cli_falls_back_when_daemon_is_down(files, capsys):
+    config, _, _ = files
+    token = _cli(["issue", "--config", str(config), "--claims", '{"sub": "x"}'], capsys)
+    assert _decode(token)["sub"] == "x"
+
+
+def test_serve_daemon_replaces_stale_socket_but_not_live_one(files, daemon, tmp_path):
+    with pytest.raises(RuntimeError):
+        serve_daemon(str(files[2]), daemon)
+
+    stale = tmp_path / "stale.sock"
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(str(stale))
+    s.close()
+    server = serve_daemon(str(stale), daemon)
+    try:
+        assert request(str(stale), {"op": "issue", "config": str(files[0]), "item": {}})
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_daemon_reload_swaps_state(files, daemon):
+    config, _, sock = files
+    daemon.reload({"issuer": "reloaded", "hs256_secret": SECRET}, None)
+
+    issued = request(
+        str(sock), {"op": "issue", "config": str(config), "item": {"sub": "bob"}}
+    )
+    assert _decode(issued["token"])["iss"] == "reloaded"
+
+
+def test_daemon_audits_minted_tokens(files, daemon, tmp_path):
+    from keypebble.service.audit import AuditLog
+
+    config, _, sock = files
+    daemon.audit = AuditLog({"dir": str(tmp_path / "audit")})
+    request(str(sock), {"op": "issue", "config": str(config), "item": {"sub": "bob"}})
+    request(str(sock), {"op": "issue", "config": "/elsewhere.yaml", "item": {}})
+    daemon.audit.close()
+
+    (segment,) = (tmp_path / "audit").glob("audit-*.jsonl")
+    (line,) = [json.loads(line) for line in segment.read_text().splitlines()]
+    assert line["endpoint"] == "daemon_issue"
+    assert line["claims"]["sub"] == "bob"
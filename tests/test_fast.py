@@ -0,0 +1,120 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from keypebble.service.app import create_app
+from keypebble.service.fast import install_fast_path
+
+CONFIG = {
+    "hs256_secret": "test-secret",
+    "issuer": "keypebble-test",
+    "audience": "keypebble-edge",
+}
+
+
+@pytest.fixture
+def fast_app():
+    app = install_fast_path(create_app(dict(CONFIG)))
+    # Spy on the wrapped Flask wsgi_app to see which requests fall through.
+    app.wsgi_app.wsgi_app = MagicMock(side_effect=app.wsgi_app.wsgi_app)
+    return app
+
+
+def test_hot_routes_bypass_flask_dispatch(fast_app):
+    client = fast_app.test_client()
+    assert (
+        client.get("/v2/token", headers={"X-Authenticated-User": "a"}).status_code
+        == 200
+    )
+    assert (
+        client.post("/command/token", json={"target": "t", "command": "c"}).status_code
+        == 200
+    )
+    fast_app.wsgi_app.wsgi_app.assert_not_called()
+
+
+def test_other_routes_fall_through_to_flask(fast_app):
+    client = fast_app.test_client()
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/command/token").status_code == 405
+    assert fast_app.wsgi_app.wsgi_app.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "method, path, kwargs",
+    [
+        ("GET", "/v2/token", {}),
+        ("POST", "/command/token", {"data": "nope", "content_type": "text/plain"}),
+        (
+            "POST",
+            "/command/token",
+            {"data": "{bad", "content_type": "application/json"},
+        ),
+        ("POST", "/command/token", {"json": {"target": "t"}}),
+    ],
+)
+def test_error_responses_match_flask_byte_for_byte(method, path, kwargs):
+    flask_resp = (
+        create_app(dict(CONFIG)).test_client().open(path, method=method, **kwargs)
+    )
+    fast_resp = (
+        install_fast_path(create_app(dict(CONFIG)))
+        .test_client()
+        .open(path, method=method, **kwargs)
+    )
+    assert fast_resp.status == flask_resp.status
+    assert fast_resp.data == flask_resp.data
+    assert fast_resp.mimetype == flask_resp.mimetype
+    assert fast_resp.headers.get("WWW-Authenticate") == flask_resp.headers.get(
+        "WWW-Authenticate"
+    )
+
+
+def test_full_v2_body_serializes_like_jsonify(fast_app):
+    resp = fast_app.test_client().get(
+        "/v2/token", headers={"X-Authenticated-User": "a"}
+    )
+    body = resp.get_json()
+    # nbf is a datetime rendered as an HTTP date, exactly as Flask's provider does
+    assert body["nbf"].endswith("GMT")
+    assert resp.data.endswith(b"\n")
+
+
+def _call(app, environ):
+    captured = {}
+
+    def start_response(status, headers):
+        captured["status"] = status
+
+    body = b"".join(app.wsgi_app(environ, start_response))
+    return captured["status"], json.loads(body)
+
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_malformed_content_length_is_a_bad_request(fast_app, length):
+    environ = EnvironBuilder(
+        "/command/token", method="POST", data=b"{}", content_type="application/json"
+    ).get_environ()
+    environ["CONTENT_LENGTH"] = length
+
+    status, body = _call(fast_app, environ)
+    assert status == "400 BAD REQUEST"
+    assert body == {"error": "invalid Content-Length"}
+
+
+def test_terminated_input_is_capped_at_max_body_bytes():
+    app = install_fast_path(create_app(dict(CONFIG, limits={"max_body_bytes": 32})))
+    environ = EnvironBuilder(
+        "/command/token",
+        method="POST",
+        data=json.dumps({"target": "x" * 64}).encode(),
+        content_type="application/json",
+    ).get_environ()
+    del environ["CONTENT_LENGTH"]
+    environ["wsgi.input_terminated"] = True
+
+    status, body = _call(app, environ)
+    assert status == "413 REQUEST ENTITY TOO LARGE"
+    assert body == {"error": "request body too large"}
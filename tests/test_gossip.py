@@ -0,0 +1,232 @@
+import json
+import logging
+import multiprocessing
+import socket
+import time
+
+import pytest
+
+from keypebble.core import RevocationList, issue_token
+from keypebble.daemon import MAX_FRAME_BYTES
+from keypebble.service.gossip import GossipNode, differing_buckets, start_gossip
+from keypebble.service.metrics import Metrics
+
+SECRET = "cluster-secret"
+CONFIG = {
+    "hs256_secret": "gossip-secret-0123456789abcdef0123456789",
+    "issuer": "keypebble-test",
+    "audience": "registry",
+}
+
+
+def _node(revocations=None, **conf):
+    conf = {"secret": SECRET, "bind": "127.0.0.1:0", "interval_ms": 20, **conf}
+    return GossipNode(conf, revocations or RevocationList())
+
+
+def _mesh(nodes):
+    for node in nodes:
+        node.peers = {("127.0.0.1", other.port) for other in nodes if other is not node}
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def nodes():
+    started = []
+
+    def factory(count, **conf):
+        group = [_node(**conf) for _ in range(count)]
+        _mesh(group)
+        started.extend(n.start() for n in group)
+        return group
+
+    yield factory
+    for node in started:
+        node.stop()
+
+
+def test_revocation_spreads_to_every_node(nodes):
+    group = nodes(4, fanout=1)
+    exp = int(time.time()) + 60
+
+    group[0].revocations.revoke("j1", exp)
+    group[0].revoked("j1", exp)
+
+    assert _wait_for(lambda: all(n.revocations.is_revoked("j1") for n in group))
+    assert all(n.bucket_digests() == group[0].bucket_digests() for n in group)
+
+
+def test_messages_with_the_wrong_secret_are_ignored(nodes):
+    (node,) = nodes(1)
+    intruder = _node(secret="wrong")
+    intruder.peers = {("127.0.0.1", node.port)}
+    intruder.revoked("forged", int(time.time()) + 60)
+    intruder.gossip_round()
+    intruder.stop()
+
+    time.sleep(0.1)
+    assert not node.revocations.is_revoked("forged")
+
+
+def test_anti_entropy_reconciles_both_ways(nodes):
+    exp = int(time.time()) + 60
+    a, b = nodes(2, interval_ms=60000)
+    a.revocations.revoke("from-a", exp)
+    # Known but no longer being gossiped, as after a restart.
+    a.known["from-a"] = exp
+    b.revocations.revoke("from-b", exp)
+    b.known["from-b"] = exp
+
+    assert b.anti_entropy(("127.0.0.1", a.port))
+    assert b.revocations.is_revoked("from-a")
+    assert _wait_for(lambda: a.revocations.is_revoked("from-b"))
+    assert a.bucket_digests() == b.bucket_digests()
+
+
+def test_anti_entropy_syncs_state_larger_than_a_frame(nodes):
+    exp = int(time.time()) + 600
+    a, b = nodes(2, interval_ms=60000)
+    jtis = [f"{i:032x}" for i in range(25000)]
+    for jti in jtis:
+        a.known[jti] = exp
+    state = len(json.dumps([[j, exp] for j in jtis]))
+    assert state > MAX_FRAME_BYTES
+
+    b.metrics = Metrics()
+    assert b.anti_entropy(("127.0.0.1", a.port))
+    assert len(b.known) == len(jtis)
+    assert b.revocations.is_revoked(jtis[-1])
+    assert a.bucket_digests() == b.bucket_digests()
+
+    # Once in sync, only the bucket holding a new revocation differs.
+    a.known["late"] = exp
+    assert len(differing_buckets(a.bucket_digests(), b.bucket_digests())) == 1
+    assert b.anti_entropy(("127.0.0.1", a.port))
+    assert b.revocations.is_revoked("late")
+    assert b.anti_entropy(("127.0.0.1", a.port))
+    metrics = b.metrics.render()[0].decode()
+    assert 'keypebble_cluster_syncs_total{result="repaired"} 2.0' in metrics
+    assert 'keypebble_cluster_syncs_total{result="in_sync"} 1.0' in metrics
+
+
+def test_failed_anti_entropy_is_logged_and_counted(caplog):
+    node = _node()
+    node.metrics = Metrics()
+    closed = _free_port()
+    with caplog.at_level(logging.WARNING, logger="keypebble.service.gossip"):
+        assert not node.anti_entropy(("127.0.0.1", closed))
+    node.stop()
+
+    assert "anti-entropy with 127.0.0.1:%d failed" % closed in caplog.text
+    metrics = node.metrics.render()[0].decode()
+    assert 'keypebble_cluster_syncs_total{result="error"} 1.0' in metrics
+
+
+def test_datagrams_stay_within_budget():
+    node = _node(max_datagram_bytes=512)
+    node.peers = {("127.0.0.1", 9)}
+    exp = int(time.time()) + 60
+    for i in range(200):
+        node.revoked(f"jti-{i:04d}", exp)
+
+    sent = set()
+    while node.pending:
+        data = node._delta()
+        assert len(data) <= 512
+        sent.update(jti for jti, _ in json.loads(data)["body"]["rev"])
+    node.stop()
+    assert len(sent) == 200
+
+
+def test_policy_divergence_is_reported(nodes, tmp_path):
+    a, b = nodes(2)
+    (tmp_path / "a.yaml").write_text("users: {}\n")
+    (tmp_path / "b.yaml").write_text("users: {alice: {}}\n")
+    a.policy_path, b.policy_path = str(tmp_path / "a.yaml"), str(tmp_path / "b.yaml")
+    a.on_reload(None, None)
+    b.on_reload(None, None)
+
+    assert _wait_for(lambda: a.status()["policy_divergent"] == [b.node_id])
+
+    b.policy_path = a.policy_path
+    b.on_reload(None, None)
+    assert _wait_for(lambda: a.status()["policy_divergent"] == [])
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _member(port, peers, result):
+    node = _node(bind=f"127.0.0.1:{port}", peers=peers, anti_entropy_seconds=0.5)
+    node.start()
+    result.put(_wait_for(lambda: node.revocations.is_revoked("j1"), timeout=10))
+    node.stop()
+
+
+def test_processes_on_loopback_converge():
+    ports = [_free_port() for _ in range(4)]
+    peers = [f"127.0.0.1:{p}" for p in ports]
+    ctx = multiprocessing.get_context("fork")
+    result = ctx.Queue()
+    members = [
+        ctx.Process(
+            target=_member,
+            args=(p, [x for x in peers if not x.endswith(f":{p}")], result),
+        )
+        for p in ports[1:]
+    ]
+    for m in members:
+        m.start()
+
+    origin = _node(bind=f"127.0.0.1:{ports[0]}", peers=peers[1:]).start()
+    try:
+        time.sleep(0.2)
+        exp = int(time.time()) + 60
+        origin.revocations.revoke("j1", exp)
+        origin.revoked("j1", exp)
+        outcomes = [result.get(timeout=15) for _ in members]
+    finally:
+        origin.stop()
+        for m in members:
+            m.join()
+    assert outcomes == [True, True, True]
+
+
+def test_revoke_endpoint_gossips_and_cluster_status(make_app):
+    app = make_app(dict(CONFIG))
+    client = app.test_client()
+    assert client.get("/cluster").status_code == 404
+
+    peer = _node().start()
+    node = start_gossip(
+        app,
+        {
+            "secret": SECRET,
+            "bind": "127.0.0.1:0",
+            "interval_ms": 20,
+            "peers": [f"127.0.0.1:{peer.port}"],
+        },
+    )
+    try:
+        token = issue_token(CONFIG, {"sub": "alice", "jti": "j1"})
+        assert client.post("/revoke", json={"token": token}).status_code == 200
+        assert _wait_for(lambda: peer.revocations.is_revoked("j1"))
+
+        status = client.get("/cluster").get_json()
+        assert status["node"] == node.node_id
+        assert status["revocations"] == 1
+        assert status["peers"] == [f"127.0.0.1:{peer.port}"]
+    finally:
+        node.stop()
+        peer.stop()
@@ -0,0 +1,135 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from keypebble.core import issue_token
+from keypebble.service import introspect as introspect_module
+from keypebble.service.introspect import VerificationCache
+
+CONFIG = {
+    "hs256_secret": "introspect-secret-0123456789abcdef01234",
+    "issuer": "keypebble-test",
+    "audience": "registry",
+}
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(CONFIG).test_client()
+
+
+def _token(**claims):
+    return issue_token(CONFIG, claims)
+
+
+def test_form_encoded_request_returns_claims(client):
+    token = _token(sub="alice", jti="j1")
+    resp = client.post("/introspect", data={"token": token})
+
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert body["active"] is True
+    assert body["sub"] == "alice"
+    assert body["aud"] == "registry"
+
+
+def test_json_request_and_audience_check(client):
+    token = issue_token(dict(CONFIG, audience="edge-01"), {"jti": "j2"})
+
+    assert client.post("/introspect", json={"token": token}).get_json()["active"]
+    matched = client.post("/introspect", json={"token": token, "audience": "edge-01"})
+    other = client.post("/introspect", json={"token": token, "audience": "edge-02"})
+    assert matched.get_json()["active"] is True
+    assert other.get_json() == {"active": False}
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "not-a-jwt",
+        issue_token(dict(CONFIG, hs256_secret="x" * 40), {"sub": "eve"}),
+        issue_token(dict(CONFIG, default_ttl_seconds=-10), {"sub": "old"}),
+    ],
+    ids=["garbage", "forged", "expired"],
+)
+def test_invalid_tokens_are_inactive(client, token):
+    assert client.post("/introspect", data={"token": token}).get_json() == {
+        "active": False
+    }
+
+
+def test_missing_token_is_invalid_request(client):
+    resp = client.post("/introspect", data={})
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "invalid_request"}
+
+
+def test_repeat_introspection_skips_signature_check(client):
+    token = _token(sub="alice")
+    with patch.object(
+        introspect_module, "decode_token", wraps=introspect_module.decode_token
+    ) as decode:
+        for _ in range(5):
+            assert client.post("/introspect", data={"token": token}).get_json()[
+                "active"
+            ]
+    assert decode.call_count == 1
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'keypebble_introspection_cache_total{result="hit"} 4.0' in metrics
+    assert 'keypebble_introspection_cache_total{result="miss"} 1.0' in metrics
+
+
+def test_revocation_applies_to_cached_tokens(client):
+    token = _token(jti="cmd-9")
+    assert client.post("/introspect", data={"token": token}).get_json()["active"]
+
+    client.post("/revoke", json={"token": token})
+
+    assert client.post("/introspect", data={"token": token}).get_json() == {
+        "active": False
+    }
+
+
+def test_batch_preserves_order_and_limits_size(make_app):
+    app = make_app(dict(CONFIG, introspection={"max_batch": 3}))
+    client = app.test_client()
+    good = _token(sub="a")
+
+    resp = client.post("/introspect/batch", json={"tokens": [good, "bad", good]})
+    assert [r["active"] for r in resp.get_json()["results"]] == [True, False, True]
+
+    too_many = client.post("/introspect/batch", json={"tokens": [good] * 4})
+    assert too_many.status_code == 400
+    assert client.post("/introspect/batch", json={"tokens": "x"}).status_code == 400
+
+
+def test_cache_is_rebuilt_when_config_changes(make_app):
+    app = make_app(CONFIG)
+    client = app.test_client()
+    token = _token(sub="a")
+    assert client.post("/introspect", data={"token": token}).get_json()["active"]
+
+    with app.state_lock:  # what a reload with a rotated secret does
+        app.config = app.make_config()
+        app.config.update(CONFIG, hs256_secret="rotated-" + "y" * 40)
+
+    assert client.post("/introspect", data={"token": token}).get_json() == {
+        "active": False
+    }
+
+
+def test_verification_cache_expires_and_evicts():
+    cache = VerificationCache(max_entries=2)
+    now = time.time()
+    cache.put(b"a", {"exp": int(now) + 100})
+    cache.put(b"b", {"exp": int(now) + 1})
+    cache.put(b"no-exp", {"sub": "x"})
+    assert len(cache) == 2
+
+    assert cache.get(b"b", now + 5) is None
+    cache.put(b"c", {"exp": int(now) + 100})
+    cache.put(b"d", {"exp": int(now) + 100})
+    assert cache.get(b"a", now) is None  # least recently used
+    assert cache.get(b"d", now) is not None
@@ -0,0 +1,141 @@
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import pytest
+
+from keypebble import cli
+from keypebble.core import (
+    MemoryJtiStore,
+    SQLiteJtiStore,
+    build_command_claims,
+    issue_token,
+    verify_command_token,
+)
+from keypebble.core.jti_store import TimingWheel
+
+CONFIG = {
+    "hs256_secret": "jti-store-secret-0123456789abcdef0123456",
+    "issuer": "keypebble-test",
+}
+
+
+def _command_token(target="edge-01", ttl=60):
+    cfg = dict(CONFIG)
+    claims = build_command_claims(
+        user="op",
+        command="reboot",
+        target=target,
+        config=cfg,
+        now=datetime.now(timezone.utc),
+        ttl=ttl,
+    )
+    return issue_token(cfg, claims)
+
+
+def test_timing_wheel_matches_brute_force():
+    rng = random.Random(7)
+    now = 1_000_000
+    wheel = TimingWheel(now)
+    pending = {}
+    for step in range(2000):
+        delay = rng.choice([rng.randint(-2, 70), rng.randint(0, 5000), 10**8])
+        wheel.add(step, now + delay)
+        pending[step] = max(now + delay, now + 1)
+        now += rng.choice([1, 3, 64, 700, 300_000])
+        expired = set(wheel.advance(now))
+        assert expired == {k for k, d in pending.items() if d <= now}
+        for k in expired:
+            del pending[k]
+
+
+def test_memory_store_rejects_replay_until_exp():
+    store = MemoryJtiStore(now=1000)
+    assert store.first_use("a", exp=1100, now=1000)
+    assert not store.first_use("a", exp=1100, now=1099)
+    assert store.first_use("b", exp=1200, now=1100)
+    # "a" expired at 1100 and was dropped; memory tracks live tokens only.
+    assert len(store) == 1
+
+
+def test_memory_store_jumps_idle_gaps():
+    store = MemoryJtiStore(now=0)
+    assert store.first_use("a", exp=10**9, now=10**9 - 5)
+    assert len(store) == 1
+
+
+def test_timing_wheel_skips_idle_seconds_with_entries_pending():
+    wheel = TimingWheel(0)
+    wheel.add("soon", 5)
+    wheel.add("late", 10**8)
+    assert wheel.advance(10**8 - 1) == ["soon"]  # a walk would take 10**8 steps
+    assert wheel.advance(10**8) == ["late"]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "seen.db")
+
+
+def test_sqlite_store_rejects_replay_and_reuses_expired_rows(db):
+    store = SQLiteJtiStore(db)
+    assert store.first_use("a", exp=1100, now=1000)
+    assert not store.first_use("a", exp=1100, now=1050)
+    # Expired but not yet purged: a fresh token may reuse the row.
+    assert store.first_use("a", exp=1300, now=1200)
+    assert store.purge(now=2000) == 1
+
+
+def _claim_all(args):
+    db, jtis = args
+    store = SQLiteJtiStore(db)
+    return sum(store.first_use(j, int(time.time()) + 60) for j in jtis)
+
+
+def test_sqlite_store_is_shared_between_processes(db):
+    SQLiteJtiStore(db)
+    jtis = [f"jti-{i}" for i in range(200)]
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        accepted = sum(pool.map(_claim_all, [(db, jtis)] * 4))
+    assert accepted == len(jtis)
+
+
+def test_verify_command_token_is_one_shot():
+    token = _command_token()
+    seen = MemoryJtiStore()
+
+    claims = verify_command_token(CONFIG, token, seen, target="edge-01")
+    assert claims["command"] == "reboot"
+
+    with pytest.raises(ValueError, match="already been used") as exc:
+        verify_command_token(CONFIG, token, seen, target="edge-01")
+    assert type(exc.value.__cause__).__name__ == "TokenReplayedError"
+
+
+def test_verify_command_token_checks_target_and_jti():
+    with pytest.raises(ValueError, match="Invalid token"):
+        verify_command_token(CONFIG, _command_token(), MemoryJtiStore(), "edge-02")
+
+    plain = issue_token(dict(CONFIG, audience="edge-01"), {"sub": "x"})
+    with pytest.raises(ValueError, match="jti and exp"):
+        verify_command_token(CONFIG, plain, MemoryJtiStore(), target="edge-01")
+
+
+def test_cli_verify_seen_db_rejects_replays(tmp_path, db, capsys):
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(f'hs256_secret: "{CONFIG["hs256_secret"]}"\n')
+    first, second = _command_token(), _command_token()
+    tokens = tmp_path / "tokens.txt"
+    tokens.write_text(f"{first}\n{second}\n{first}\n")
+
+    args = cli.build_parser().parse_args(
+        ["verify", "--config", str(cfg), "--input", str(tokens)]
+        + ["--audience", "edge-01", "--seen-db", db]
+    )
+    args.func(args)
+
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [r["valid"] for r in out] == [True, True, False]
+    assert out[2]["reason"] == "TokenReplayedError"
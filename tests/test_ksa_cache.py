@@ -0,0 +1,165 @@
+import jwt
+import pytest
+
+from keypebble.service.ksa_cache import KsaTokenCache
+
+CONFIG = {
+    "hs256_secret": "ksa-cache-secret-0123456789abcdef01234567",
+    "issuer": "keypebble-test",
+    "ksa_cache": {"refresh_at": 0.5, "min_remaining": 0.25},
+}
+PATH = "/apis/authentication.k8s.io/v1/namespaces/{}/serviceaccounts/{}/token"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache():
+    clock = Clock()
+    minted = []
+
+    def mint(namespace, name, audiences, ttl):
+        minted.append((namespace, name, audiences, ttl))
+        return f"token-{len(minted)}", int(clock.now) + ttl
+
+    cache = KsaTokenCache(
+        {"refresh_at": 0.5, "min_remaining": 0.25, "ttl_bucket_seconds": 60},
+        mint,
+        clock=clock,
+    )
+    yield cache, clock, minted
+    cache.close()
+
+
+def test_repeat_requests_share_one_token(cache):
+    cache, _, minted = cache
+    first = cache.get("ci", "builder", ["b", "a"], 3600)
+    # Same audiences in another order and a TTL in the same bucket.
+    assert cache.get("ci", "builder", ["a", "b"], 3590) == first
+    assert len(minted) == 1
+
+    cache.get("ci", "builder", ["a"], 3600)
+    cache.get("ci", "builder", ["a", "b"], 7200)
+    cache.get("ci", "deployer", ["a", "b"], 3600)
+    assert len(minted) == 4
+
+
+def test_hot_tokens_are_refreshed_ahead_of_expiry(cache):
+    cache, clock, minted = cache
+    cache.get("ci", "builder", ["a"], 100)
+    cache.get("ci", "builder", ["a"], 100)
+
+    clock.now += 40
+    assert cache.refresh_due() == pytest.approx(1050)
+    clock.now += 10
+    cache.refresh_due()
+    assert len(minted) == 2
+
+    # Served from the refreshed entry without minting on the request path.
+    token, exp = cache.get("ci", "builder", ["a"], 100)
+    assert (token, exp) == ("token-2", 1150)
+    assert len(minted) == 2
+
+
+def test_cold_tokens_expire_instead_of_refreshing(cache):
+    cache, clock, minted = cache
+    cache.get("ci", "builder", ["a"], 100)
+    clock.now += 60
+    cache.refresh_due()
+    assert len(minted) == 1
+
+    # Too little lifetime left to serve: minted inline.
+    clock.now += 20
+    assert cache.get("ci", "builder", ["a"], 100)[0] == "token-2"
+
+    clock.now += 200
+    cache.refresh_due()
+    assert len(cache) == 0
+
+
+def test_failed_refresh_keeps_serving_the_old_token(cache):
+    cache, clock, _ = cache
+    cache.get("ci", "builder", ["a"], 100)
+    cache.get("ci", "builder", ["a"], 100)
+    cache.mint = lambda *args: 1 / 0
+    clock.now += 50
+    cache.refresh_due()
+    assert cache.get("ci", "builder", ["a"], 100)[0] == "token-1"
+
+
+def test_invalid_fractions_are_rejected():
+    with pytest.raises(ValueError):
+        KsaTokenCache({"refresh_at": 0.8, "min_remaining": 0.3}, None)
+
+
+def test_endpoint_serves_cached_token_and_rebuilds_on_reload(make_app):
+    app = make_app(dict(CONFIG))
+    client = app.test_client()
+    body = {"spec": {"audiences": ["vault", "registry"], "expirationSeconds": 600}}
+
+    first = client.post(PATH.format("ci", "builder"), json=body).get_json()
+    body["spec"]["audiences"].reverse()
+    second = client.post(PATH.format("ci", "builder"), json=body).get_json()
+    assert first["status"] == second["status"]
+
+    claims = jwt.decode(
+        first["status"]["token"],
+        CONFIG["hs256_secret"],
+        algorithms=["HS256"],
+        options={"verify_aud": False},
+    )
+    assert claims["sub"] == "system:serviceaccount:ci:builder"
+    assert claims["exp"] - claims["iat"] == 600
+
+    old = app.ksa_cache
+    with app.state_lock:  # what a reload does
+        app.config = app.make_config()
+        app.config.update(CONFIG)
+    third = client.post(PATH.format("ci", "builder"), json=body).get_json()
+    assert app.ksa_cache is not old and len(old) == 0
+    assert len(app.ksa_cache) == 1
+    assert third["status"]["token"]
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'keypebble_ksa_cache_total{result="hit"} 1.0' in text
+    app.ksa_cache.close()
+
+
+def test_endpoint_without_cache_config_mints_every_time(client, app):
+    body = {"spec": {"audiences": ["vault"]}}
+    client.post(PATH.format("ci", "builder"), json=body)
+    assert app.ksa_cache is None
+
+
+def test_empty_cache_block_enables_cache_and_aud_is_issued_as_sent(make_app):
+    app = make_app(dict(CONFIG, ksa_cache={}))
+    uncached = make_app(dict(CONFIG))
+
+    for audiences in ("vault", ["vault"]):
+        body = {"spec": {"audiences": audiences}}
+        for client in (app.test_client(), app.test_client(), uncached.test_client()):
+            resp = client.post(PATH.format("ci", "builder"), json=body)
+            claims = jwt.decode(
+                resp.get_json()["status"]["token"],
+                CONFIG["hs256_secret"],
+                algorithms=["HS256"],
+                audience="vault",
+            )
+            assert claims["aud"] == audiences
+    assert len(app.ksa_cache) == 2
+    app.ksa_cache.close()
+
+
+def test_mixed_audience_types_are_cached(make_app):
+    app = make_app(dict(CONFIG, ksa_cache={}))
+    body = {"spec": {"audiences": [2, "vault"]}}
+    resp = app.test_client().post(PATH.format("ci", "builder"), json=body)
+    assert resp.status_code == 200
+    assert len(app.ksa_cache) == 1
+    app.ksa_cache.close()
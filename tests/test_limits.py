@@ -0,0 +1,154 @@
+import pytest
+
+from keypebble.service.limits import AdmissionController, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def limited_app(make_app):
+    def factory(limits):
+        return make_app(
+            {
+                "hs256_secret": "test-secret",
+                "issuer": "keypebble-test",
+                "audience": "keypebble-edge",
+                "limits": limits,
+            }
+        )
+
+    return factory
+
+
+# ---------------------------------------------------------------------------
+# RateLimiter / AdmissionController units
+# ---------------------------------------------------------------------------
+
+
+def test_token_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+    assert [limiter.acquire("k", 1.0, 2.0) for _ in range(2)] == [0.0, 0.0]
+    assert limiter.acquire("k", 1.0, 2.0) == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert limiter.acquire("k", 1.0, 2.0) == 0.0
+
+
+def test_rate_limiter_bounds_bucket_count():
+    limiter = RateLimiter(max_buckets=3, clock=FakeClock())
+    for i in range(10):
+        limiter.acquire(f"user-{i}", 1.0, 1.0)
+    assert len(limiter) == 3
+
+
+def test_rate_limiter_evicts_idle_buckets():
+    clock = FakeClock()
+    limiter = RateLimiter(idle_seconds=60, clock=clock)
+    limiter.acquire("a", 1.0, 1.0)
+    limiter.acquire("b", 1.0, 1.0)
+    clock.now += 61
+    limiter.acquire("c", 1.0, 1.0)
+    assert len(limiter) == 1
+
+
+def test_admission_sheds_load_over_in_flight_threshold():
+    admission = AdmissionController({"max_in_flight": 1, "retry_after_seconds": 2})
+    assert admission.admit("alice", "/v2/token") is None
+    assert admission.admit("bob", "/v2/token") == (503, "server busy", 2)
+    admission.release()
+    assert admission.admit("bob", "/v2/token") is None
+
+
+def test_admission_endpoint_rate_overrides_default():
+    admission = AdmissionController(
+        {
+            "rate_per_second": 1,
+            "endpoints": {"/auth": {"rate_per_second": 1, "burst": 3}},
+        },
+        clock=FakeClock(),
+    )
+    assert admission.admit("alice", "/v2/token") is None
+    assert admission.admit("alice", "/v2/token")[0] == 429
+    for _ in range(3):
+        assert admission.admit("alice", "/auth") is None
+
+
+# ---------------------------------------------------------------------------
+# HTTP behaviour
+# ---------------------------------------------------------------------------
+
+
+def test_rate_limit_is_per_user(limited_app):
+    client = limited_app({"rate_per_second": 0.01, "burst": 1}).test_client()
+    alice = {"X-Authenticated-User": "alice"}
+
+    assert client.get("/v2/token", headers=alice).status_code == 200
+    resp = client.get("/v2/token", headers=alice)
+    assert resp.status_code == 429
+    assert resp.get_json() == {"error": "rate limit exceeded"}
+    assert int(resp.headers["Retry-After"]) >= 1
+
+    bob = {"X-Authenticated-User": "bob"}
+    assert client.get("/v2/token", headers=bob).status_code == 200
+
+
+def test_healthz_is_never_limited(limited_app):
+    client = limited_app({"rate_per_second": 0.01, "burst": 1}).test_client()
+    for _ in range(3):
+        assert client.get("/healthz").status_code == 200
+
+
+def test_in_flight_counter_released_after_request(limited_app):
+    app = limited_app({"max_in_flight": 1})
+    client = app.test_client()
+    headers = {"X-Authenticated-User": "alice"}
+    for _ in range(3):
+        assert client.get("/v2/token", headers=headers).status_code == 200
+    assert app.admission.in_flight == 0
+
+
+def test_streamed_fanout_holds_in_flight_slot_until_closed(limited_app):
+    app = limited_app({"max_in_flight": 1})
+    client = app.test_client()
+    body = {"targets": [f"edge-{i}" for i in range(3)], "command": "uptime"}
+
+    resp = client.post("/command/token", json=body)
+    chunks = iter(resp.response)
+    next(chunks)
+    assert app.admission.in_flight == 1
+    busy = client.post("/command/token", json={"target": "e", "command": "x"})
+    assert busy.status_code == 503
+
+    assert b"".join(chunks).endswith(b"]}\n")
+    resp.close()
+    assert app.admission.in_flight == 0
+    ok = client.post("/command/token", json={"target": "e", "command": "x"})
+    assert ok.status_code == 200
+
+
+def test_load_shedding_returns_503_with_retry_after(limited_app):
+    app = limited_app({"max_in_flight": 0, "retry_after_seconds": 5})
+    resp = app.test_client().get("/v2/token", headers={"X-Authenticated-User": "alice"})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+
+
+def test_auth_rejects_oversized_body(limited_app):
+    client = limited_app({"max_body_bytes": 32}).test_client()
+    resp = client.post("/auth", json={"sub": "x" * 64})
+    assert resp.status_code == 413
+
+
+def test_auth_rejects_too_many_claims(limited_app):
+    client = limited_app({"max_auth_claims": 2}).test_client()
+    assert client.post("/auth", json={"sub": "a", "role": "b"}).status_code == 200
+    resp = client.post("/auth", json={"sub": "a", "role": "b", "extra": "c"})
+    assert resp.status_code == 400
+    assert resp.get_json() == {"error": "too many claims"}
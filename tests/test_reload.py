@@ -0,0 +1,155 @@
+import logging
+import os
+import signal
+import threading
+import time
+from unittest.mock import patch
+
+import jwt
+import pytest
+
+from keypebble.config import load_config
+from keypebble.core.token import issue_token
+from keypebble.service.reload import Reloader
+
+SECRET = "reload-secret-0123456789abcdef0123456789"
+
+
+def _write_config(path, ttl, **extra):
+    lines = [f'hs256_secret: "{SECRET}"', f"default_ttl_seconds: {ttl}"]
+    lines += [f"{k}: {v}" for k, v in extra.items()]
+    path.write_text("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def files(tmp_path):
+    config = tmp_path / "config.yaml"
+    _write_config(config, 600)
+    policy = tmp_path / "policy.yaml"
+    policy.write_text('users:\n  alice:\n    repos: ["a/*"]\n    actions: ["pull"]\n')
+    return config, policy
+
+
+@pytest.fixture
+def served(files, make_app):
+    config, policy = files
+    app = make_app(load_config(str(config)), policy_path=str(policy))
+    return app, Reloader(app, str(config), str(policy))
+
+
+def _v2(client, scope="repository:a/x:pull,push"):
+    return client.get(
+        f"/v2/token?scope={scope}", headers={"X-Authenticated-User": "alice"}
+    ).get_json()
+
+
+def _claims(token):
+    return jwt.decode(
+        token, SECRET, algorithms=["HS256"], options={"verify_aud": False}
+    )
+
+
+def test_reload_applies_ttl_static_claims_allowlist_and_policy(files, served):
+    config, policy = files
+    app, reloader = served
+    client = app.test_client()
+    assert _v2(client)["expires_in"] == 600
+
+    _write_config(
+        config, 120, static_claims="{env: prod}", allowed_custom_claims="[role]"
+    )
+    policy.write_text(
+        'users:\n  alice:\n    repos: ["a/*"]\n    actions: ["pull", "push"]\n'
+    )
+    assert reloader.reload()
+
+    body = _v2(client)
+    assert body["expires_in"] == 120
+    claims = _claims(body["token"])
+    assert claims["env"] == "prod"
+    assert body["claims"]["access"][0]["actions"] == ["pull", "push"]
+    assert "access" not in claims  # dropped by the new allowlist
+
+    auth = client.post("/auth", json={"sub": "bob", "role": "ci", "x": 1}).get_json()
+    assert set(_claims(auth["token"])) >= {"sub", "role"}
+    assert "x" not in _claims(auth["token"])
+
+
+def test_failed_reload_keeps_serving_old_state(files, served, caplog):
+    config, _ = files
+    app, reloader = served
+    config.write_text("default_ttl_seconds: 5\n")  # no signing key
+
+    with caplog.at_level(logging.ERROR, logger="keypebble.service.reload"):
+        assert not reloader.reload()
+
+    assert "still serving generation 0" in caplog.text
+    assert _v2(app.test_client())["expires_in"] == 600
+    metrics = app.test_client().get("/metrics").get_data(as_text=True)
+    assert 'keypebble_config_reloads_total{result="error"} 1.0' in metrics
+    assert "keypebble_config_last_reload_successful 0.0" in metrics
+
+
+def test_reload_metrics_and_log(files, served, caplog):
+    app, reloader = served
+    with caplog.at_level(logging.INFO, logger="keypebble.service.reload"):
+        assert reloader.reload()
+        assert reloader.reload()
+
+    assert "generation 2" in caplog.text
+    metrics = app.test_client().get("/metrics").get_data(as_text=True)
+    assert 'keypebble_config_reloads_total{result="success"} 2.0' in metrics
+    assert "keypebble_config_generation 2.0" in metrics
+
+
+def test_in_flight_request_finishes_on_old_state(files, served):
+    config, _ = files
+    app, reloader = served
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_issue(*args, **kwargs):
+        entered.set()
+        release.wait(5)
+        return issue_token(*args, **kwargs)
+
+    result = {}
+    with patch("keypebble.service.app.issue_token", slow_issue):
+        worker = threading.Thread(target=lambda: result.update(_v2(app.test_client())))
+        worker.start()
+        assert entered.wait(5)
+        _write_config(config, 30)
+        assert reloader.reload()
+        release.set()
+        worker.join(5)
+
+    assert result["expires_in"] == 600
+    claims = _claims(result["token"])
+    assert claims["exp"] - claims["iat"] == 600
+    assert _v2(app.test_client())["expires_in"] == 30
+
+
+def test_listeners_receive_new_state(files, served):
+    app, reloader = served
+    seen = []
+    reloader.listeners.append(lambda config, policy: seen.append((config, policy)))
+
+    assert reloader.reload()
+    assert seen[0][0]["default_ttl_seconds"] == 600
+    assert seen[0][1] is app.policy_handler
+
+
+def test_sighup_triggers_reload(files, served):
+    config, _ = files
+    app, reloader = served
+    _write_config(config, 45)
+    previous = reloader.install()
+    try:
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 5
+        while reloader.generation == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+    assert reloader.generation == 1
+    assert _v2(app.test_client())["expires_in"] == 45
@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from keypebble import cli
+from keypebble.replay import (
+    format_table,
+    parse_nginx_log,
+    process_cpu_seconds,
+    replay,
+    synthetic_pull_storm,
+)
+from keypebble.service.app import create_app
+
+LOG = """\
+1700000000.250 10.0.0.1 - - [14/Nov/2023:22:13:20 +0000] "GET /v2/token?scope=repository:a:pull HTTP/1.1" 401 0 "-" "docker/24"
+1700000000.500 10.0.0.1 - alice [14/Nov/2023:22:13:20 +0000] "GET /v2/token?scope=repository:a:pull HTTP/1.1" 200 812 "-" "docker/24"
+1700000000.750 10.0.0.1 - alice [14/Nov/2023:22:13:20 +0000] "GET /v2/ HTTP/1.1" 200 2 "-" "docker/24"
+10.0.0.2 - bob [14/Nov/2023:22:13:21 +0000] "GET /v2/token?service=reg HTTP/1.1" 200 812 "-" "docker/24"
+garbage
+"""
+
+
+@pytest.fixture
+def server():
+    app = create_app(
+        {
+            "hs256_secret": "replay-secret-0123456789abcdef0123456789",
+            "audience": "replay",
+        }
+    )
+    srv = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.server_port}"
+    srv.shutdown()
+
+
+def test_parse_nginx_log_keeps_authenticated_token_requests():
+    events = list(parse_nginx_log(io.StringIO(LOG)))
+
+    assert [spec[2]["X-Authenticated-User"] for _, spec in events] == ["alice", "bob"]
+    assert events[0][0] == 1700000000.5
+    assert events[0][1][:2] == ("GET", "/v2/token?scope=repository:a:pull")
+    # Without $msec the timestamp falls back to $time_local.
+    assert events[1][0] == 1700000001.0
+
+
+def test_synthetic_pull_storm_shape():
+    events = synthetic_pull_storm(clients=3, layers=4, layer_interval=0.1, ramp=0.3)
+
+    assert len(events) == 12
+    offsets = [ts for ts, _ in events]
+    assert offsets == sorted(offsets)
+    assert offsets[0] == 0.0
+    assert offsets[-1] == pytest.approx(0.2 + 0.3)
+    assert "scope=repository:bench/app-0:pull" in events[0][1][1]
+
+
+def test_process_cpu_seconds_is_monotonic():
+    before = process_cpu_seconds(os.getpid())
+    sum(i * i for i in range(200_000))
+    assert process_cpu_seconds(os.getpid()) >= before
+
+
+def test_replay_against_server(server):
+    events = synthetic_pull_storm(clients=4, layers=5, layer_interval=0.005)
+
+    report = replay(events, server, speed=2.0, server_pid=os.getpid())
+
+    assert report["requests"] == 20
+    assert report["errors"] == 0
+    assert report["server_cpu_seconds"] >= 0
+    assert set(report["schedule_lag_ms"]) == {"p50", "p99", "max"}
+    assert "server cpu/request" in format_table(report)
+
+
+def test_replay_counts_failures(server):
+    events = [(0.0, ("GET", "/v2/token", {}, None))] * 3
+
+    report = replay(events, server)
+
+    assert report["requests"] == 3
+    assert report["errors"] == 3
+
+
+def test_cli_replay_log_writes_json(server, tmp_path, capsys):
+    log = tmp_path / "access.log"
+    log.write_text(LOG)
+    out = tmp_path / "report.json"
+    args = cli.build_parser().parse_args(
+        ["replay", "--url", server, "--log", str(log), "--speed", "100"]
+        + ["--json", str(out)]
+    )
+    args.func(args)
+
+    assert "schedule lag p99" in capsys.readouterr().out
+    report = json.loads(out.read_text())
+    assert report["requests"] == 2
+    assert report["speed"] == 100.0
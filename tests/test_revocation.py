@@ -0,0 +1,205 @@
+import json
+import time
+
+import pytest
+
+from keypebble import cli
+from keypebble.core import RevocationList, decode_token, issue_token
+from keypebble.core.revocation import COMPACT_SLACK
+
+CONFIG = {
+    "hs256_secret": "revocation-secret-0123456789abcdef012345",
+    "issuer": "keypebble-test",
+    "audience": "keypebble-edge",
+}
+
+
+def test_revoke_and_expire():
+    revocations = RevocationList()
+    revocations.revoke("a", exp=100, now=0)
+    revocations.revoke("b", exp=200, now=0)
+
+    assert revocations.is_revoked("a")
+    assert not revocations.is_revoked("c")
+    assert not revocations.is_revoked(None)
+
+    assert revocations.purge(now=150) == 1
+    assert not revocations.is_revoked("a")
+    assert revocations.is_revoked("b")
+
+
+def test_revoking_again_extends_but_never_shortens():
+    revocations = RevocationList()
+    revocations.revoke("a", exp=100, now=0)
+    revocations.revoke("a", exp=300, now=0)
+    revocations.revoke("a", exp=50, now=0)
+
+    revocations.purge(now=200)
+    assert revocations.is_revoked("a")
+    revocations.purge(now=300)
+    assert len(revocations) == 0
+
+
+def test_already_expired_tokens_are_not_stored():
+    revocations = RevocationList()
+    revocations.revoke("old", exp=10, now=20)
+    assert len(revocations) == 0
+
+
+def test_journal_survives_restart_and_is_compacted(tmp_path):
+    path = tmp_path / "revoked.jsonl"
+    future = int(time.time()) + 3600
+    revocations = RevocationList(str(path))
+    revocations.revoke("live", future)
+    revocations.revoke("gone", int(time.time()) + 1)
+    with open(path, "a") as f:
+        f.write('{"jti": "torn"')
+
+    time.sleep(1.1)
+    reloaded = RevocationList(str(path))
+
+    assert reloaded.is_revoked("live")
+    assert not reloaded.is_revoked("gone")
+    assert [json.loads(line)["jti"] for line in path.read_text().splitlines()] == [
+        "live"
+    ]
+
+
+def test_journal_compacts_after_enough_expired_lines(tmp_path):
+    path = tmp_path / "revoked.jsonl"
+    revocations = RevocationList(str(path))
+    for i in range(COMPACT_SLACK + 1):
+        revocations.revoke(f"j{i}", exp=100, now=0)
+    revocations.revoke("keep", exp=10_000_000_000, now=200)
+
+    assert path.read_text().splitlines() == ['{"jti": "keep", "exp": 10000000000}']
+
+
+def test_readonly_list_never_writes(tmp_path):
+    path = tmp_path / "revoked.jsonl"
+    path.write_text('{"jti": "x", "exp": 10000000000}\nnot-json\n')
+    revocations = RevocationList(str(path), readonly=True)
+
+    assert revocations.is_revoked("x")
+    with pytest.raises(ValueError):
+        revocations.revoke("y", 10_000_000_000)
+    assert "not-json" in path.read_text()
+
+
+def test_decode_token_rejects_revoked_jti():
+    token = issue_token(CONFIG, {"jti": "cmd-1"})
+    revocations = RevocationList()
+    assert decode_token(CONFIG, token, revocations=revocations)["jti"] == "cmd-1"
+
+    revocations.revoke("cmd-1", int(time.time()) + 3600)
+    with pytest.raises(ValueError, match="revoked") as exc:
+        decode_token(CONFIG, token, revocations=revocations)
+    assert type(exc.value.__cause__).__name__ == "TokenRevokedError"
+
+
+def test_revoke_endpoint_accepts_token(make_app):
+    app = make_app(CONFIG)
+    client = app.test_client()
+    minted = client.post(
+        "/command/token", json={"target": "edge-01", "command": "reboot"}
+    ).get_json()
+
+    resp = client.post("/revoke", json={"token": minted["token"]})
+
+    assert resp.status_code == 200
+    assert resp.get_json()["jti"] == minted["jti"]
+    assert app.revocations.is_revoked(minted["jti"])
+
+
+def test_revoke_endpoint_accepts_jti_and_exp(make_app):
+    app = make_app(CONFIG)
+    exp = int(time.time()) + 60
+
+    resp = app.test_client().post("/revoke", json={"jti": "abc", "exp": exp})
+
+    assert resp.get_json() == {"jti": "abc", "revoked": True, "expires_at": exp}
+    assert app.revocations.is_revoked("abc")
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ({"jti": "abc"}, "exp is required"),
+        ({"exp": 1}, "jti is required"),
+        ({"token": "not-a-jwt"}, "invalid token"),
+        (
+            {"token": issue_token(dict(CONFIG, hs256_secret="x" * 40), {"jti": "f"})},
+            "invalid token",
+        ),
+        ({"token": issue_token(CONFIG, {"sub": "no-jti"})}, "jti is required"),
+        ({"jti": "abc", "exp": True}, "exp is required"),
+        ({"jti": "abc", "exp": 10**12}, "exp is more than 86400 seconds ahead"),
+    ],
+)
+def test_revoke_endpoint_rejects_bad_requests(make_app, body, error):
+    resp = make_app(CONFIG).test_client().post("/revoke", json=body)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == error
+
+
+def test_revoke_endpoint_bounds_bare_exp(make_app):
+    app = make_app(dict(CONFIG, revocation={"max_ttl_seconds": 7200}))
+    client = app.test_client()
+    now = int(time.time())
+
+    assert (
+        client.post("/revoke", json={"jti": "a", "exp": now + 7000}).status_code == 200
+    )
+    resp = client.post("/revoke", json={"jti": "b", "exp": now + 7400})
+    assert resp.status_code == 400
+    assert not app.revocations.is_revoked("b")
+
+    # A signed token is revoked for its whole lifetime, whatever it is.
+    token = issue_token(CONFIG, {"jti": "c", "exp": now + 10**6})
+    assert client.post("/revoke", json={"token": token}).status_code == 200
+
+
+def test_revoke_endpoint_caps_bare_revocations(make_app):
+    app = make_app(dict(CONFIG, revocation={"max_entries": 2}))
+    client = app.test_client()
+    exp = int(time.time()) + 60
+
+    for jti in ("a", "b"):
+        assert client.post("/revoke", json={"jti": jti, "exp": exp}).status_code == 200
+    resp = client.post("/revoke", json={"jti": "c", "exp": exp})
+    assert resp.status_code == 503
+    assert not app.revocations.is_revoked("c")
+
+    token = issue_token(CONFIG, {"jti": "d", "exp": exp})
+    assert client.post("/revoke", json={"token": token}).status_code == 200
+
+
+def test_revocations_persist_across_app_restarts(make_app, tmp_path):
+    config = dict(CONFIG, revocation={"path": str(tmp_path / "revoked.jsonl")})
+    make_app(config).test_client().post(
+        "/revoke", json={"jti": "abc", "exp": int(time.time()) + 60}
+    )
+    assert make_app(config).revocations.is_revoked("abc")
+
+
+def test_cli_verify_reports_revoked_tokens(tmp_path, capsys, monkeypatch):
+    journal = tmp_path / "revoked.jsonl"
+    cfg = tmp_path / "config.yaml"
+    cfg.write_text(
+        f'hs256_secret: "{CONFIG["hs256_secret"]}"\n'
+        f'audience: "keypebble-edge"\nrevocation:\n  path: "{journal}"\n'
+    )
+    revoked = issue_token(CONFIG, {"jti": "bad"})
+    good = issue_token(CONFIG, {"jti": "good"})
+    RevocationList(str(journal)).revoke("bad", int(time.time()) + 3600)
+    tokens = tmp_path / "tokens.txt"
+    tokens.write_text(f"{revoked}\n{good}\n")
+
+    args = cli.build_parser().parse_args(
+        ["verify", "--config", str(cfg), "--input", str(tokens)]
+    )
+    args.func(args)
+
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert out[0]["reason"] == "TokenRevokedError"
+    assert out[1]["valid"] is True
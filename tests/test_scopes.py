@@ -1,6 +1,11 @@
-"""Pure unit tests for keypebble.core.policy.parse_scopes"""
+"""Pure unit tests for scope parsing, canonicalization and compact encoding"""
 
-from keypebble.core.policy import parse_scopes
+from keypebble.core.policy import (
+    canonicalize_scopes,
+    compact_access,
+    expand_access,
+    parse_scopes,
+)
 
 
 def test_single_scope():
@@ -42,3 +47,53 @@ def test_actions_whitespace_stripped():
     assert result == [
         {"type": "repository", "name": "ns/repo", "actions": ["pull", "push"]}
     ]
+
+
+def test_canonicalize_merges_duplicates_and_unions_actions():
+    result = canonicalize_scopes(
+        [
+            "repository:foo/bar:pull",
+            "repository:foo/baz:pull",
+            "repository:foo/bar:push,pull",
+            "repository:foo/bar",
+        ]
+    )
+    assert result == ["repository:foo/bar:pull,push", "repository:foo/baz:pull"]
+
+
+def test_canonicalize_wildcard_subsumes_actions_and_drops_empty():
+    result = canonicalize_scopes(
+        ["repository:foo/bar:pull", "repository:foo/bar:*", "repository:foo/baz:"]
+    )
+    assert result == ["repository:foo/bar:*"]
+
+
+def test_canonicalize_without_collapse_keeps_every_action():
+    # Scopes a policy has yet to filter keep ``pull`` next to ``*``.
+    result = canonicalize_scopes(
+        ["repository:foo/bar:pull", "repository:foo/bar:*", "repository:foo/baz:"],
+        collapse=False,
+    )
+    assert result == ["repository:foo/bar:pull,*"]
+
+
+def test_compact_access_round_trips():
+    access = parse_scopes(
+        [
+            "repository:team-a/app-1:pull,push",
+            "repository:team-a/app-2:pull,push",
+            "repository:team-b/api:pull",
+            "repository:library:pull",
+        ]
+    )
+    compact = compact_access(access)
+
+    assert compact[0] == {
+        "type": "repository",
+        "actions": ["pull", "push"],
+        "prefix": "team-a/",
+        "names": ["app-1", "app-2"],
+    }
+    assert len(compact) == 3
+    assert expand_access({"access_compact": compact}) == access
+    assert expand_access({"access": access}) == access
@@ -79,3 +79,22 @@ def test_auth_requires_post(client):
     """GET /auth should not be allowed (405)."""
     resp = client.get("/auth")
     assert resp.status_code == 405
+
+
+def test_auth_lean_response(client, base_config):
+    """POST /auth with X-Lean-Response omits the echoed claims."""
+    resp = client.post(
+        "/auth", json={"sub": "edge-001"}, headers={"X-Lean-Response": "true"}
+    )
+    assert resp.status_code == 200
+
+    data = resp.get_json()
+    assert set(data) == {"token", "access_token", "expires_in", "issued_at"}
+    assert data["expires_in"] == base_config["default_ttl_seconds"]
+    decoded = jwt.decode(
+        data["token"],
+        base_config["hs256_secret"],
+        algorithms=["HS256"],
+        audience=base_config["audience"],
+    )
+    assert decoded["sub"] == "edge-001"
@@ -0,0 +1,191 @@
+import multiprocessing
+import struct
+import time
+
+import pytest
+
+from keypebble.core import issue_token
+from keypebble.service import shared
+from keypebble.service.shared import (
+    SharedRateLimiter,
+    SharedRevocationList,
+    SharedTable,
+    SharedVerificationCache,
+)
+
+CONFIG = {
+    "hs256_secret": "shared-secret-0123456789abcdef0123456789",
+    "issuer": "keypebble-test",
+    "audience": "registry",
+}
+
+_COUNTER = struct.Struct("<Q")
+
+
+def _increment(old):
+    count = _COUNTER.unpack(old[0])[0] if old else 0
+    return _COUNTER.pack(count + 1), time.time() + 60
+
+
+def _hammer(path, n):
+    table = SharedTable(path, slots=64, value_size=8, stripes=4)
+    for _ in range(n):
+        table.update("counter", _increment)
+
+
+def test_get_set_delete_and_expiry(tmp_path):
+    table = SharedTable(str(tmp_path / "t"), slots=64, value_size=8, stripes=4)
+
+    assert table.set("a", b"one", expires=100, now=0)
+    assert table.get("a", now=50) == b"one"
+    assert table.get("a", now=100) is None
+    assert table.get("b", now=50) is None
+
+    table.set("b", b"two", expires=time.time() + 60)
+    table.delete("b")
+    assert table.get("b") is None
+
+    with pytest.raises(ValueError):
+        table.set("c", b"123456789", expires=100, now=0)
+
+
+def test_second_opener_sees_writes_and_must_match_geometry(tmp_path):
+    path = str(tmp_path / "t")
+    first = SharedTable(path, slots=64, value_size=8, stripes=4)
+    second = SharedTable(path, slots=64, value_size=8, stripes=4)
+
+    first.set("k", b"v", expires=time.time() + 60)
+    assert second.get("k") == b"v"
+    assert len(second) == 1
+
+    with pytest.raises(ValueError, match="different layout"):
+        SharedTable(path, slots=128, value_size=8, stripes=4)
+
+
+def test_full_window_evicts_earliest_expiry_unless_forbidden(tmp_path):
+    # One stripe of 16 slots: every key lands in the same window.
+    table = SharedTable(str(tmp_path / "t"), slots=16, value_size=0, stripes=1)
+    for i in range(16):
+        assert table.set(f"k{i}", b"", expires=1000 + i, now=0)
+
+    assert not table.set("late", b"", expires=2000, now=0, evict=False)
+    assert table.set("late", b"", expires=2000, now=0)
+    assert table.get("k0", now=0) is None
+    assert table.get("k1", now=0) == b""
+    assert table.get("late", now=0) == b""
+
+
+def test_updates_are_atomic_across_processes(tmp_path):
+    path = str(tmp_path / "t")
+    SharedTable(path, slots=64, value_size=8, stripes=4)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_hammer, args=(path, 500)) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    value = SharedTable(path, slots=64, value_size=8, stripes=4).get("counter")
+    assert _COUNTER.unpack(value)[0] == 2000
+
+
+def test_rate_limit_buckets_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "rl")
+    now = [0.0]
+    workers = [
+        SharedRateLimiter(SharedTable(path, 64, 16, 4), clock=lambda: now[0])
+        for _ in range(2)
+    ]
+
+    assert workers[0].acquire(("alice", "/v2/token"), rate=1, burst=2) == 0.0
+    assert workers[1].acquire(("alice", "/v2/token"), rate=1, burst=2) == 0.0
+    assert workers[0].acquire(("alice", "/v2/token"), rate=1, burst=2) == 1.0
+    assert workers[1].acquire(("bob", "/v2/token"), rate=1, burst=2) == 0.0
+
+    now[0] = 1.0
+    assert workers[1].acquire(("alice", "/v2/token"), rate=1, burst=2) == 0.0
+
+
+def test_revocations_are_shared_and_replayed_from_journal(tmp_path):
+    path = str(tmp_path / "rev")
+    journal = str(tmp_path / "revoked.jsonl")
+    exp = int(time.time()) + 60
+    first = SharedRevocationList(SharedTable(path, 64, 0, 4), journal)
+    second = SharedRevocationList(SharedTable(path, 64, 0, 4), journal)
+
+    first.revoke("j1", exp)
+    assert second.is_revoked("j1")
+    assert not second.is_revoked("j2")
+
+    restarted = SharedRevocationList(
+        SharedTable(str(tmp_path / "new"), 64, 0, 4), journal
+    )
+    assert restarted.is_revoked("j1")
+    assert len(restarted) == 1
+
+
+def test_shared_journal_is_compacted_and_read_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared, "COMPACT_SLACK", 2)
+    path, journal = str(tmp_path / "rev"), tmp_path / "revoked.jsonl"
+    first = SharedRevocationList(SharedTable(path, 64, 0, 4), str(journal))
+    second = SharedRevocationList(SharedTable(path, 64, 0, 4), str(journal))
+    now = time.time()
+    for i in range(3):
+        first.revoke(f"old{i}", int(now) + 5, now=now)
+    second.revoke("live", int(now) + 60, now=now)
+    assert sorted(jti for jti, _ in second.entries()) == [
+        "live",
+        "old0",
+        "old1",
+        "old2",
+    ]
+
+    first.revoke("late", int(now) + 60, now=now + 10)
+    assert len(journal.read_text().splitlines()) == 2
+    assert sorted(jti for jti, _ in second.entries()) == ["late", "live"]
+    second.revoke("after", int(now) + 60, now=now + 10)
+    assert sorted(jti for jti, _ in first.entries()) == ["after", "late", "live"]
+
+
+def test_full_revocation_table_refuses_instead_of_evicting(tmp_path):
+    revocations = SharedRevocationList(SharedTable(str(tmp_path / "rev"), 16, 0, 1))
+    exp = int(time.time()) + 60
+    for i in range(16):
+        revocations.revoke(f"j{i}", exp)
+
+    with pytest.raises(ValueError, match="full"):
+        revocations.revoke("one-more", exp)
+    assert all(revocations.is_revoked(f"j{i}") for i in range(16))
+
+
+def test_verification_cache_is_partitioned_by_key(tmp_path):
+    table = SharedTable(str(tmp_path / "cache"), 64, 256, 4)
+    claims = {"sub": "alice", "exp": int(time.time()) + 60}
+    one = SharedVerificationCache(table, b"key-one.")
+    two = SharedVerificationCache(table, b"key-two.")
+    one.put(b"digest", claims)
+
+    assert one.get(b"digest", time.time()) == claims
+    assert two.get(b"digest", time.time()) is None
+
+
+def test_workers_share_revocations_and_limits(make_app, tmp_path):
+    config = dict(
+        CONFIG,
+        shared_state={"dir": str(tmp_path / "shm"), "stripes": 4},
+        limits={"rate_per_second": 1, "burst": 2},
+    )
+    workers = [make_app(config).test_client() for _ in range(2)]
+    token = issue_token(CONFIG, {"sub": "alice", "jti": "j1"})
+
+    assert workers[0].post("/introspect", data={"token": token}).get_json()["active"]
+    workers[0].post("/revoke", json={"token": token})
+    assert (
+        not workers[1].post("/introspect", data={"token": token}).get_json()["active"]
+    )
+
+    headers = {"X-Authenticated-User": "bob"}
+    statuses = [
+        workers[i % 2].get("/v2/token", headers=headers).status_code for i in range(3)
+    ]
+    assert statuses == [200, 200, 429]
@@ -0,0 +1,129 @@
+import jwt
+import pytest
+from werkzeug.test import Client
+
+from keypebble.service.tenants import load_tenants
+
+SECRETS = {
+    "registry": "registry-secret-0123456789abcdef012345678",
+    "ksa": "ksa-secret-0123456789abcdef0123456789abcdef",
+}
+
+
+@pytest.fixture
+def tenants_file(tmp_path):
+    for name, secret in SECRETS.items():
+        (tmp_path / f"{name}.yaml").write_text(
+            f'issuer: "{name}-issuer"\nhs256_secret: "{secret}"\n'
+            f'audience: "{name}"\nfast_path: {str(name == "ksa").lower()}\n'
+        )
+    (tmp_path / "policy.yaml").write_text(
+        "users:\n  alice:\n    repos: [alice/app]\n    actions: [pull]\n"
+    )
+    path = tmp_path / "tenants.yaml"
+    path.write_text(f"""
+default: registry
+tenants:
+  registry:
+    config: {tmp_path / "registry.yaml"}
+    policy: {tmp_path / "policy.yaml"}
+    hosts: [auth.example.com]
+    path_prefix: /registry
+  ksa:
+    config: {tmp_path / "ksa.yaml"}
+    hosts: [ksa.example.com]
+    path_prefix: /ksa
+""")
+    return path
+
+
+def _v2_token(client, **kwargs):
+    resp = client.get(
+        kwargs.pop("path", "/v2/token"),
+        headers={"X-Authenticated-User": "alice"},
+        **kwargs,
+    )
+    assert resp.status_code == 200
+    return jwt.decode(
+        resp.json["token"], options={"verify_signature": False, "verify_aud": False}
+    )
+
+
+def test_requests_are_routed_by_host_prefix_and_default(tenants_file):
+    client = Client(load_tenants(str(tenants_file)).router)
+
+    assert _v2_token(client, base_url="http://ksa.example.com:8443")["iss"] == (
+        "ksa-issuer"
+    )
+    assert _v2_token(client, base_url="http://auth.example.com")["iss"] == (
+        "registry-issuer"
+    )
+    assert _v2_token(client, path="/ksa/v2/token")["iss"] == "ksa-issuer"
+    assert _v2_token(client, path="/registry/v2/token")["iss"] == "registry-issuer"
+    # Unknown host and prefix: the default tenant.
+    assert _v2_token(client, base_url="http://other")["iss"] == "registry-issuer"
+
+
+def test_unknown_tenant_without_default_is_404(tenants_file):
+    tenants_file.write_text(tenants_file.read_text().replace("default: registry", ""))
+    client = Client(load_tenants(str(tenants_file)).router)
+    resp = client.get("/v2/token", headers={"X-Authenticated-User": "alice"})
+    assert resp.status_code == 404
+    assert resp.json == {"error": "unknown tenant"}
+
+
+def test_tenants_have_isolated_keys_policy_and_metrics(tenants_file):
+    tenants = load_tenants(str(tenants_file))
+    client = Client(tenants.router)
+
+    resp = client.post("/ksa/auth", json={"sub": "alice"})
+    claims = jwt.decode(
+        resp.json["token"], SECRETS["ksa"], algorithms=["HS256"], audience="ksa"
+    )
+    assert claims["iss"] == "ksa-issuer"
+    with pytest.raises(jwt.InvalidSignatureError):
+        jwt.decode(resp.json["token"], SECRETS["registry"], algorithms=["HS256"])
+
+    registry, ksa = (tenants.tenants[n].app for n in ("registry", "ksa"))
+    assert registry.policy_handler is not None and ksa.policy_handler is None
+    assert registry.metrics.registry is not ksa.metrics.registry
+
+    client.post("/registry/introspect", data={"token": "x"})
+    metrics = client.get("/registry/metrics").get_data(as_text=True)
+    assert 'keypebble_introspection_cache_total{result="miss"} 1.0' in metrics
+    metrics = client.get("/ksa/metrics").get_data(as_text=True)
+    assert 'keypebble_introspection_cache_total{result="miss"}' not in metrics
+
+
+def test_reload_applies_per_tenant(tenants_file, tmp_path):
+    tenants = load_tenants(str(tenants_file))
+    client = Client(tenants.router)
+    ksa_config = tmp_path / "ksa.yaml"
+    ksa_config.write_text(ksa_config.read_text().replace("ksa-issuer", "ksa-issuer-v2"))
+
+    assert tenants.reload()
+    assert _v2_token(client, path="/ksa/v2/token")["iss"] == "ksa-issuer-v2"
+    assert _v2_token(client, path="/registry/v2/token")["iss"] == "registry-issuer"
+
+
+@pytest.mark.parametrize(
+    "old, new, error",
+    [
+        ("hosts: [ksa.example.com]", "hosts: [auth.example.com]", "two tenants"),
+        ("path_prefix: /ksa", "path_prefix: /registry", "used twice"),
+        ("path_prefix: /ksa", "path_prefix: /a/b", "single path segment"),
+        ("default: registry", "default: nope", "not defined"),
+    ],
+)
+def test_invalid_tenants_files_are_rejected(tenants_file, old, new, error):
+    tenants_file.write_text(tenants_file.read_text().replace(old, new))
+    with pytest.raises(ValueError, match=error):
+        load_tenants(str(tenants_file))
+
+
+def test_tenants_may_not_share_state_directories(tenants_file, tmp_path):
+    for name in SECRETS:
+        path = tmp_path / f"{name}.yaml"
+        path.write_text(path.read_text() + f"audit:\n  dir: {tmp_path / 'audit'}\n")
+    with pytest.raises(ValueError, match="share audit.dir"):
+        load_tenants(str(tenants_file))
@@ -1,4 +1,4 @@
-from keypebble.core.token import decode_token, issue_token
+from keypebble.core.token import decode_token, issue_token, load_verification_key
 
 
 def test_decode_token_roundtrip():
@@ -14,3 +14,33 @@ def test_decode_token_roundtrip():
 
     # Issuer should also appear
     assert decoded["iss"] == "test"
+
+
+def test_decode_token_with_preloaded_key():
+    config = {"hs256_secret": "secret", "audience": "keypebble-test"}
+    token = issue_token(config, {"sub": "user1"})
+    key = load_verification_key(config)
+    assert (
+        decode_token({"audience": "keypebble-test"}, token, key=key)["sub"] == "user1"
+    )
+
+
+def test_rs256_verification_falls_back_to_private_key_file(tmp_path):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key_path = tmp_path / "key.pem"
+    key_path.write_bytes(
+        rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    config = {
+        "algorithm": "RS256",
+        "rs256_private_key": str(key_path),
+        "audience": "edge",
+    }
+    token = issue_token(config, {"sub": "user1"})
+    assert decode_token(config, token)["sub"] == "user1"
@@ -0,0 +1,102 @@
+import logging
+
+import jwt
+import pytest
+
+from keypebble.core import TokenTooLargeError, issue_token
+from keypebble.core.policy import expand_access
+
+SECRET = "size-secret-0123456789abcdef0123456789ab"
+CONFIG = {"hs256_secret": SECRET, "issuer": "keypebble-test", "audience": "registry"}
+REPOS = [f"team/app-{i:03d}" for i in range(300)]
+
+
+def _decode(token):
+    return jwt.decode(token, SECRET, algorithms=["HS256"], audience="registry")
+
+
+@pytest.fixture
+def policy_path(tmp_path):
+    path = tmp_path / "policy.yaml"
+    repos = "".join(f"      - {r}\n" for r in REPOS)
+    path.write_text(f"users:\n  alice:\n    repos:\n{repos}    actions: [pull, push]\n")
+    return str(path)
+
+
+def test_combined_scope_params_and_header_are_canonical(make_app):
+    client = make_app(dict(CONFIG)).test_client()
+    resp = client.get(
+        "/v2/token?scope=repository:foo/bar:pull&scope=repository:foo/bar:push",
+        headers={"X-Authenticated-User": "bob", "X-Scopes": "repository:foo/bar:pull"},
+    )
+
+    claims = resp.get_json()["claims"]
+    assert claims["scope"] == "repository:foo/bar:pull,push"
+    assert claims["access"] == [
+        {"type": "repository", "name": "foo/bar", "actions": ["pull", "push"]}
+    ]
+
+
+def test_large_generated_grant_uses_compact_encoding(make_app, policy_path):
+    headers = {"X-Authenticated-User": "alice", "X-Policy-Generate": "true"}
+    plain = make_app(dict(CONFIG), policy_path=policy_path).test_client()
+    compact = make_app(
+        dict(CONFIG, token_size={"compact_access_over": 50}), policy_path=policy_path
+    ).test_client()
+
+    full_token = plain.get("/v2/token", headers=headers).get_json()["token"]
+    small_token = compact.get("/v2/token", headers=headers).get_json()["token"]
+
+    claims = _decode(small_token)
+    assert "access" not in claims and "scope" not in claims
+    assert expand_access(claims) == _decode(full_token)["access"]
+    assert len(small_token) * 4 < len(full_token)
+
+
+def test_oversized_token_is_rejected_at_issuance(make_app, policy_path):
+    config = dict(CONFIG, token_size={"max_bytes": 4096})
+    client = make_app(config, policy_path=policy_path).test_client()
+    headers = {"X-Authenticated-User": "alice", "X-Policy-Generate": "true"}
+
+    resp = client.get("/v2/token", headers=headers)
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "token too large"
+
+    resp = client.post("/auth", json={"sub": "alice", "blob": "x" * 5000})
+    assert resp.status_code == 400
+
+
+def test_oversized_command_token_is_rejected(make_app):
+    client = make_app(dict(CONFIG, token_size={"max_bytes": 200})).test_client()
+    resp = client.post(
+        "/command/token", json={"target": "node-1", "command": "x" * 500}
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "token too large"
+
+
+@pytest.mark.parametrize("ksa_cache", [None, {}])
+def test_oversized_ksa_token_is_rejected(make_app, ksa_cache):
+    config = dict(CONFIG, token_size={"max_bytes": 200})
+    if ksa_cache is not None:
+        config["ksa_cache"] = ksa_cache
+    client = make_app(config).test_client()
+    resp = client.post(
+        "/apis/authentication.k8s.io/v1/namespaces/default/serviceaccounts/"
+        "builder/token",
+        json={"spec": {"audiences": [f"aud-{i}" for i in range(50)]}},
+    )
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "token too large"
+
+
+def test_oversize_warn_mode_logs_and_issues(caplog):
+    config = dict(CONFIG, token_size={"max_bytes": 100, "on_oversize": "warn"})
+    with caplog.at_level(logging.WARNING, logger="keypebble.core.token"):
+        token = issue_token(config, {"sub": "alice"})
+
+    assert _decode(token)["sub"] == "alice"
+    assert "over the 100-byte budget" in caplog.text
+
+    with pytest.raises(TokenTooLargeError):
+        issue_token(dict(config, token_size={"max_bytes": 100}), {"sub": "alice"})
@@ -0,0 +1,109 @@
+import http.client
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from keypebble.service.app import create_app
+from keypebble.service.unix import (
+    bind_privately,
+    claim_socket_path,
+    make_unix_server,
+    parse_mode,
+)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+@pytest.fixture
+def sock_path(tmp_path):
+    return str(tmp_path / "keypebble.sock")
+
+
+def test_claim_socket_path_missing_is_noop(sock_path):
+    claim_socket_path(sock_path)
+
+
+def test_claim_socket_path_removes_stale_socket(sock_path):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(sock_path)
+    s.close()
+
+    claim_socket_path(sock_path)
+    assert not os.path.exists(sock_path)
+
+
+def test_claim_socket_path_refuses_live_listener_and_regular_file(sock_path, tmp_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.bind(sock_path)
+        s.listen()
+        with pytest.raises(RuntimeError, match="already listening"):
+            claim_socket_path(sock_path)
+
+    regular = tmp_path / "not-a-socket"
+    regular.write_text("keep me")
+    with pytest.raises(RuntimeError, match="not a socket"):
+        claim_socket_path(str(regular))
+    assert regular.read_text() == "keep me"
+
+
+def test_bind_privately_leaves_umask_alone(sock_path, tmp_path):
+    umask = os.umask(0o022)
+    try:
+        with bind_privately(sock_path, 0o600) as tmp:
+            assert stat.S_IMODE(os.stat(os.path.dirname(tmp)).st_mode) == 0o700
+            assert os.umask(0o022) == 0o022  # other threads still see it
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.bind(tmp)
+    finally:
+        os.umask(umask)
+
+    assert stat.S_IMODE(os.stat(sock_path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == ["keypebble.sock"]
+
+
+@pytest.mark.parametrize(
+    "value, expected", [(None, 0o660), (0o600, 0o600), (432, 0o660), ("0666", 0o666)]
+)
+def test_parse_mode(value, expected):
+    assert parse_mode(value) == expected
+
+
+def test_unix_server_serves_keepalive_requests(sock_path):
+    app = create_app({"hs256_secret": "unix-secret-0123456789abcdef0123456789"})
+    server = make_unix_server(sock_path, app, mode=0o660)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert stat.S_IMODE(os.stat(sock_path).st_mode) == 0o660
+
+        conn = UnixHTTPConnection(sock_path)
+        for user in ("alice", "bob"):
+            conn.request(
+                "GET",
+                "/v2/token?service=registry",
+                headers={"X-Authenticated-User": user},
+            )
+            resp = conn.getresponse()
+            resp.read()
+            assert resp.status == 200
+            assert resp.version == 11
+        first_sock = conn.sock
+        conn.request("GET", "/healthz")
+        conn.getresponse().read()
+        # Still the same connection: the server kept it alive.
+        assert conn.sock is first_sock
+        conn.close()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -267,6 +267,27 @@ def test_v2_token_unknown_user_returns_403(client, tmp_path, app):
     assert "bob" in data["message"]
 
 
+def test_v2_token_policy_wildcard_request_keeps_granted_actions(client, tmp_path, app):
+    """Requesting ``pull`` and ``*`` for a pull-only user still grants pull."""
+    from keypebble.core.policy import Policy
+
+    policy_path = tmp_path / "policy.yaml"
+    policy_path.write_text(
+        "users:\n  alice:\n    repos: ['foo/bar']\n    actions: ['pull']\n"
+    )
+    app.policy_handler = Policy.from_file(str(policy_path))
+
+    resp = client.get(
+        "/v2/token?service=test-registry"
+        "&scope=repository:foo/bar:pull&scope=repository:foo/bar:*",
+        headers={"X-Authenticated-User": "alice"},
+    )
+    assert resp.status_code == 200
+    assert resp.get_json()["claims"]["access"] == [
+        {"type": "repository", "name": "foo/bar", "actions": ["pull"]}
+    ]
+
+
 # ---------------------------------------------------------------------------
 # Pure unit tests for build_v2_claims (no Flask required)
 # ---------------------------------------------------------------------------
@@ -365,3 +386,28 @@ def test_v2_token_response_contains_access_token(client):
     assert "token" in data
     assert "access_token" in data
     assert data["token"] == data["access_token"]
+
+
+def test_v2_token_lean_response_via_header(client, app):
+    """X-Lean-Response: true drops claims and nbf from the response body."""
+    headers = {"X-Authenticated-User": "tester", "X-Lean-Response": "true"}
+    resp = client.get(
+        "/v2/token?service=test-registry&scope=repository:foo/bar:pull",
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/json"
+
+    data = resp.get_json()
+    assert set(data) == {"token", "access_token", "expires_in", "issued_at"}
+    assert data["token"] == data["access_token"]
+    assert data["expires_in"] == app.config.get("default_ttl_seconds", 3600)
+    assert _decode(data["token"], app)["scope"] == "repository:foo/bar:pull"
+
+
+def test_v2_token_lean_response_via_config(client, app):
+    """lean_responses in the config applies the minimal body to every request."""
+    app.config["lean_responses"] = True
+    resp = client.get("/v2/token", headers={"X-Authenticated-User": "tester"})
+    assert resp.status_code == 200
+    assert "claims" not in resp.get_json()